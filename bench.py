@@ -0,0 +1,728 @@
+"""
+Headless benchmarks for the dashboard's hot paths.
+
+    python bench.py filter --sizes 100000 400000 1600000
+    python bench.py kpi --rows 1000000
+    python bench.py chat --rows 200000
+    python bench.py parallel --rows 5000000 --workers 1 2 4 8
+    python bench.py memory --rows 1000000
+    python bench.py kernel --rows 1000000
+    python bench.py rank --rows 1000000
+    python bench.py client
+    python bench.py suite --sizes 100000 1000000 --json report.json --csv report.csv
+    python bench.py suite --baseline report.json
+    python bench.py rerun --rows 500000 [--app path/to/other/checkout]
+
+Only timings are reported here; that the fast paths return the same results
+as the reference implementations below is checked by tests/ (pytest).
+"""
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import filter_engine
+import kpi_engine
+import map_layers
+import nexus_client
+import nexus_local
+import nexus_stub
+import nexus_summary
+import parallel_kpi
+import rankings
+import request_table
+
+
+# ─────────────────────────────────────────────
+# SYNTHETIC DATA
+# ─────────────────────────────────────────────
+CATEGORIES = ['Trips', 'Driver Cancellation', 'Rider Cancellation', 'No Drivers Found', 'Timeout']
+CATEGORY_WEIGHTS = [0.62, 0.1, 0.08, 0.1, 0.1]
+CITIES = {
+    'Nairobi': ('Kenya', ['Westlands', 'CBD', 'Kilimani', 'Karen', 'Eastlands']),
+    'Mombasa': ('Kenya', ['Nyali', 'Mombasa Island', 'Bamburi']),
+    'Kisumu': ('Kenya', ['Milimani', 'Kondele']),
+    'Kampala': ('Uganda', ['Kololo', 'Ntinda', 'Nakawa']),
+    'Lagos': ('Nigeria', ['Ikeja', 'Lekki', 'Victoria Island']),
+}
+VEHICLE_TYPES = ['Comfort', 'Basic', 'XL', 'Boda', 'Lady Driver']
+CORPORATES = ['Acme Ltd', 'Globex', 'Initech', 'Umbrella', None]
+
+
+def generate_requests(n_rows: int, seed: int = 0, days: int = 30,
+                      rows_per_driver: int = 200) -> pd.DataFrame:
+    """
+    Synthetic request table with the same columns and dtypes as requests.xlsx.
+    The number of drivers and riders grows with n_rows, so a single driver
+    or rider selection returns a roughly constant number of rows.
+    """
+    rng = np.random.default_rng(seed)
+    regions = [(city, country, region) for city, (country, rs) in CITIES.items() for region in rs]
+    place = rng.integers(0, len(regions), n_rows)
+    n_drivers = max(n_rows // rows_per_driver, 1)
+    n_riders = max(n_rows // 20, 1)
+    df = pd.DataFrame({
+        'Date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, days, n_rows), unit='D'),
+        'Hour': rng.integers(0, 24, n_rows),
+        'CITY': np.array([r[0] for r in regions], dtype=object)[place],
+        'COUNTRY': np.array([r[1] for r in regions], dtype=object)[place],
+        'Region': np.array([r[2] for r in regions], dtype=object)[place],
+        'VEHICLETYPE': rng.choice(VEHICLE_TYPES, n_rows),
+        'TRIPTYPE': rng.choice(['Normal', 'Corporate', 'Delivery'], n_rows, p=[0.7, 0.2, 0.1]),
+        'Corporate': rng.choice(np.array(CORPORATES, dtype=object), n_rows),
+        'DRIVER': pd.Categorical.from_codes(rng.integers(0, n_drivers, n_rows),
+                                            [f'Driver {i:06d}' for i in range(n_drivers)]),
+        'Rider Mobile Number': 254700000000 + rng.integers(0, n_riders, n_rows),
+        'Category': rng.choice(CATEGORIES, n_rows, p=CATEGORY_WEIGHTS),
+        'DISTANCE FROM RIDER': np.round(rng.exponential(3.0, n_rows), 2),
+        'Latitude': np.where(rng.random(n_rows) < 0.03, np.nan, -1.28 + rng.normal(0, 0.08, n_rows)),
+        'Longitude': 36.82 + rng.normal(0, 0.08, n_rows),
+    })
+    return data_store.apply_schema(df)
+
+
+# ─────────────────────────────────────────────
+# REFERENCE IMPLEMENTATIONS
+# ─────────────────────────────────────────────
+def legacy_filter(df: pd.DataFrame, state: dict) -> pd.DataFrame:
+    """The original APPLY FILTERS boolean-mask expression, driven by a filter state."""
+    mask = pd.Series(True, index=df.index)
+    for col, spec in state.items():
+        if spec is None:
+            continue
+        if col in filter_engine.CATEGORICAL_FILTERS:
+            mask &= df[col].isin(spec)
+        else:
+            mask &= (df[col] >= spec[0]) & (df[col] <= spec[1])
+    return df[mask]
+
+
+def legacy_build_kpi_table(data, group_col):
+    """Original per-category groupby + merge version of build_kpi_table."""
+    data = data[data['Category'] != 'No Drivers Found']
+    requests = data.groupby(group_col, observed=True).size().reset_index(name='Total Requests')
+    trips = data[data['Category'] == 'Trips'].groupby(group_col, observed=True).size().reset_index(name='Total Trips')
+    dc = data[data['Category'] == 'Driver Cancellation'].groupby(group_col, observed=True).size().reset_index(name='Driver Cancellation')
+    rc = data[data['Category'] == 'Rider Cancellation'].groupby(group_col, observed=True).size().reset_index(name='Rider Cancellation')
+    to = data[data['Category'] == 'Timeout'].groupby(group_col, observed=True).size().reset_index(name='Timeout')
+    kpis = requests.merge(trips, on=group_col, how='left') \
+                   .merge(dc, on=group_col, how='left') \
+                   .merge(rc, on=group_col, how='left') \
+                   .merge(to, on=group_col, how='left')
+    kpis.fillna(0, inplace=True)
+    kpis['Fulfillment Rate (%)'] = (kpis['Total Trips'] / (kpis['Total Trips'] + kpis['Driver Cancellation'] + kpis['Rider Cancellation']).clip(lower=1)) * 100
+    kpis['Acceptance Rate (%)'] = (kpis['Total Trips'] / (kpis['Total Trips'] + kpis['Driver Cancellation'] + kpis['Rider Cancellation'] + kpis['Timeout']).clip(lower=1)) * 100
+    kpis['Driver Cancellation Rate (%)'] = (kpis['Driver Cancellation'] / kpis['Total Requests'].clip(lower=1)) * 100
+    kpis['Rider Cancellation (%)'] = (kpis['Rider Cancellation'] / kpis['Total Requests'].clip(lower=1)) * 100
+    kpis['Timeout Rate (%)'] = (kpis['Timeout'] / kpis['Total Requests'].clip(lower=1)) * 100
+    return kpis
+
+
+def legacy_compute_fulfillment_pivot(data):
+    """Original per-category version of compute_fulfillment_pivot."""
+    trips = data[data['Category'] == 'Trips'].groupby(['Region', 'Hour'], observed=True).size().reset_index(name='Trips')
+    dc = data[data['Category'] == 'Driver Cancellation'].groupby(['Region', 'Hour'], observed=True).size().reset_index(name='DC')
+    rc = data[data['Category'] == 'Rider Cancellation'].groupby(['Region', 'Hour'], observed=True).size().reset_index(name='RC')
+    merged = trips.merge(dc, on=['Region', 'Hour'], how='left').merge(rc, on=['Region', 'Hour'], how='left').fillna(0)
+    merged['Fulfillment Rate (%)'] = (merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC']).clip(lower=1)) * 100
+    return merged
+
+
+def legacy_overall_kpis(filtered_df):
+    """The original KPI block: one boolean filter per category over the rows."""
+    total_requests = len(filtered_df)
+    total_trips = filtered_df[filtered_df['Category'] == 'Trips'].shape[0]
+    driver_cancellations_kpi = filtered_df[filtered_df['Category'] == 'Driver Cancellation'].shape[0]
+    rider_cancellations_kpi = filtered_df[filtered_df['Category'] == 'Rider Cancellation'].shape[0]
+    no_driver_found = filtered_df[filtered_df['Category'] == 'No Drivers Found'].shape[0]
+    timeouts_kpi = filtered_df[filtered_df['Category'] == 'Timeout'].shape[0]
+    if total_trips == 0:
+        fulfillment_rate = acceptance_rate = driver_canc_rate = 0
+    else:
+        fulfillment_rate = round((total_trips * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi, 1), 2)
+        acceptance_rate = round((total_trips * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi + timeouts_kpi, 1), 2)
+        driver_canc_rate = round((driver_cancellations_kpi * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi + timeouts_kpi, 1), 2)
+    return {
+        'Total Requests': total_requests,
+        'Total Trips': total_trips,
+        'Driver Cancellations': driver_cancellations_kpi,
+        'Rider Cancellations': rider_cancellations_kpi,
+        'Timeouts': timeouts_kpi,
+        'No Driver Found Cases': no_driver_found,
+        'Fulfillment Rate (%)': fulfillment_rate,
+        'Acceptance Rate (%)': acceptance_rate,
+        'Driver Cancellation Rate (%)': driver_canc_rate,
+    }
+
+
+def groupby_category_matrix(data, group_cols, weight=None):
+    """category_matrix as a groupby + unstack (its implementation before the bincount kernel)."""
+    keys = group_cols if isinstance(group_cols, list) else [group_cols]
+    counts = kpi_engine.count_by(data, keys + ['Category'], weight)
+    matrix = counts[counts > 0].unstack('Category', fill_value=0)
+    matrix.columns = matrix.columns.astype(str)
+    matrix.columns.name = None
+    for c in kpi_engine.CATEGORIES:
+        if c not in matrix.columns:
+            matrix[c] = 0
+    return matrix.astype('int64')
+
+
+def legacy_driver_rankings(driver_kpis, k=10, min_requests=5):
+    """The chatbot's driver rankings as five full sorts of the volume-filtered table."""
+    eligible = driver_kpis[driver_kpis['Total Requests'] >= min_requests]
+    return {name: eligible.sort_values(metric, ascending=ascending).head(k)
+            for name, (metric, ascending) in rankings.DRIVER_RANKINGS.items()}
+
+
+def assert_same_table(expected: pd.DataFrame, got: pd.DataFrame):
+    """Same columns, groups and values; count dtypes may differ (int vs float)."""
+    assert list(expected.columns) == list(got.columns), (list(expected.columns), list(got.columns))
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), got.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def typical_state(df):
+    """One driver, an hour window and a distance band over the whole date range."""
+    state = {col: None for col in filter_engine.CATEGORICAL_FILTERS}
+    state.update({
+        'DRIVER': [df['DRIVER'].cat.categories[0]],
+        'Date': (df['Date'].min(), df['Date'].max()),
+        'Hour': (7, 19),
+        'DISTANCE FROM RIDER': (0.0, 5.0),
+    })
+    return state
+
+
+# ─────────────────────────────────────────────
+# BENCHMARKS
+# ─────────────────────────────────────────────
+def bench_filter(sizes, repeat=5):
+    """
+    Time a typical dashboard selection (one driver, an hour window and a
+    distance band over the whole date range) with the boolean mask and with
+    FilterIndex. The mask scans every row; the index follows the size of the
+    driver's posting list, which stays constant as the table grows.
+    """
+    rows = []
+    for n in sizes:
+        df = generate_requests(n)
+        t0 = time.perf_counter()
+        index = filter_engine.FilterIndex(df)
+        build = time.perf_counter() - t0
+        state = typical_state(df)
+        rows.append({
+            'rows': n,
+            'matched': len(index.select(state)),
+            'index build (s)': round(build, 3),
+            'mask (ms)': round(_best_of(lambda: legacy_filter(df, state), repeat) * 1000, 3),
+            'index (ms)': round(_best_of(lambda: index.select(state), repeat) * 1000, 3),
+        })
+    return pd.DataFrame(rows)
+
+
+def bench_kpi(n_rows, repeat=3):
+    """Per-category groupby + merges vs the single-pass category matrix."""
+    df = generate_requests(n_rows)
+    rows = []
+    for group_col in ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate']:
+        rows.append({
+            'stage': f'build_kpi_table({group_col})',
+            'legacy (ms)': round(_best_of(lambda: legacy_build_kpi_table(df, group_col), repeat) * 1000, 1),
+            'engine (ms)': round(_best_of(lambda: kpi_engine.build_kpi_table(df, group_col), repeat) * 1000, 1),
+        })
+    rows.append({
+        'stage': 'compute_fulfillment_pivot',
+        'legacy (ms)': round(_best_of(lambda: legacy_compute_fulfillment_pivot(df), repeat) * 1000, 1),
+        'engine (ms)': round(_best_of(lambda: kpi_engine.compute_fulfillment_pivot(df), repeat) * 1000, 1),
+    })
+    return pd.DataFrame(rows)
+
+
+def bench_kernel(n_rows, repeat=3):
+    """
+    The bincount KPI kernel against the code it replaced, on the rows and on
+    the request cube: the headline KPIs against the original per-category
+    boolean filters, and category_matrix against groupby + unstack for the
+    dimensions the page groups by.
+    """
+    df = generate_requests(n_rows)
+    cube = kpi_engine.build_cube(df)
+    rows = []
+
+    def add(stage, legacy, kernel):
+        rows.append({
+            'stage': stage,
+            'legacy (ms)': round(_best_of(legacy, repeat) * 1000, 2),
+            'kernel (ms)': round(_best_of(kernel, repeat) * 1000, 2),
+        })
+
+    add('overall KPIs (rows)', lambda: legacy_overall_kpis(df), lambda: kpi_engine.overall_kpis(df, len(df)))
+    add('overall KPIs (kernel on the cube)', lambda: legacy_overall_kpis(df), lambda: kpi_engine.overall_kpis(cube, len(df), 'count'))
+
+    dimensions = [('rows', df, None, ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate', 'Date', ['DRIVER', 'Date']]),
+                  ('cube', cube, 'count', ['Hour', ['Region', 'Hour'], ['VEHICLETYPE', 'Date'], 'CITY'])]
+    for source, data, weight, keys_list in dimensions:
+        for keys in keys_list:
+            add(f'category_matrix({keys}, {source})', lambda: groupby_category_matrix(data, keys, weight),
+                lambda: kpi_engine.category_matrix(data, keys, weight))
+    table = pd.DataFrame(rows)
+    table['speedup'] = (table['legacy (ms)'] / table['kernel (ms)']).round(1)
+    return table
+
+
+def bench_rank(n_rows, repeat=5, k=10, rows_per_driver=20):
+    """
+    Driver rankings: five full sorts against one partial selection per
+    ranking.
+    """
+    df = generate_requests(n_rows, rows_per_driver=rows_per_driver)
+    driver_kpis = kpi_engine.rates_for_group(df, 'DRIVER')
+    min_requests = rankings.MIN_REQUESTS
+    eligible = rankings.eligible_positions(driver_kpis, min_requests)
+    return pd.DataFrame([{
+        'drivers': len(driver_kpis),
+        'eligible': len(eligible),
+        'k': k,
+        'five sorts (ms)': round(_best_of(lambda: legacy_driver_rankings(driver_kpis, k, min_requests), repeat) * 1000, 2),
+        'partial selection (ms)': round(_best_of(
+            lambda: rankings.rank_all(driver_kpis, rankings.DRIVER_RANKINGS, k, min_requests), repeat) * 1000, 2),
+    }])
+
+
+# Questions timed by bench_chat: the shapes the local engine answers and a
+# few it escalates. What the answers must say is checked in
+# tests/test_nexus_local.py.
+CHAT_QUESTIONS = [
+    "Which city has the highest acceptance rate at 8pm?",
+    "Which region has the lowest fulfillment rate?",
+    "What is the fulfillment rate for Nairobi?",
+    "Compare Nairobi and Mombasa by acceptance rate",
+    "What was the acceptance rate on 2025-01-05?",
+    "Top 3 drivers by fulfillment rate",
+    "What is the acceptance rate between 7am and 9am?",
+    "What was the fulfillment rate from 2025-01-05 to 2025-01-07?",
+    "Why is the fulfillment rate low in Lagos?",
+    "How has the fulfillment rate changed over the last week?",
+]
+
+
+def bench_chat(n_rows, repeat=5):
+    """Latency of the local query engine, answered or escalated."""
+    df = generate_requests(n_rows)
+    kpi = kpi_engine.overall_kpis(df, len(df))
+    summary = nexus_summary.build_data_summary(df, kpi, (0.0, float(df['DISTANCE FROM RIDER'].max())))
+    rows = []
+    for question in CHAT_QUESTIONS:
+        rows.append({
+            'question': question,
+            'answered': nexus_local.answer(question, summary, df, kpi) is not None,
+            'ms': round(_best_of(lambda: nexus_local.answer(question, summary, df, kpi), repeat) * 1000, 2),
+        })
+    return pd.DataFrame(rows)
+
+
+def bench_client(idle_timeout=0.5):
+    """
+    nexus_client against the local stub server: a streamed reply, keep-alive
+    reuse, an error event mid-stream, a non-200 response, and a pooled
+    connection the server closed while idle (retried on a fresh one).
+    """
+    server = nexus_stub.start(idle_timeout=idle_timeout)
+    rows = []
+
+    def ask(text):
+        messages = [{"role": "user", "content": text}]
+        chunks, error = [], None
+        t0 = time.perf_counter()
+        try:
+            for chunk in nexus_client.stream_reply("system", messages, url=server.url):
+                chunks.append(chunk)
+        except nexus_client.NexusAPIError as exc:
+            error = str(exc)
+        return chunks, error, round((time.perf_counter() - t0) * 1000, 2)
+
+    def check(name, ok, ms):
+        assert ok, name
+        rows.append({'check': name, 'connections': server.connections, 'ms': ms})
+
+    try:
+        chunks, error, ms = ask("hello there")
+        check('streamed reply', error is None and len(chunks) > 1 and ''.join(chunks) == 'Echo: hello there', ms)
+        chunks, error, ms = ask("again")
+        check('keep-alive reuse', error is None and server.connections == 1, ms)
+        chunks, error, ms = ask("stub:error please")
+        check('error event', error == 'Overloaded' and chunks == ['Echo: '], ms)
+        chunks, error, ms = ask("stub:status=529")
+        check('non-200 response', error is not None and error.startswith('HTTP 529') and not chunks, ms)
+        # The error event left its connection unusable; the 529 one is pooled.
+        before = server.connections
+        time.sleep(idle_timeout * 3)
+        chunks, error, ms = ask("after idle")
+        check('closed idle connection', error is None and ''.join(chunks) == 'Echo: after idle'
+              and server.connections == before + 1, ms)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return pd.DataFrame(rows)
+
+
+def bench_parallel(n_rows, workers_list, repeat=3):
+    """
+    Wall-clock of the page's row-level aggregations (four KPI tables and the
+    chatbot's seven rates_for_group calls) by worker count; 1 = serial.
+    """
+    df = generate_requests(n_rows)
+    group_cols = ['Region', 'CITY', 'COUNTRY', 'Hour', 'VEHICLETYPE', 'Corporate', 'DRIVER']
+    jobs = {f'kpi_table:{col}': ('build_kpi_table', col)
+            for col in ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate']}
+    jobs.update({f'rates:{col}': ('rates_for_group', col) for col in group_cols})
+    columns = group_cols + ['Rider Mobile Number', 'Category']
+
+    rows = []
+    for workers in workers_list:
+        parallel_kpi.run_all(df, jobs, columns, workers=workers, min_rows=0)   # starts the pool
+        seconds = _best_of(lambda: parallel_kpi.run_all(df, jobs, columns, workers=workers, min_rows=0), repeat)
+        rows.append({'rows': n_rows, 'workers': workers, 'jobs': len(jobs), 'wall (s)': round(seconds, 3)})
+    base = rows[0]['wall (s)'] if rows and workers_list[0] == 1 else None
+    table = pd.DataFrame(rows)
+    if base:
+        table['speedup'] = (base / table['wall (s)']).round(2)
+    return table
+
+
+def peak_mb(fn) -> float:
+    """Peak memory (MB) allocated while fn() runs, above what was allocated before."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return (peak - start) / 1e6
+
+
+def legacy_date_rates(data):
+    """The chatbot's original date-level rates: a full copy with a string date column."""
+    data_copy = data.copy()
+    data_copy['_date_str'] = data_copy['Date'].astype(str)
+    return kpi_engine.rates_for_group(data_copy, '_date_str').rename(columns={'_date_str': 'Date'})
+
+
+def bench_memory(n_rows):
+    """
+    Peak memory per stage of a page run with no filters applied (the worst
+    case for copies): the original code, which copied the filtered frame
+    before each consumer, against the current one. numpy and pandas report
+    their buffers to tracemalloc, so the peaks cover the column data.
+    pandas >= 3 already returns a view for an all-rows iloc; earlier
+    versions copy the frame there.
+    """
+    df = generate_requests(n_rows)
+    rows_all = np.arange(len(df))
+    kpi_cols = ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate']
+
+    def date_rates():
+        rates = kpi_engine.rates_for_group(df, 'Date')
+        rates['Date'] = rates['Date'].astype(str)
+        return rates
+
+    stages = [
+        ('filtered frame', lambda: df.iloc[rows_all],
+         lambda: df if len(rows_all) == len(df) else df.iloc[rows_all]),
+        ('map source', lambda: df.dropna(subset=['Latitude', 'Longitude']).copy(),
+         lambda: map_layers.with_coordinates(df)),
+        ('KPI tables', lambda: [kpi_engine.build_kpi_table(df.copy(), c) for c in kpi_cols],
+         lambda: [kpi_engine.build_kpi_table(df, c) for c in kpi_cols]),
+        ('chatbot date rates', lambda: legacy_date_rates(df), date_rates),
+        ('chatbot summary', lambda: nexus_summary.build_data_summary(df.copy(), {}, (0.0, 25.0)),
+         lambda: nexus_summary.build_data_summary(df, {}, (0.0, 25.0))),
+    ]
+    rows = []
+    for name, before, after in stages:
+        was, now = peak_mb(before), peak_mb(after)
+        rows.append({'stage': name, 'rows': n_rows, 'before (MB)': round(was, 1), 'after (MB)': round(now, 1),
+                     'saved (%)': round(100 * (1 - now / was), 1) if was else 0.0})
+    print(f'request table: {df.memory_usage(deep=True).sum() / 1e6:.1f} MB')
+    return pd.DataFrame(rows)
+
+
+# ─────────────────────────────────────────────
+# SUITE
+# ─────────────────────────────────────────────
+# One run over every stage of a page load, written as a report that can be
+# kept and compared with a later run (--baseline). Load stages go through a
+# throwaway partition store, so the app's own .app_data is left alone.
+
+def _timings(fn, repeat):
+    """Seconds per call of fn() over `repeat` calls, and its last result."""
+    seconds, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - t0)
+    return seconds, result
+
+
+def _rows_out(result) -> int:
+    """Rows of a table or position array; entries of a dict result (KPIs, summary)."""
+    return len(result[0]) if isinstance(result, tuple) else len(result)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def report_meta(label=None) -> dict:
+    return {
+        'label': label,
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'kpi_workers': parallel_kpi.WORKERS,
+    }
+
+
+def suite_stages(df, store_dir):
+    """(stage, fn) pairs in page order; the load stages read from `store_dir`."""
+    extract = os.path.join(store_dir, 'requests.csv')
+    df.to_csv(extract, index=False)
+    data_store.PARTITION_DIR = os.path.join(store_dir, 'partitions')
+    os.makedirs(data_store.PARTITION_DIR, exist_ok=True)
+    data_store.ingest_file(extract)
+
+    def load_partitions():
+        table = request_table.RequestTable()
+        table.refresh()
+        return table.snapshot()
+
+    index = filter_engine.FilterIndex(df)
+    state = typical_state(df)
+    stages = [
+        ('load: read extract', lambda: data_store.apply_schema(data_store.read_extract(extract))),
+        ('load: partitions + index + cube', load_partitions),
+        ('filter', lambda: index.select(state)),
+        ('KPI', lambda: kpi_engine.overall_kpis(df, len(df))),
+    ]
+    stages += [(f'build_kpi_table({col})', lambda col=col: kpi_engine.build_kpi_table(df, col))
+               for col in ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate']]
+    stages += [
+        ('compute_fulfillment_pivot', lambda: kpi_engine.compute_fulfillment_pivot(df)),
+        ('build_data_summary', lambda: nexus_summary.build_data_summary(df, {}, (0.0, 25.0))),
+    ]
+    return stages
+
+
+def bench_suite(sizes, repeat=3):
+    """
+    Time each stage of a page load with no filters applied (the filter
+    stage selects one driver), per table size. Returns one row per stage
+    and size with the best and median time over `repeat` runs.
+    """
+    rows = []
+    partition_dir = data_store.PARTITION_DIR
+    try:
+        for n in sizes:
+            df = generate_requests(n)
+            with tempfile.TemporaryDirectory() as store_dir:
+                for stage, fn in suite_stages(df, store_dir):
+                    seconds, result = _timings(fn, repeat)
+                    rows.append({
+                        'stage': stage,
+                        'rows': n,
+                        'rows out': _rows_out(result),
+                        'best (ms)': round(min(seconds) * 1000, 2),
+                        'median (ms)': round(float(np.median(seconds)) * 1000, 2),
+                    })
+    finally:
+        data_store.PARTITION_DIR = partition_dir
+    return pd.DataFrame(rows)
+
+
+def compare_to(results: pd.DataFrame, baseline_path: str) -> pd.DataFrame:
+    """`results` with the baseline report's median per stage and size, and the ratio."""
+    with open(baseline_path, 'r') as f:
+        baseline = pd.DataFrame(json.load(f)['results'])
+    base = baseline[['stage', 'rows', 'median (ms)']].rename(columns={'median (ms)': 'baseline (ms)'})
+    out = results.merge(base, on=['stage', 'rows'], how='left')
+    out['ratio'] = (out['median (ms)'] / out['baseline (ms)']).round(2)
+    return out
+
+
+def write_report(results: pd.DataFrame, meta: dict, json_path=None, csv_path=None):
+    """JSON: {"meta": ..., "results": [...]}; CSV: one row per result with the meta columns."""
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({'meta': meta, 'results': results.to_dict(orient='records')}, f, indent=2)
+    if csv_path:
+        results.assign(**{k: v for k, v in meta.items()}).to_csv(csv_path, index=False)
+
+
+# ─────────────────────────────────────────────
+# END-TO-END RERUNS
+# ─────────────────────────────────────────────
+# Whole page runs through Streamlit's AppTest, for the default view (every
+# collapsible section closed). The app is copied to a temp directory with
+# the synthetic table waiting in its inbox, and driven from a child process
+# whose imports resolve to that copy, so `--app` can point at another
+# checkout to measure it the same way.
+
+def rerun_child(app_dir, role, repeat):
+    """Runs inside the child process; prints {kind: [seconds, ...]} as JSON."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(app_dir, 'main.py'), default_timeout=1800)
+    at.session_state['authenticated'] = True
+    at.session_state['current_user'] = 'bench@little.africa'
+    at.session_state['current_role'] = role
+    timings = {}
+
+    def timed(kind):
+        t0 = time.perf_counter()
+        at.run()
+        timings.setdefault(kind, []).append(time.perf_counter() - t0)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    timed('first load (ingest)')
+    dates = pd.read_csv(os.path.join(app_dir, '.app_data', 'inbox', 'processed', 'requests.csv'),
+                        usecols=['Date'], parse_dates=['Date'])['Date']
+    at.date_input[0].set_value(dates.min().date())
+    at.date_input[1].set_value(dates.max().date())
+    timed('date range loaded')
+    hours = next(s for s in at.slider if s.label == 'Hour of Day')
+    for i in range(repeat):
+        hours.set_value((0, 22 - i % 20))   # a filter state not seen yet
+        timed('new filter')
+    for _ in range(repeat):
+        timed('same filter')
+    print(json.dumps(timings))
+
+
+def bench_rerun(n_rows, repeat=5, app=None, role='user'):
+    """Median seconds per kind of rerun for the app in `app` (this checkout by default)."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    app = os.path.abspath(app or repo)
+    with tempfile.TemporaryDirectory() as app_dir:
+        for path in glob.glob(os.path.join(app, '*.py')):
+            if os.path.basename(path) != 'bench.py':
+                shutil.copy(path, app_dir)
+        inbox = os.path.join(app_dir, '.app_data', 'inbox')
+        os.makedirs(inbox)
+        generate_requests(n_rows).to_csv(os.path.join(inbox, 'requests.csv'), index=False)
+        code = (f'import sys; sys.path[:0] = {[app_dir, repo]!r}; import bench; '
+                f'bench.rerun_child({app_dir!r}, {role!r}, {repeat})')
+        out = subprocess.run([sys.executable, '-c', code], cwd=app_dir, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-4000:])
+        timings = json.loads(out.stdout.strip().splitlines()[-1])
+    return pd.DataFrame([
+        {'app': app, 'rows': n_rows, 'rerun': kind, 'runs': len(seconds),
+         'median (s)': round(float(np.median(seconds)), 3), 'max (s)': round(max(seconds), 3)}
+        for kind, seconds in timings.items()
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_filter = sub.add_parser('filter', help='FilterIndex vs boolean mask')
+    p_filter.add_argument('--sizes', type=int, nargs='+', default=[100_000, 400_000, 1_600_000])
+    p_filter.add_argument('--repeat', type=int, default=5)
+    p_kpi = sub.add_parser('kpi', help='KPI tables: per-category merges vs category matrix')
+    p_kpi.add_argument('--rows', type=int, default=1_000_000)
+    p_kpi.add_argument('--repeat', type=int, default=3)
+    p_chat = sub.add_parser('chat', help='Nexus Phil local query engine: latency')
+    p_chat.add_argument('--rows', type=int, default=200_000)
+    p_chat.add_argument('--repeat', type=int, default=5)
+    p_client = sub.add_parser('client', help='Nexus API client against the local stub server')
+    p_client.add_argument('--idle-timeout', type=float, default=0.5)
+    p_parallel = sub.add_parser('parallel', help='KPI aggregations: wall-clock vs process pool size')
+    p_parallel.add_argument('--rows', type=int, default=5_000_000)
+    p_parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    p_parallel.add_argument('--repeat', type=int, default=3)
+    p_kernel = sub.add_parser('kernel', help='bincount KPI kernel vs boolean filters / groupby: parity and speed')
+    p_kernel.add_argument('--rows', type=int, default=1_000_000)
+    p_kernel.add_argument('--repeat', type=int, default=3)
+    p_rank = sub.add_parser('rank', help='Driver rankings: full sorts vs partial selection')
+    p_rank.add_argument('--rows', type=int, default=1_000_000)
+    p_rank.add_argument('--repeat', type=int, default=5)
+    p_rank.add_argument('--k', type=int, default=10)
+    p_memory = sub.add_parser('memory', help='Peak memory per page stage: copying vs copy-free paths')
+    p_memory.add_argument('--rows', type=int, default=1_000_000)
+    p_suite = sub.add_parser('suite', help='Every page-load stage, as a JSON/CSV report')
+    p_suite.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    p_suite.add_argument('--repeat', type=int, default=3)
+    p_suite.add_argument('--label', help='free-text tag stored with the report')
+    p_suite.add_argument('--json', help='write the report as JSON')
+    p_suite.add_argument('--csv', help='write the report as CSV')
+    p_suite.add_argument('--baseline', help='JSON report to compare medians against')
+    p_rerun = sub.add_parser('rerun', help='End-to-end page reruns (default view) through AppTest')
+    p_rerun.add_argument('--rows', type=int, default=500_000)
+    p_rerun.add_argument('--repeat', type=int, default=5)
+    p_rerun.add_argument('--app', help='checkout to measure (default: this one)')
+    p_rerun.add_argument('--role', default='user', choices=['user', 'admin'])
+    args = parser.parse_args()
+
+    if args.command == 'filter':
+        print(bench_filter(args.sizes, args.repeat).to_string(index=False))
+    elif args.command == 'kpi':
+        print(bench_kpi(args.rows, args.repeat).to_string(index=False))
+    elif args.command == 'chat':
+        print(bench_chat(args.rows, args.repeat).to_string(index=False))
+    elif args.command == 'client':
+        print(bench_client(args.idle_timeout).to_string(index=False))
+    elif args.command == 'parallel':
+        print(f'{os.cpu_count()} CPU(s) available')
+        print(bench_parallel(args.rows, args.workers, args.repeat).to_string(index=False))
+    elif args.command == 'kernel':
+        print(bench_kernel(args.rows, args.repeat).to_string(index=False))
+    elif args.command == 'rank':
+        print(bench_rank(args.rows, args.repeat, args.k).to_string(index=False))
+    elif args.command == 'memory':
+        print(bench_memory(args.rows).to_string(index=False))
+    elif args.command == 'suite':
+        meta = report_meta(args.label)
+        results = bench_suite(args.sizes, args.repeat)
+        write_report(results, meta, args.json, args.csv)
+        shown = compare_to(results, args.baseline) if args.baseline else results
+        print(json.dumps(meta), file=sys.stderr)
+        print(shown.to_string(index=False))
+    elif args.command == 'rerun':
+        print(bench_rerun(args.rows, args.repeat, args.app, args.role).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
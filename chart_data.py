@@ -0,0 +1,82 @@
+import pandas as pd
+
+import kpi_engine
+
+# ─────────────────────────────────────────────
+# CHART DATA
+# ─────────────────────────────────────────────
+# Altair embeds each chart's data in the Vega-Lite spec sent to the browser.
+# Before charting, date series are re-binned to a grain that suits the
+# selected range, series beyond a cap are folded into "Other", and only the
+# encoded columns are kept.
+
+OTHER = 'Other'
+MAX_SERIES = 8          # lines per line chart, including "Other"
+MAX_HEATMAP_ROWS = 40   # regions per heatmap, including "Other"
+DAILY_MAX_DAYS = 92
+WEEKLY_MAX_DAYS = 731
+
+GRAIN_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+
+def time_grain(start, end) -> str:
+    """'day' up to a quarter, 'week' up to two years, 'month' beyond."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    if days <= DAILY_MAX_DAYS:
+        return 'day'
+    return 'week' if days <= WEEKLY_MAX_DAYS else 'month'
+
+
+def bin_dates(dates: pd.Series, grain: str) -> pd.Series:
+    """Dates floored to the start of their day, (Monday) week or month."""
+    dates = pd.to_datetime(dates)
+    if grain == 'week':
+        return dates.dt.to_period('W-SUN').dt.start_time
+    if grain == 'month':
+        return dates.dt.to_period('M').dt.start_time
+    return dates.dt.normalize()
+
+
+def cap_series(frame: pd.DataFrame, series_col: str, value_col: str,
+               max_series: int = MAX_SERIES) -> pd.DataFrame:
+    """
+    Keep the max_series - 1 largest series (by total `value_col`) and
+    relabel the rest as "Other". Rows are not re-aggregated here.
+    """
+    totals = frame.groupby(series_col, observed=True)[value_col].sum()
+    if len(totals) <= max_series:
+        return frame
+    keep = set(totals.nlargest(max_series - 1).index)
+    labels = frame[series_col].astype(object)
+    return frame.assign(**{series_col: labels.where(labels.isin(keep), OTHER)})
+
+
+def date_series(counts: pd.DataFrame, series_col: str, grain: str,
+                max_series: int = MAX_SERIES) -> pd.DataFrame:
+    """(series, Date, count) rows re-binned to `grain` with at most max_series series."""
+    capped = cap_series(counts, series_col, 'count', max_series)
+    keys = [capped[series_col].astype(object), bin_dates(capped['Date'], grain).rename('Date')]
+    return capped.groupby(keys, observed=True)['count'].sum().reset_index()
+
+
+def cap_heatmap_rows(frame: pd.DataFrame, row_col: str, sum_cols: list,
+                     max_rows: int = MAX_HEATMAP_ROWS) -> pd.DataFrame:
+    """Heatmap rows beyond max_rows (by total of sum_cols[0]) summed into "Other"."""
+    capped = cap_series(frame, row_col, sum_cols[0], max_rows)
+    if capped is frame:
+        return frame
+    return capped.groupby([row_col, 'Hour'], observed=True)[sum_cols].sum().reset_index()
+
+
+def fulfillment_heatmap(pivot: pd.DataFrame, max_rows: int = MAX_HEATMAP_ROWS) -> pd.DataFrame:
+    """Region × Hour FR cells with the smallest regions folded into "Other"."""
+    capped = cap_heatmap_rows(pivot, 'Region', ['Trips', 'DC', 'RC'], max_rows)
+    if capped is pivot:
+        return pivot
+    capped['Fulfillment Rate (%)'] = kpi_engine.fulfillment_rate(capped['Trips'], capped['DC'], capped['RC'])
+    return capped
+
+
+def spec_bytes(chart) -> int:
+    """Size of the Vega-Lite spec (data included) sent for `chart`."""
+    return len(chart.to_json(indent=None))
@@ -0,0 +1,575 @@
+import os
+import json
+import shutil
+import bisect
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:   # Windows: threads in one process are still serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────
+# DATA STORE
+# ─────────────────────────────────────────────
+# Reading the 50+ MB workbook through openpyxl takes tens of seconds, so it is
+# read only when its contents change, and its rows go straight into the date
+# partitions below. A manifest under .app_data/snapshots/ records the
+# workbook's size, mtime and hash, so an unchanged file costs one stat().
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_DATA_DIR = os.path.join(_BASE_DIR, ".app_data")
+SNAPSHOT_DIR = os.path.join(_DATA_DIR, "snapshots")
+SOURCE_FILE = os.path.join(_BASE_DIR, "requests.xlsx")
+
+DATE_COLS = ['Date']
+INT_COLS = ['Hour']
+FLOAT_COLS = ['DISTANCE FROM RIDER', 'Latitude', 'Longitude']
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _manifest_path(source: str) -> str:
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{name}.manifest.json")
+
+
+def _read_manifest(source: str) -> dict:
+    try:
+        with open(_manifest_path(source), "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def _write_json(path: str, obj: dict):
+    # Same temp file → rename pattern as save_users().
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(source: str, manifest: dict):
+    _write_json(_manifest_path(source), manifest)
+
+
+def source_fingerprint(source: str) -> dict:
+    """
+    Identify the current version of the source file.
+    The SHA-256 is only recomputed when size or mtime differ from the
+    manifest, so an unchanged workbook costs one stat() call.
+    """
+    stat = os.stat(source)
+    fp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    manifest = _read_manifest(source)
+    if manifest.get("size") == fp["size"] and manifest.get("mtime_ns") == fp["mtime_ns"]:
+        fp["sha256"] = manifest.get("sha256")
+    else:
+        fp["sha256"] = file_sha256(source)
+    return fp
+
+
+def normalize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give the request table stable column types:
+    - Date → datetime64, Hour → int64 (float if it has gaps),
+      distance and coordinates → float64.
+    - Object columns holding a mix of types (e.g. numbers and text in CITY)
+      have their non-null values turned into strings so they can be written
+      to Parquet and compared consistently.
+    """
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in INT_COLS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce')
+            df[col] = values.astype('int64') if values.notna().all() else values
+    for col in FLOAT_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    for col in df.columns:
+        if df[col].dtype == object:
+            non_null = df[col].dropna()
+            if non_null.map(type).nunique() > 1:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def record_fingerprint(source: str, fp: dict):
+    """
+    Store the workbook's size/mtime/hash when they changed, so the next
+    source_fingerprint() is one stat() again. Snapshots written before the
+    partitioned store are removed; the partitions hold the rows now.
+    """
+    manifest = _read_manifest(source)
+    if all(manifest.get(k) == fp[k] for k in ("size", "mtime_ns", "sha256")) and "snapshot" not in manifest:
+        return
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        _write_manifest(source, fp)
+        if manifest.get("snapshot"):
+            os.remove(os.path.join(SNAPSHOT_DIR, manifest["snapshot"]))
+    except OSError:
+        pass
+
+
+def read_workbook(source: str, fp: dict) -> pd.DataFrame:
+    """Read the workbook and record its fingerprint."""
+    df = normalize_dtypes(pd.read_excel(source))
+    record_fingerprint(source, fp)
+    return df
+
+
+# ─────────────────────────────────────────────
+# TYPED SCHEMA
+# ─────────────────────────────────────────────
+# Low-cardinality text columns become categoricals with string labels, so
+# filter comparisons work on integer codes instead of Python strings.
+CATEGORY_COLS = ['CITY', 'VEHICLETYPE', 'DRIVER', 'TRIPTYPE', 'Category',
+                 'Region', 'Corporate', 'COUNTRY', 'Rider Mobile Number']
+FLOAT32_COLS = ['DISTANCE FROM RIDER', 'Latitude', 'Longitude']
+
+
+def _as_labels(s: pd.Series) -> pd.Series:
+    """String labels for a column, keeping missing values missing (1254.0 → '1254')."""
+    if pd.api.types.is_numeric_dtype(s):
+        non_null = s.dropna()
+        if (non_null == non_null.round()).all():
+            s = s.astype('Int64')
+    return s.astype(str).where(s.notna())
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the request table to its compact in-memory representation."""
+    df = df.copy()
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = _as_labels(df[col]).astype('category')
+    if 'Hour' in df.columns:
+        hours = df['Hour']
+        if hours.notna().all() and hours.between(-128, 127).all():
+            df['Hour'] = hours.astype('int8')
+        else:
+            df['Hour'] = hours.astype('float32')
+    for col in FLOAT32_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    return df
+
+
+def column_bytes(df: pd.DataFrame) -> pd.Series:
+    return df.memory_usage(deep=True, index=False)
+
+
+def memory_report(before: pd.Series, after: pd.Series) -> pd.DataFrame:
+    """Per-column bytes before/after apply_schema(), with a TOTAL row."""
+    report = pd.DataFrame({'Before (bytes)': before, 'After (bytes)': after}).fillna(0).astype('int64')
+    report.loc['TOTAL'] = report.sum()
+    report['Saved (%)'] = (
+        (1 - report['After (bytes)'] / report['Before (bytes)'].clip(lower=1)) * 100
+    ).round(1)
+    return report.rename_axis('Column').reset_index()
+
+
+# ─────────────────────────────────────────────
+# PARTITIONED STORE
+# ─────────────────────────────────────────────
+# Request extracts (the workbook, plus daily xlsx/csv/jsonl files dropped into
+# .app_data/inbox/) are appended to Parquet files partitioned by Date:
+#   .app_data/partitions/date=YYYY-MM-DD/part-<extract sha>.parquet
+# Every row carries a hash of its values, so re-sent or overlapping extracts
+# only add rows the store does not hold yet. Identical rows within one
+# extract are all kept, as the table has no request ID to tell them apart.
+# Partitions are append-only: a later extract never rewrites or removes rows
+# of an earlier one.
+PARTITION_DIR = os.path.join(_DATA_DIR, "partitions")
+INBOX_DIR = os.path.join(_DATA_DIR, "inbox")
+EXTRACT_TYPES = ('.xlsx', '.xls', '.csv', '.jsonl')
+ROW_HASH = '_row_hash'
+NO_DATE = 'none'
+
+_ingest_lock = threading.Lock()
+
+
+@contextmanager
+def _store_lock():
+    """
+    Serialize manifest and partition writes: across the threads of this
+    process with a lock, across processes with flock() on a lock file.
+    """
+    with _ingest_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(PARTITION_DIR, exist_ok=True)
+        with open(os.path.join(PARTITION_DIR, "_manifest.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _partition_manifest_path() -> str:
+    return os.path.join(PARTITION_DIR, "_manifest.json")
+
+
+def read_partition_manifest() -> dict:
+    try:
+        with open(_partition_manifest_path(), "r") as f:
+            manifest = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        manifest = {}
+    manifest.setdefault("columns", [])
+    manifest.setdefault("extracts", {})
+    manifest.setdefault("parts", [])
+    return manifest
+
+
+def read_extract(path: str) -> pd.DataFrame:
+    """One extract file as a normalized request table."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        df = pd.read_excel(path)
+    elif ext == '.csv':
+        df = pd.read_csv(path)
+    elif ext == '.jsonl':
+        df = pd.read_json(path, lines=True) if os.path.getsize(path) else pd.DataFrame()
+    else:
+        raise ValueError(f"Unsupported extract type: {path}")
+    return normalize_dtypes(df)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    64-bit hash of each row's values, independent of column order and of the
+    file type it came from (1254 and 1254.0 hash alike; floats are compared
+    to 6 decimals, which absorbs text round-trip noise in CSV/JSON).
+    """
+    def label(s):
+        return _as_labels(s.round(6) if pd.api.types.is_float_dtype(s) else s)
+    labels = pd.DataFrame({col: label(df[col]) for col in sorted(df.columns)})
+    return pd.util.hash_pandas_object(labels, index=False).to_numpy()
+
+
+def _existing_hashes(manifest: dict, date: str) -> np.ndarray:
+    files = [p["file"] for p in manifest["parts"] if p["date"] == date]
+    if not files:
+        return np.empty(0, dtype=np.uint64)
+    return np.concatenate([
+        pd.read_parquet(os.path.join(PARTITION_DIR, f), columns=[ROW_HASH])[ROW_HASH].to_numpy()
+        for f in files
+    ])
+
+
+def _new_rows(hashes: np.ndarray, existing: np.ndarray) -> np.ndarray:
+    """
+    Mask of the rows not stored yet. Requests have no ID, so identical rows
+    (say, three No Drivers Found from one rider in the same hour) are real,
+    separate requests: a hash seen n times here and m times in the store
+    keeps its last n - m copies.
+    """
+    stored, stored_counts = np.unique(existing, return_counts=True)
+    have = np.zeros(len(hashes), dtype=np.int64)
+    if len(stored):
+        pos = np.searchsorted(stored, hashes).clip(max=len(stored) - 1)
+        found = stored[pos] == hashes
+        have[found] = stored_counts[pos[found]]
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return occurrence >= have
+
+
+def ingest_frame(df: pd.DataFrame, sha256: str, name: str) -> dict:
+    """
+    Append the rows of one extract to the date partitions, skipping rows
+    already stored. Extracts are identified by content hash, so ingesting
+    the same file twice is a no-op.
+    """
+    with _store_lock():
+        manifest = read_partition_manifest()
+        if sha256 in manifest["extracts"]:
+            return {"extract": name, "rows": 0, "added": 0, "skipped": True}
+        if not manifest["columns"]:
+            manifest["columns"] = [c for c in df.columns if c != ROW_HASH]
+        # Columns the store has not seen before are dropped, missing ones left empty.
+        df = df.reindex(columns=manifest["columns"])
+        df[ROW_HASH] = row_hashes(df)
+        rows_in = len(df)
+
+        added = 0
+        if df.empty or 'Date' not in df.columns:
+            dates = pd.Series(NO_DATE, index=df.index)
+        else:
+            dates = df['Date'].dt.strftime('%Y-%m-%d').fillna(NO_DATE)
+        for date, part in df.groupby(dates, sort=True):
+            part = part[_new_rows(part[ROW_HASH].to_numpy(), _existing_hashes(manifest, date))]
+            if part.empty:
+                continue
+            rel = os.path.join(f"date={date}", f"part-{sha256[:16]}.parquet")
+            path = os.path.join(PARTITION_DIR, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            part.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            _write_json(_summary_path(rel), part_summary(part))
+            manifest["parts"].append({"date": date, "file": rel, "rows": len(part)})
+            added += len(part)
+
+        manifest["extracts"][sha256] = {
+            "name": name, "rows": rows_in, "added": added,
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _write_json(_partition_manifest_path(), manifest)
+        return {"extract": name, "rows": rows_in, "added": added, "skipped": False}
+
+
+def ingest_file(path: str) -> dict:
+    return ingest_frame(read_extract(path), file_sha256(path), os.path.basename(path))
+
+
+def ingest_source(source: str = SOURCE_FILE):
+    """Ingest the workbook when its content hash is not in the store yet (one stat() otherwise)."""
+    if not os.path.exists(source):
+        return None
+    fp = source_fingerprint(source)
+    if fp["sha256"] in read_partition_manifest()["extracts"]:
+        # Same content under a new mtime (touch, checkout, redeploy).
+        record_fingerprint(source, fp)
+        return None
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    return ingest_frame(read_workbook(source, fp), fp["sha256"], os.path.basename(source))
+
+
+def ingest_pending(source: str = SOURCE_FILE) -> list:
+    """Ingest a changed workbook and everything in the inbox."""
+    return [r for r in [ingest_source(source)] + ingest_inbox() if r]
+
+
+def add_to_inbox(name: str, data: bytes, inbox: str = None) -> str:
+    """
+    Drop an extract into the inbox. It is written under a temporary name the
+    inbox scan ignores and renamed into place, so no session ingests it half
+    written.
+    """
+    inbox = inbox or INBOX_DIR
+    os.makedirs(inbox, exist_ok=True)
+    path = os.path.join(inbox, os.path.basename(name))
+    tmp_path = path + ".uploading"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def ingest_inbox(inbox: str = None) -> list:
+    """
+    Ingest every extract waiting in the inbox, then move it to inbox/processed/.
+    Sessions (and processes) scan the inbox concurrently, so each file is
+    claimed first by renaming it into inbox/claimed/: the rename succeeds for
+    exactly one of them, and the others skip the file. An extract that fails
+    to ingest is moved to inbox/failed/ and reported with its error, and the
+    scan carries on with the next file.
+    """
+    inbox = inbox or INBOX_DIR
+    try:
+        names = sorted(n for n in os.listdir(inbox) if n.lower().endswith(EXTRACT_TYPES))
+    except OSError:
+        return []
+    results = []
+    claimed_dir = os.path.join(inbox, "claimed")
+    processed = os.path.join(inbox, "processed")
+    failed = os.path.join(inbox, "failed")
+    for name in names:
+        os.makedirs(claimed_dir, exist_ok=True)
+        claimed = os.path.join(claimed_dir, name)
+        try:
+            os.rename(os.path.join(inbox, name), claimed)
+        except FileNotFoundError:
+            continue   # taken by another session
+        try:
+            os.makedirs(PARTITION_DIR, exist_ok=True)
+            results.append(ingest_file(claimed))
+        except Exception as exc:
+            # Quarantined, so a bad drop neither blocks the files after it
+            # nor fails again on every rerun.
+            logger.exception("Extract %s could not be ingested; moved to %s", name, failed)
+            os.makedirs(failed, exist_ok=True)
+            shutil.move(claimed, os.path.join(failed, name))
+            results.append({"extract": name, "rows": 0, "added": 0, "skipped": False, "error": str(exc)})
+            continue
+        os.makedirs(processed, exist_ok=True)
+        shutil.move(claimed, os.path.join(processed, name))
+    return results
+
+
+def parts_version(files) -> str:
+    """Short hash identifying a set of partition files."""
+    return hashlib.sha256("\n".join(sorted(files)).encode("utf-8")).hexdigest()[:16]
+
+
+def window_parts(manifest: dict, date_from=None, date_to=None) -> list:
+    """
+    Partitions whose date lies in [date_from, date_to] (either end open when
+    None). Rows without a date never match a date filter and are left out.
+    """
+    lo = pd.Timestamp(date_from).strftime('%Y-%m-%d') if date_from is not None else None
+    hi = pd.Timestamp(date_to).strftime('%Y-%m-%d') if date_to is not None else None
+    return [
+        p for p in manifest["parts"]
+        if p["date"] != NO_DATE and (lo is None or p["date"] >= lo) and (hi is None or p["date"] <= hi)
+    ]
+
+
+def read_parts(parts: list) -> pd.DataFrame:
+    """The rows of the given partition files, normalized, without their row hashes."""
+    frames = [pd.read_parquet(os.path.join(PARTITION_DIR, p["file"])) for p in parts]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return normalize_dtypes(df.drop(columns=[ROW_HASH], errors='ignore'))
+
+
+def append_rows(table: pd.DataFrame, part: pd.DataFrame) -> pd.DataFrame:
+    """
+    `part` appended below `table` (both after apply_schema). Categorical
+    columns keep the table's categories and codes and gain the part's new
+    labels at the end, so indexes built on the table stay valid.
+    """
+    table_cols, part_cols = {}, {}
+    for col in CATEGORY_COLS:
+        if col in table.columns and col in part.columns:
+            old = table[col].cat.categories
+            categories = old.append(part[col].cat.categories.difference(old))
+            table_cols[col] = table[col].cat.set_categories(categories)
+            part_cols[col] = part[col].cat.set_categories(categories)
+    return pd.concat([table.assign(**table_cols), part.assign(**part_cols)], ignore_index=True)
+
+
+# ─────────────────────────────────────────────
+# PARTITION SUMMARIES
+# ─────────────────────────────────────────────
+# Each partition file has a small JSON summary next to it: the distinct
+# labels of every sidebar filter column and the Hour / distance ranges. The
+# sidebar is built from these, so it covers the whole history while only
+# the partitions of the selected dates are loaded.
+OPTION_COLS = ['CITY', 'VEHICLETYPE', 'DRIVER', 'TRIPTYPE', 'Rider Mobile Number',
+               'COUNTRY', 'Region', 'Corporate']
+RANGE_COLS = ['Hour', 'DISTANCE FROM RIDER']
+
+
+def _summary_path(rel: str) -> str:
+    return os.path.join(PARTITION_DIR, os.path.splitext(rel)[0] + ".summary.json")
+
+
+def part_summary(df: pd.DataFrame) -> dict:
+    summary = {"values": {}, "ranges": {}}
+    for col in OPTION_COLS:
+        if col in df.columns:
+            summary["values"][col] = sorted(_as_labels(df[col]).dropna().unique().tolist())
+    for col in RANGE_COLS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce').dropna()
+            if not values.empty:
+                summary["ranges"][col] = [float(values.min()), float(values.max())]
+    return summary
+
+
+def load_part_summary(part: dict) -> dict:
+    """The summary of one partition file, written on first use for older partitions."""
+    path = _summary_path(part["file"])
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        summary = part_summary(normalize_dtypes(pd.read_parquet(os.path.join(PARTITION_DIR, part["file"]))))
+        _write_json(path, summary)
+        return summary
+
+
+def partition_options(parts: list) -> dict:
+    """
+    Sidebar options over the given partitions:
+    {"values": {col: sorted labels}, "ranges": {col: (min, max)}, "dates": (first, last)}.
+    """
+    values = {col: set() for col in OPTION_COLS}
+    lows, highs = {}, {}
+    for part in parts:
+        summary = load_part_summary(part)
+        for col, labels in summary["values"].items():
+            values.setdefault(col, set()).update(labels)
+        for col, (lo, hi) in summary["ranges"].items():
+            lows[col] = min(lo, lows.get(col, lo))
+            highs[col] = max(hi, highs.get(col, hi))
+    dates = sorted(p["date"] for p in parts if p["date"] != NO_DATE)
+    return {
+        "values": {col: sorted(labels) for col, labels in values.items()},
+        "ranges": {col: (lows[col], highs[col]) for col in lows},
+        "dates": (dates[0], dates[-1]) if dates else None,
+    }
+
+
+def _options_path(version: str) -> str:
+    return os.path.join(PARTITION_DIR, f"_options-{version}.json")
+
+
+def load_options(version: str, parts: list) -> dict:
+    """
+    partition_options() for one store version, written next to the
+    partitions on first use so later processes read a single file.
+    """
+    path = _options_path(version)
+    try:
+        with open(path, "r") as f:
+            options = json.load(f)
+        options["ranges"] = {col: tuple(r) for col, r in options["ranges"].items()}
+        options["dates"] = tuple(options["dates"]) if options["dates"] else None
+        return options
+    except (json.JSONDecodeError, OSError, KeyError):
+        pass
+    options = partition_options(parts)
+    try:
+        os.makedirs(PARTITION_DIR, exist_ok=True)
+        _write_json(path, options)
+        for name in os.listdir(PARTITION_DIR):
+            if name.startswith("_options-") and name != os.path.basename(path):
+                os.remove(os.path.join(PARTITION_DIR, name))
+    except OSError:
+        pass
+    return options
+
+
+def search_index(labels: list) -> tuple:
+    """(casefolded keys, labels) sorted by key, for prefix_search()."""
+    pairs = sorted((str(label).casefold(), label) for label in labels)
+    return [k for k, _ in pairs], [label for _, label in pairs]
+
+
+def prefix_search(index: tuple, prefix: str, limit: int = 50) -> tuple:
+    """Up to `limit` labels starting with `prefix` (case-insensitive), and how many match."""
+    keys, labels = index
+    prefix = prefix.strip().casefold()
+    lo = bisect.bisect_left(keys, prefix)
+    hi = bisect.bisect_left(keys, prefix + "\U0010ffff") if prefix else len(keys)
+    return labels[lo:min(hi, lo + limit)], hi - lo
+
+
+def empty_table(manifest: dict) -> pd.DataFrame:
+    """A zero-row request table with the store's columns and dtypes."""
+    if manifest["parts"]:
+        df = pd.read_parquet(os.path.join(PARTITION_DIR, manifest["parts"][0]["file"])).head(0)
+        return apply_schema(normalize_dtypes(df.drop(columns=[ROW_HASH], errors='ignore')))
+    return apply_schema(pd.DataFrame({col: pd.Series(dtype=object) for col in manifest["columns"]}))
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# FILTER ENGINE
+# ─────────────────────────────────────────────
+# Built once per dataset load. Each categorical filter column keeps, for every
+# value, the sorted list of rows holding it (a posting list); each range
+# column keeps its rows in value order. A selection starts from the most
+# selective index lookup and only checks the remaining predicates on those
+# candidate rows, so the cost follows the size of the answer rather than the
+# size of the table.
+
+CATEGORICAL_FILTERS = ['CITY', 'VEHICLETYPE', 'DRIVER', 'TRIPTYPE',
+                       'Rider Mobile Number', 'COUNTRY', 'Region', 'Corporate']
+RANGE_FILTERS = ['Date', 'Hour', 'DISTANCE FROM RIDER']
+
+
+class FilterIndex:
+    """
+    Posting lists for the categorical sidebar filters and sorted indexes for
+    the range filters of one request table.
+
+    A filter state is a dict keyed by column:
+    - categorical columns → None (no filter, i.e. 'All') or a list of values;
+      an empty list matches nothing, like an empty multiselect.
+    - range columns → None or an inclusive (low, high) tuple.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self._categories = {}
+        self._codes = {}
+        self._postings = {}
+        self._offsets = {}
+        for col in CATEGORICAL_FILTERS:
+            cat = df[col].cat
+            codes = cat.codes.to_numpy()
+            # Shift by one so missing values (code -1) get their own slot 0.
+            counts = np.bincount(codes.astype(np.int64) + 1, minlength=len(cat.categories) + 1)
+            self._categories[col] = cat.categories
+            self._codes[col] = codes
+            self._postings[col] = np.argsort(codes, kind='stable')
+            self._offsets[col] = np.concatenate(([0], np.cumsum(counts)))
+
+        self._values = {}
+        self._sorted_rows = {}
+        self._sorted_values = {}
+        for col in RANGE_FILTERS:
+            values = df[col].to_numpy()
+            rows = np.flatnonzero(pd.notna(values))
+            rows = rows[np.argsort(values[rows], kind='stable')]
+            self._values[col] = values
+            self._sorted_rows[col] = rows
+            self._sorted_values[col] = values[rows]
+
+    # ── helpers ──
+    def _value_slots(self, col, values):
+        slots = self._categories[col].get_indexer(list(values))
+        return slots[slots >= 0] + 1
+
+    def _bounds(self, col, bounds):
+        dtype = self._values[col].dtype
+        if np.issubdtype(dtype, np.datetime64):
+            return tuple(np.datetime64(pd.Timestamp(b)).astype(dtype) for b in bounds)
+        return tuple(np.asarray(b).astype(dtype) for b in bounds)
+
+    def _range_slice(self, col, bounds):
+        lo, hi = self._bounds(col, bounds)
+        sv = self._sorted_values[col]
+        return np.searchsorted(sv, lo, side='left'), np.searchsorted(sv, hi, side='right')
+
+    def _estimate(self, col, spec):
+        if col in self._codes:
+            slots = self._value_slots(col, spec)
+            offsets = self._offsets[col]
+            return int((offsets[slots + 1] - offsets[slots]).sum())
+        i0, i1 = self._range_slice(col, spec)
+        return int(max(i1 - i0, 0))
+
+    def _lookup(self, col, spec):
+        if col in self._codes:
+            offsets = self._offsets[col]
+            postings = self._postings[col]
+            parts = [postings[offsets[s]:offsets[s + 1]] for s in self._value_slots(col, spec)]
+            rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        else:
+            i0, i1 = self._range_slice(col, spec)
+            rows = self._sorted_rows[col][i0:max(i0, i1)]
+        return np.sort(rows)
+
+    def _keep(self, col, spec, rows):
+        if col in self._codes:
+            allowed = np.zeros(len(self._categories[col]) + 1, dtype=bool)
+            allowed[self._value_slots(col, spec)] = True
+            return rows[allowed[self._codes[col][rows].astype(np.int64) + 1]]
+        lo, hi = self._bounds(col, spec)
+        values = self._values[col][rows]
+        return rows[(values >= lo) & (values <= hi)]
+
+    # ── appended rows ──
+    def extended(self, df: pd.DataFrame) -> "FilterIndex":
+        """
+        Index of `df`, whose first n_rows rows are the rows indexed here and
+        whose categories only gained labels at the end (data_store.append_rows).
+        Posting lists and sorted orders are merged in linear time rather than
+        re-sorted. Returns a new index; sessions still holding this one keep
+        a consistent view.
+        """
+        n_old, n = self.n_rows, len(df)
+        index = FilterIndex.__new__(FilterIndex)
+        index.n_rows = n
+        index._categories, index._codes, index._postings, index._offsets = {}, {}, {}, {}
+        for col in CATEGORICAL_FILTERS:
+            cat = df[col].cat
+            codes = cat.codes.to_numpy()
+            k = len(cat.categories) + 1
+            old_counts = np.diff(self._offsets[col])
+            old_counts = np.concatenate((old_counts, np.zeros(k - len(old_counts), dtype=old_counts.dtype)))
+            new_slots = codes[n_old:].astype(np.int64) + 1
+            new_counts = np.bincount(new_slots, minlength=k)
+            new_before = np.concatenate(([0], np.cumsum(new_counts)[:-1]))
+            offsets = np.concatenate(([0], np.cumsum(old_counts + new_counts)))
+
+            postings = np.empty(n, dtype=np.int64)
+            # Old rows keep their order within a slot, shifted by the new rows of earlier slots…
+            old_slots = np.repeat(np.arange(k), old_counts)
+            postings[np.arange(n_old) + new_before[old_slots]] = self._postings[col]
+            # …and new rows follow the old ones of their slot.
+            order = np.argsort(new_slots, kind='stable')
+            slots = new_slots[order]
+            rank = np.arange(len(order)) - new_before[slots]
+            postings[offsets[slots] + old_counts[slots] + rank] = order + n_old
+
+            index._categories[col] = cat.categories
+            index._codes[col] = codes
+            index._postings[col] = postings
+            index._offsets[col] = offsets
+
+        index._values, index._sorted_rows, index._sorted_values = {}, {}, {}
+        for col in RANGE_FILTERS:
+            values = df[col].to_numpy()
+            added = np.arange(n_old, n)[pd.notna(values[n_old:])]
+            added = added[np.argsort(values[added], kind='stable')]
+            old_rows = self._sorted_rows[col]
+            # side='right': on ties the (earlier) old rows come first, as a stable sort would.
+            at = np.searchsorted(values[old_rows], values[added], side='right')
+            rows = np.insert(old_rows, at, added)
+            index._values[col] = values
+            index._sorted_rows[col] = rows
+            index._sorted_values[col] = values[rows]
+        return index
+
+    # ── public API ──
+    def select(self, state: dict, within: np.ndarray = None) -> np.ndarray:
+        """
+        Sorted row positions matching every active filter in `state`.
+        With `within`, only those rows (a previous, sorted result) are checked.
+        """
+        active = {col: spec for col, spec in state.items() if spec is not None}
+        if within is not None:
+            rows = within
+            for col, spec in active.items():
+                rows = self._keep(col, spec, rows)
+            return rows
+        if not active:
+            return np.arange(self.n_rows)
+        sizes = {col: self._estimate(col, spec) for col, spec in active.items()}
+        first = min(sizes, key=sizes.get)
+        rows = self._lookup(first, active.pop(first))
+        # Cheapest (most selective) predicates first so later ones see fewer rows.
+        for col in sorted(active, key=sizes.get):
+            if len(rows) == 0:
+                break
+            rows = self._keep(col, active[col], rows)
+        return rows
+
+
+def state_key(state: dict) -> tuple:
+    """Hashable, order-insensitive key for a filter state."""
+    return tuple(
+        (col, tuple(sorted(map(str, spec))) if isinstance(spec, list) else spec)
+        for col, spec in sorted(state.items())
+    )
+
+
+# ─────────────────────────────────────────────
+# INCREMENTAL RE-FILTERING
+# ─────────────────────────────────────────────
+def _narrows(col, old, new) -> bool:
+    if old is None:
+        return True
+    if new is None:
+        return False
+    if col in RANGE_FILTERS:
+        return new[0] >= old[0] and new[1] <= old[1]
+    return set(new) <= set(old)
+
+
+def is_narrowing(old: dict, new: dict) -> bool:
+    """True when every row matching `new` also matches `old`."""
+    return old.keys() == new.keys() and all(_narrows(col, old[col], new[col]) for col in new)
+
+
+def changed_filters(old: dict, new: dict) -> dict:
+    """The part of `new` that differs from `old`."""
+    return {col: spec for col, spec in new.items() if spec != old.get(col)}
+
+
+def select_incremental(index: FilterIndex, state: dict, previous: dict = None) -> np.ndarray:
+    """
+    Rows for `state`, reusing `previous` ({'state': ..., 'rows': ...}) when
+    `state` only narrows it: then just the changed filters are checked
+    against the previous rows. Anything else falls back to a full selection.
+    """
+    if previous is not None and is_narrowing(previous['state'], state):
+        return index.select(changed_filters(previous['state'], state), within=previous['rows'])
+    return index.select(state)
@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+
+import filter_engine
+
+# ─────────────────────────────────────────────
+# KPI ENGINE
+# ─────────────────────────────────────────────
+# Every KPI table in the dashboard is a view of the same thing: request counts
+# per group and Category. category_matrix() computes that in one pass over
+# integer codes (np.bincount) and the helpers below derive the rate columns
+# each call site expects.
+
+TRIPS = 'Trips'
+DRIVER_CANCELLATION = 'Driver Cancellation'
+RIDER_CANCELLATION = 'Rider Cancellation'
+NO_DRIVERS_FOUND = 'No Drivers Found'
+TIMEOUT = 'Timeout'
+CATEGORIES = [TRIPS, DRIVER_CANCELLATION, RIDER_CANCELLATION, NO_DRIVERS_FOUND, TIMEOUT]
+# Column of the requests with no Category. They count towards a group's
+# Total Requests (the original tables filtered with != 'No Drivers Found',
+# which keeps them) but towards no rate.
+MISSING_CATEGORY = '(missing)'
+
+
+def count_by(data: pd.DataFrame, group_cols, weight: str = None) -> pd.Series:
+    """
+    Request counts per group. With `weight`, `data` is already aggregated
+    (e.g. the request cube) and the counts are the sum of that column.
+    """
+    grouped = data.groupby(group_cols, observed=True)
+    return grouped[weight].sum() if weight else grouped.size()
+
+
+def _key_codes(values: pd.Series):
+    """
+    (codes, labels) for a grouping key: int64 codes into `labels`, -1 for
+    missing values. Categoricals reuse their codes; other columns are
+    factorized in sorted order, so groups come out in groupby order.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        labels = pd.CategoricalIndex(pd.Categorical.from_codes(np.arange(len(values.cat.categories)),
+                                                               dtype=values.dtype))
+        return values.cat.codes.to_numpy().astype(np.int64), labels
+    codes, labels = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), labels
+
+
+def _group_index(labels: list, codes: list, names: list) -> pd.Index:
+    """Index of the groups with per-key `codes`, shaped like a groupby(observed=True) result."""
+    levels = []
+    for label, code in zip(labels, codes):
+        if isinstance(label, pd.CategoricalIndex):
+            levels.append(pd.Categorical.from_codes(code, dtype=label.dtype))
+        else:
+            levels.append(label.take(code))
+    if len(levels) == 1:
+        return pd.Index(levels[0], name=names[0])
+    return pd.MultiIndex.from_arrays(levels, names=names)
+
+
+def category_counts(data: pd.DataFrame, group_cols=None, weight: str = None):
+    """
+    Request counts per group and Category as an int64 matrix, computed with
+    one np.bincount over integer key codes; no intermediate frames.
+
+    Returns (groups, counts, categories): the Index of the groups present
+    (None without group_cols), a (groups × categories) matrix and the
+    Category labels of its columns. `group_cols` are column names or
+    Series aligned with `data`. Rows with a missing key are not counted, as
+    in groupby; rows with a missing Category are counted in an extra
+    MISSING_CATEGORY column, present only when there are such rows.
+    """
+    keys = [] if group_cols is None else group_cols if isinstance(group_cols, list) else [group_cols]
+    category, categories = _key_codes(data['Category'])
+    if (category < 0).any():
+        category = np.where(category < 0, len(categories), category)
+        categories = pd.Index(list(categories) + [MISSING_CATEGORY], dtype=object)
+    key_codes, key_labels, names = [], [], []
+    for key in keys:
+        values = data[key] if isinstance(key, str) else key
+        codes, labels = _key_codes(values)
+        key_codes.append(codes)
+        key_labels.append(labels)
+        names.append(key if isinstance(key, str) else values.name)
+
+    valid = np.ones(len(category), dtype=bool)
+    for codes in key_codes:
+        valid &= codes >= 0
+    if not valid.all():
+        category = category[valid]
+        key_codes = [codes[valid] for codes in key_codes]
+    weights = data[weight].to_numpy()[valid] if weight else None
+
+    n_categories = len(categories)
+    sizes = tuple(len(labels) for labels in key_labels)
+    n_groups = int(np.prod(sizes)) if keys else 1
+    present = None
+    if not keys:
+        group = np.zeros(len(category), dtype=np.int64)
+    else:
+        group = np.ravel_multi_index(key_codes, sizes) if key_codes[0].size else np.zeros(0, dtype=np.int64)
+        if n_groups * n_categories > max(4 * len(category), 2**20):
+            # Sparse key space (e.g. driver × date): number only the groups that occur.
+            present, group = np.unique(group, return_inverse=True)
+            n_groups = len(present)
+
+    flat = np.bincount(group * n_categories + category, weights=weights, minlength=n_groups * n_categories)
+    counts = flat.reshape(n_groups, n_categories).astype(np.int64)
+    if not keys:
+        return None, counts, categories
+    rows = np.flatnonzero(counts.any(axis=1))
+    flat_groups = rows if present is None else present[rows]
+    groups = _group_index(key_labels, np.unravel_index(flat_groups, sizes), names)
+    return groups, counts[rows], categories
+
+
+def category_matrix(data: pd.DataFrame, group_cols, weight: str = None) -> pd.DataFrame:
+    """
+    Group × Category request counts in a single pass.
+    Rows are the (sorted) groups present in `data`, columns include at least
+    the five known categories (and MISSING_CATEGORY when some rows have no
+    Category); counts are int64.
+    """
+    keys = group_cols if isinstance(group_cols, list) else [group_cols]
+    groups, counts, categories = category_counts(data, keys, weight)
+    present = np.flatnonzero(counts.any(axis=0))
+    matrix = pd.DataFrame(counts[:, present], index=groups,
+                          columns=pd.Index(categories.take(present), dtype=object).astype(str))
+    for c in CATEGORIES:
+        if c not in matrix.columns:
+            matrix[c] = 0
+    return matrix.astype('int64')
+
+
+def _pct(numerator, denominator):
+    return (numerator / denominator.clip(lower=1)) * 100
+
+
+def fulfillment_rate(trips, dc, rc):
+    return _pct(trips, trips + dc + rc)
+
+
+def acceptance_rate(trips, dc, rc, timeout):
+    return _pct(trips, trips + dc + rc + timeout)
+
+
+def _non_ndf_total(matrix):
+    return matrix.sum(axis=1) - matrix[NO_DRIVERS_FOUND]
+
+
+def overall_kpis(data, total_requests, weight=None) -> dict:
+    """The headline KPI boxes (kpi_data) for the filtered data."""
+    _, matrix, categories = category_counts(data, weight=weight)
+    counts = dict(zip(categories.astype(str), matrix[0]))
+    trips = int(counts.get(TRIPS, 0))
+    dc = int(counts.get(DRIVER_CANCELLATION, 0))
+    rc = int(counts.get(RIDER_CANCELLATION, 0))
+    timeouts = int(counts.get(TIMEOUT, 0))
+    no_driver_found = int(counts.get(NO_DRIVERS_FOUND, 0))
+    if trips == 0:
+        fulfillment, acceptance, driver_canc = 0, 0, 0
+    else:
+        fulfillment = round((trips * 100) / max(trips + dc + rc, 1), 2)
+        acceptance = round((trips * 100) / max(trips + dc + rc + timeouts, 1), 2)
+        driver_canc = round((dc * 100) / max(trips + dc + rc + timeouts, 1), 2)
+    return {
+        'Total Requests': total_requests,
+        'Total Trips': trips,
+        'Driver Cancellations': dc,
+        'Rider Cancellations': rc,
+        'Timeouts': timeouts,
+        'No Driver Found Cases': no_driver_found,
+        'Fulfillment Rate (%)': fulfillment,
+        'Acceptance Rate (%)': acceptance,
+        'Driver Cancellation Rate (%)': driver_canc,
+    }
+
+
+# ─────────────────────────────────────────────
+# CALL-SITE SHAPES
+# ─────────────────────────────────────────────
+def build_kpi_table(data, group_col, weight=None):
+    """Per-group counts and rates for the Driver/Clients/Regions/Corporate tables."""
+    m = category_matrix(data, group_col, weight)
+    total = _non_ndf_total(m)
+    m, total = m[total > 0], total[total > 0]
+    kpis = pd.DataFrame({
+        'Total Requests': total,
+        'Total Trips': m[TRIPS],
+        'Driver Cancellation': m[DRIVER_CANCELLATION],
+        'Rider Cancellation': m[RIDER_CANCELLATION],
+        'Timeout': m[TIMEOUT],
+    })
+    kpis['Fulfillment Rate (%)'] = fulfillment_rate(kpis['Total Trips'], kpis['Driver Cancellation'], kpis['Rider Cancellation'])
+    kpis['Acceptance Rate (%)'] = acceptance_rate(kpis['Total Trips'], kpis['Driver Cancellation'], kpis['Rider Cancellation'], kpis['Timeout'])
+    kpis['Driver Cancellation Rate (%)'] = _pct(kpis['Driver Cancellation'], kpis['Total Requests'])
+    kpis['Rider Cancellation (%)'] = _pct(kpis['Rider Cancellation'], kpis['Total Requests'])
+    kpis['Timeout Rate (%)'] = _pct(kpis['Timeout'], kpis['Total Requests'])
+    return kpis.reset_index()
+
+
+def compute_rates_by_hour(data, weight=None):
+    """Hourly FR and AR for the rates line chart."""
+    m = category_matrix(data, 'Hour', weight)
+    m = m[m[[TRIPS, DRIVER_CANCELLATION, RIDER_CANCELLATION, TIMEOUT]].sum(axis=1) > 0]
+    rates = pd.DataFrame({
+        'Trips': m[TRIPS],
+        'DC': m[DRIVER_CANCELLATION],
+        'RC': m[RIDER_CANCELLATION],
+        'Timeout': m[TIMEOUT],
+    })
+    rates['Fulfillment Rate (%)'] = fulfillment_rate(rates['Trips'], rates['DC'], rates['RC'])
+    rates['Acceptance Rate (%)'] = acceptance_rate(rates['Trips'], rates['DC'], rates['RC'], rates['Timeout'])
+    return rates.reset_index()
+
+
+def compute_fulfillment_pivot(data, weight=None):
+    """Region × Hour FR for the heatmap; only cells with at least one trip."""
+    m = category_matrix(data, ['Region', 'Hour'], weight)
+    m = m[m[TRIPS] > 0]
+    pivot = pd.DataFrame({
+        'Trips': m[TRIPS],
+        'DC': m[DRIVER_CANCELLATION],
+        'RC': m[RIDER_CANCELLATION],
+    })
+    pivot['Fulfillment Rate (%)'] = fulfillment_rate(pivot['Trips'], pivot['DC'], pivot['RC'])
+    return pivot.reset_index()
+
+
+def rates_for_group(data, group_col, weight=None):
+    """FR, AR and cancellation/timeout rates for any grouping column, rounded for JSON."""
+    m = category_matrix(data, group_col, weight)
+    total = _non_ndf_total(m)
+    m, total = m[total > 0], total[total > 0]
+    rates = pd.DataFrame({
+        'Trips': m[TRIPS],
+        'DC': m[DRIVER_CANCELLATION],
+        'RC': m[RIDER_CANCELLATION],
+        'Timeout': m[TIMEOUT],
+        'Total Requests': total,
+    })
+    rates['Fulfillment Rate (%)'] = fulfillment_rate(rates['Trips'], rates['DC'], rates['RC'])
+    rates['Acceptance Rate (%)'] = acceptance_rate(rates['Trips'], rates['DC'], rates['RC'], rates['Timeout'])
+    rates['Driver Cancellation Rate (%)'] = _pct(rates['DC'], rates['Total Requests'])
+    rates['Rider Cancellation Rate (%)'] = _pct(rates['RC'], rates['Total Requests'])
+    rates['Timeout Rate (%)'] = _pct(rates['Timeout'], rates['Total Requests'])
+    float_cols = rates.select_dtypes(include='float').columns
+    rates[float_cols] = rates[float_cols].round(2)
+    return rates.reset_index()
+
+
+# ─────────────────────────────────────────────
+# REQUEST CUBE
+# ─────────────────────────────────────────────
+# Request counts keyed by the low-cardinality dimensions. When no filter
+# touches a column outside the cube (driver, rider, distance), every chart
+# and KPI can be answered from it with weight='count' instead of the rows.
+CUBE_DIMS = ['Date', 'Hour', 'Region', 'CITY', 'COUNTRY', 'VEHICLETYPE',
+             'TRIPTYPE', 'Corporate', 'Category']
+NON_CUBE_FILTERS = ['DRIVER', 'Rider Mobile Number', 'DISTANCE FROM RIDER']
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse the request table to one row per CUBE_DIMS combination.
+    Rows without a distance are left out: the (always present) distance
+    filter never matches them, so the cube agrees with the filtered rows.
+    """
+    df = df[df['DISTANCE FROM RIDER'].notna()]
+    return df.groupby(CUBE_DIMS, observed=True, dropna=False).size().reset_index(name='count')
+
+
+def extend_cube(cube: pd.DataFrame, part: pd.DataFrame) -> pd.DataFrame:
+    """
+    The cube with the rows of `part` added. `part` carries the table's
+    (possibly grown) categories, which the existing cube is widened to.
+    """
+    added = build_cube(part)
+    widened = {
+        col: cube[col].cat.set_categories(added[col].cat.categories)
+        for col in CUBE_DIMS
+        if isinstance(cube[col].dtype, pd.CategoricalDtype) and isinstance(added[col].dtype, pd.CategoricalDtype)
+    }
+    combined = pd.concat([cube.assign(**widened), added], ignore_index=True)
+    return combined.groupby(CUBE_DIMS, observed=True, dropna=False)['count'].sum().reset_index()
+
+
+def filter_cube(cube: pd.DataFrame, state: dict) -> pd.DataFrame:
+    """Apply the cube columns of a filter state (see filter_engine) to the cube."""
+    mask = pd.Series(True, index=cube.index)
+    for col, spec in state.items():
+        if spec is None or col not in CUBE_DIMS:
+            continue
+        if col in filter_engine.RANGE_FILTERS:
+            mask &= (cube[col] >= spec[0]) & (cube[col] <= spec[1])
+        else:
+            mask &= cube[col].isin(spec)
+    return cube[mask]
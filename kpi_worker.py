@@ -0,0 +1,44 @@
+"""
+Worker process of the parallel_kpi pool.
+
+    python -m kpi_worker
+
+Started by parallel_kpi.WorkerPool, never by hand. It listens on a local
+socket, prints the socket's address on stdout, and then runs the jobs its
+pool sends until the connection closes. The key that authenticates the
+pool comes in SUPPLY_KPI_WORKER_KEY (hex). The worker imports only
+parallel_kpi and kpi_engine, never the dashboard script.
+"""
+import os
+import sys
+from multiprocessing.connection import Listener
+
+import parallel_kpi
+
+
+def main():
+    listener = Listener(authkey=bytes.fromhex(os.environ.pop("SUPPLY_KPI_WORKER_KEY")))
+    print(listener.address, flush=True)
+    # Nothing else may go to the pipe the pool reads the address from.
+    sys.stdout = sys.stderr
+    with listener, listener.accept() as conn:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                return
+            if job is None:
+                return
+            spec, func_name, args = job
+            try:
+                result = (True, parallel_kpi._run_job(spec, func_name, args))
+            except Exception as exc:
+                result = (False, exc)
+            try:
+                conn.send(result)
+            except Exception as exc:   # the result or the exception would not pickle
+                conn.send((False, RuntimeError(f"{func_name}: {exc!r}")))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,30 @@ import pandas as pd
 import altair as alt
 import pydeck as pdk
 import os
-import json
-import hashlib
 import re
+import math
+import logging
+import time
 from datetime import datetime
 
+import data_store
+import filter_engine
+import kpi_engine
+import result_cache
+import nexus_summary
+import nexus_client
+import nexus_local
+import map_layers
+import table_pager
+import chart_data
+import request_table
+import parallel_kpi
+import rankings
+import user_store
+import profiling
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
 # Set page configuration to wide
 st.set_page_config(
     page_title="Supply Dashboard",
@@ -15,6 +34,15 @@ st.set_page_config(
     layout="wide"
 )
 
+# Per-section timings of this rerun (see profiling.py), and an opt-in cProfile
+# capture requested from the admin profile panel.
+rerun_timer = profiling.RerunTimer()
+_unfinished_profile = st.session_state.pop("profile:active", None)
+if _unfinished_profile is not None:   # the previous rerun stopped early (st.stop / st.rerun)
+    _unfinished_profile.disable()
+if st.session_state.pop("profile:next", False):
+    st.session_state["profile:active"] = profiling.start_profile()
+
 # ─────────────────────────────────────────────
 # AUTH CONFIG
 # ─────────────────────────────────────────────
@@ -53,66 +81,15 @@ _SEED_ACCOUNTS = {
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 _DATA_DIR = os.path.join(_BASE_DIR, ".app_data")
 os.makedirs(_DATA_DIR, exist_ok=True)
-USERS_FILE = os.path.join(_DATA_DIR, "users.json")
-
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def _apply_seeds(users: dict) -> dict:
-    """
-    Ensure every seeded account exists in the users dict.
-    - If an account doesn't exist yet → create it as active.
-    - If it exists but was added externally with wrong password → keep existing record untouched.
-    - Revoked status set by admin is PRESERVED (we never force active=True on existing accounts).
-    """
-    changed = False
-    for email, info in _SEED_ACCOUNTS.items():
-        if email not in users:
-            users[email] = {
-                "password": hash_password(info["password_plain"]),
-                "role": info["role"],
-                "active": True,
-                "created_at": "2025-01-01T00:00:00",
-                "seeded": True,
-            }
-            changed = True
-        else:
-            # Always keep the password and role in sync with the seed definition
-            # so a reboot doesn't lock anyone out due to a corrupt hash.
-            correct_hash = hash_password(info["password_plain"])
-            if users[email].get("password") != correct_hash:
-                users[email]["password"] = correct_hash
-                changed = True
-            if users[email].get("role") != info["role"]:
-                users[email]["role"] = info["role"]
-                changed = True
-    return users, changed
-
-
-def load_users() -> dict:
-    try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, "r") as f:
-                users = json.load(f)
-        else:
-            users = {}
-    except (json.JSONDecodeError, OSError):
-        users = {}
 
-    users, changed = _apply_seeds(users)
-    if changed:
-        save_users(users)
-    return users
+@st.cache_resource
+def get_user_store() -> user_store.UserStore:
+    """One store per process, shared by every session."""
+    return user_store.open_store(_DATA_DIR, _SEED_ACCOUNTS)
 
 
-def save_users(users: dict):
-    # Atomic write: temp file → rename, so a crash never corrupts the store.
-    tmp_path = USERS_FILE + ".tmp"
-    with open(tmp_path, "w") as f:
-        json.dump(users, f, indent=2)
-    os.replace(tmp_path, USERS_FILE)
+USERS = get_user_store()
 
 
 def is_valid_email(email: str) -> bool:
@@ -120,14 +97,13 @@ def is_valid_email(email: str) -> bool:
 
 
 def authenticate(email: str, password: str) -> tuple:
-    users = load_users()
     email = email.strip().lower()
-    if email not in users:
+    user = USERS.get(email)
+    if user is None:
         return False, "Email not registered."
-    user = users[email]
     if not user.get("active", True):
         return False, "Your access has been revoked. Please contact the admin."
-    if user["password"] != hash_password(password):
+    if user["password"] != user_store.hash_password(password):
         return False, "Incorrect password."
     return True, "ok"
 
@@ -173,10 +149,9 @@ def show_login():
             else:
                 ok, msg = authenticate(email_input, password_input)
                 if ok:
-                    users = load_users()
                     st.session_state["authenticated"] = True
                     st.session_state["current_user"]  = email_input.strip().lower()
-                    st.session_state["current_role"]  = users[email_input.strip().lower()]["role"]
+                    st.session_state["current_role"]  = USERS.get(email_input.strip().lower())["role"]
                     st.rerun()
                 else:
                     st.error(f"❌ {msg}")
@@ -187,7 +162,7 @@ def show_login():
 # ─────────────────────────────────────────────
 def show_admin_panel():
     st.write("## 🔐 Admin Panel – User Management")
-    users = load_users()
+    users = USERS.all()
 
     st.write("### Registered Users")
     user_rows = []
@@ -212,18 +187,16 @@ def show_admin_panel():
             new_email_clean = new_email.strip().lower()
             if not is_valid_email(new_email_clean):
                 st.error("Email must be @little.africa format.")
-            elif new_email_clean in users:
-                st.warning("This email is already registered.")
             elif len(new_password) < 6:
                 st.error("Password must be at least 6 characters.")
+            elif not USERS.add(new_email_clean, {
+                "password": user_store.hash_password(new_password),
+                "role": new_role,
+                "active": True,
+                "created_at": datetime.now().isoformat()
+            }):   # checked under the store's lock, not against `users`
+                st.warning("This email is already registered.")
             else:
-                users[new_email_clean] = {
-                    "password": hash_password(new_password),
-                    "role": new_role,
-                    "active": True,
-                    "created_at": datetime.now().isoformat()
-                }
-                save_users(users)
                 st.success(f"✅ {new_email_clean} added successfully! They can now log in even after restarts.")
                 st.rerun()
 
@@ -240,14 +213,12 @@ def show_admin_panel():
             with c1:
                 if is_active:
                     if st.button("🚫 Revoke Access", key="revoke_btn"):
-                        users[target]["active"] = False
-                        save_users(users)
+                        USERS.update(target, active=False)
                         st.success(f"Access revoked for {target}.")
                         st.rerun()
                 else:
                     if st.button("✅ Restore Access", key="restore_btn"):
-                        users[target]["active"] = True
-                        save_users(users)
+                        USERS.update(target, active=True)
                         st.success(f"Access restored for {target}.")
                         st.rerun()
             with c2:
@@ -256,22 +227,46 @@ def show_admin_panel():
                     if len(new_pw) < 6:
                         st.error("Min 6 characters.")
                     else:
-                        users[target]["password"] = hash_password(new_pw)
-                        save_users(users)
+                        USERS.update(target, password=user_store.hash_password(new_pw))
                         st.success(f"Password reset for {target}.")
                         st.rerun()
             with c3:
                 st.write("")
                 st.write("")
                 if st.button("🗑️ Delete User", key="delete_btn"):
-                    del users[target]
-                    save_users(users)
+                    USERS.delete(target)
                     st.success(f"{target} deleted.")
                     st.rerun()
 
     st.markdown("---")
 
 
+def show_profile_panel():
+    runs = profiling.HISTORY.runs()
+    page_runs = [r for r in runs if r["kind"] == "page"]
+    if page_runs:
+        last = page_runs[-1]
+        st.write(f"#### Last rerun: {last['total ms']:,.0f} ms ({last['started']:%H:%M:%S})")
+        st.dataframe(profiling.run_frame(last), use_container_width=True, hide_index=True)
+        st.write(f"#### Last {len(runs)} runs")
+        st.dataframe(profiling.stage_stats(runs), use_container_width=True, hide_index=True)
+        st.download_button("Download history (CSV)", profiling.stage_frame(runs).to_csv(index=False),
+                           file_name="rerun_profile.csv", mime="text/csv")
+    else:
+        st.info("No finished reruns recorded yet.")
+    st.caption("Wall time, rows in/out and resident-memory change per section, across all sessions. "
+               "'chat' runs are questions answered by Nexus Phil.")
+
+    st.button("Profile the next rerun with cProfile", key="profile_next",
+              on_click=lambda: st.session_state.update({"profile:next": True}))
+    profile_stats = st.session_state.get("profile:stats")
+    if profile_stats is not None:
+        st.download_button("Download cProfile stats", profile_stats, file_name="rerun.prof",
+                           mime="application/octet-stream", key="profile_download")
+        st.caption("Open with `python -m pstats rerun.prof` or snakeviz.")
+        st.code(profiling.top_functions(profile_stats, 25))
+
+
 # ─────────────────────────────────────────────
 # AUTH GATE
 # ─────────────────────────────────────────────
@@ -308,42 +303,92 @@ with st.sidebar:
 if current_role == "admin":
     with st.expander("🔐 Admin Panel – User Management", expanded=False):
         show_admin_panel()
+    with st.expander("⏱️ Rerun Profile", expanded=False):
+        show_profile_panel()
+rerun_timer.mark("auth + admin")
 
 
 # ─────────────────────────────────────────────
 # Loading data
 # ─────────────────────────────────────────────
-@st.cache_data
-def load_data():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, 'requests.xlsx')
-    df = pd.read_excel(file_path)
-    return df
+# A changed workbook and any extracts waiting in .app_data/inbox/ are
+# appended as date partitions before the page is built.
+try:
+    for failed_extract in [r for r in data_store.ingest_pending(data_store.SOURCE_FILE) if r.get("error")]:
+        st.warning(f"Extract {failed_extract['extract']} could not be ingested and was moved to "
+                   f"{os.path.join(data_store.INBOX_DIR, 'failed')}: {failed_extract['error']}")
+except Exception as exc:
+    logging.getLogger("data_store").exception("Ingest failed")
+    st.warning(f"New data could not be ingested; showing the data already stored. ({exc})")
+partition_manifest = data_store.read_partition_manifest()
+store_version = data_store.parts_version(p["file"] for p in partition_manifest["parts"])
+rerun_timer.mark("ingest")
+
+
+@st.cache_resource(max_entries=1)
+def load_sidebar_options(version, _parts):
+    # Built once per store version from the per-partition summaries (and kept
+    # on disk next to them), so the options cover the whole history without
+    # loading it. Driver and rider lists also get a prefix-search index.
+    options = data_store.load_options(version, _parts)
+    options["search"] = {col: data_store.search_index(options["values"][col]) for col in PREFIX_PICKERS}
+    return options
+
+
+@st.cache_resource(max_entries=4)
+def load_request_table(date_from, date_to):
+    # Rows of the selected dates only, shared by every session viewing them;
+    # each rerun loads just the partitions that arrived since the last one.
+    return request_table.RequestTable(date_from, date_to)
+
+PREFIX_PICKERS = ['DRIVER', 'Rider Mobile Number']
+PICKER_LIMIT = 50
+
+sidebar_options = load_sidebar_options(store_version, partition_manifest["parts"])
+option_values = sidebar_options["values"]
 
-df = load_data()
+
+def prefix_picker(label, col):
+    """
+    Selectbox for a high-cardinality column: only the labels starting with
+    the typed prefix (at most PICKER_LIMIT) are sent to the browser.
+    """
+    prefix = st.sidebar.text_input(f'Search {label}', key=f"{col}:prefix",
+                                   placeholder="Type the first characters")
+    matches, total = data_store.prefix_search(sidebar_options["search"][col], prefix, PICKER_LIMIT)
+    current = st.session_state.get(f"{col}:pick", 'All')
+    if current != 'All' and current not in matches:
+        matches = [current] + matches
+    selected = st.sidebar.selectbox(f'Select {label}', ['All'] + matches, key=f"{col}:pick")
+    if total > PICKER_LIMIT:
+        st.sidebar.caption(f"Showing {PICKER_LIMIT} of {total:,} matches – keep typing to narrow down.")
+    return selected
 
 
 # ─────────────────────────────────────────────
 # SIDEBAR FILTERS
 # ─────────────────────────────────────────────
 st.sidebar.title('Filters')
-selected_cities = st.sidebar.multiselect('Select City', ['All'] + sorted(df['CITY'].unique(), key=str))
-selected_vehicle_types = st.sidebar.multiselect('Select Vehicle Type', ['All'] + sorted(df['VEHICLETYPE'].astype(str).unique()))
+selected_cities = st.sidebar.multiselect('Select City', ['All'] + option_values['CITY'])
+selected_vehicle_types = st.sidebar.multiselect('Select Vehicle Type', ['All'] + option_values['VEHICLETYPE'])
 selected_date_from = st.sidebar.date_input('Select Date From')
 selected_date_to = st.sidebar.date_input('Select Date To')
-selected_driver = st.sidebar.selectbox('Select Driver', ['All'] + sorted(df['DRIVER'].astype(str).unique()))
-selected_trip_type = st.sidebar.selectbox('Select Trip Type', ['All'] + sorted(df['TRIPTYPE'].astype(str).unique()))
-selected_rider = st.sidebar.selectbox('Select Rider', ['All'] + sorted(df['Rider Mobile Number'].astype(str).unique()))
-selected_country = st.sidebar.selectbox('Select Country', ['All'] + sorted(df['COUNTRY'].astype(str).unique()))
-selected_region = st.sidebar.selectbox('Select Region', ['All'] + sorted(df['Region'].unique(), key=str))
-selected_corporate = st.sidebar.selectbox('Select Corporate', ['All'] + sorted(df['Corporate'].unique(), key=str))
+selected_driver = prefix_picker('Driver', 'DRIVER')
+selected_trip_type = st.sidebar.selectbox('Select Trip Type', ['All'] + option_values['TRIPTYPE'])
+selected_rider = prefix_picker('Rider', 'Rider Mobile Number')
+selected_country = st.sidebar.selectbox('Select Country', ['All'] + option_values['COUNTRY'])
+selected_region = st.sidebar.selectbox('Select Region', ['All'] + option_values['Region'])
+selected_corporate = st.sidebar.selectbox('Select Corporate', ['All'] + option_values['Corporate'])
 
 # ── Distance from Rider range filter ──
 st.sidebar.markdown("---")
 st.sidebar.subheader("📏 Distance from Rider Filter")
 dist_col = 'DISTANCE FROM RIDER'
-dist_min_val = float(df[dist_col].min())
-dist_max_val = float(df[dist_col].max())
+# Distances are float32; widen the bounds to whole hundredths so the
+# default range still contains the extreme rows.
+dist_lo, dist_hi = sidebar_options["ranges"].get(dist_col, (0.0, 0.0))
+dist_min_val = math.floor(dist_lo * 100) / 100
+dist_max_val = math.ceil(dist_hi * 100) / 100
 dist_range = st.sidebar.slider(
     'Distance from Rider (km)',
     min_value=dist_min_val,
@@ -355,8 +400,7 @@ dist_range = st.sidebar.slider(
 # ── Hour range filter ──
 st.sidebar.markdown("---")
 st.sidebar.subheader("🕐 Hour Filter")
-hour_min_val = int(df['Hour'].min())
-hour_max_val = int(df['Hour'].max())
+hour_min_val, hour_max_val = (int(h) for h in sidebar_options["ranges"].get('Hour', (0, 23)))
 hour_range = st.sidebar.slider(
     'Hour of Day',
     min_value=hour_min_val,
@@ -364,6 +408,7 @@ hour_range = st.sidebar.slider(
     value=(hour_min_val, hour_max_val),
     step=1
 )
+rerun_timer.mark("sidebar")
 
 
 # ─────────────────────────────────────────────
@@ -372,42 +417,135 @@ hour_range = st.sidebar.slider(
 selected_date_from = pd.Timestamp(selected_date_from)
 selected_date_to = pd.Timestamp(selected_date_to)
 
-filtered_df = df[
-    ((df['CITY'].isin(selected_cities)) | ('All' in selected_cities)) &
-    ((df['VEHICLETYPE'].astype(str).isin(selected_vehicle_types)) | ('All' in selected_vehicle_types)) &
-    ((df['Date'] >= selected_date_from) & (df['Date'] <= selected_date_to)) &
-    ((df['DRIVER'] == selected_driver) | (selected_driver == 'All')) &
-    ((df['TRIPTYPE'] == selected_trip_type) | (selected_trip_type == 'All')) &
-    ((df['Rider Mobile Number'].astype(str) == selected_rider) | (selected_rider == 'All')) &
-    ((df['COUNTRY'] == selected_country) | (selected_country == 'All')) &
-    ((df['Region'] == selected_region) | (selected_region == 'All')) &
-    ((df['Corporate'] == selected_corporate) | (selected_corporate == 'All')) &
-    ((df[dist_col] >= dist_range[0]) & (df[dist_col] <= dist_range[1])) &
-    ((df['Hour'] >= hour_range[0]) & (df['Hour'] <= hour_range[1]))
-]
+# Only the partitions of the selected dates are loaded.
+requests_table = load_request_table(selected_date_from, selected_date_to)
+requests_table.refresh()
+df, filter_index, request_cube, data_version = requests_table.snapshot()
+memory_report = requests_table.memory_report
+rerun_timer.mark("load", rows_out=len(df))
+
+if current_role == "admin":
+    with st.expander("🧮 Data Memory Report", expanded=False):
+        if memory_report is not None:
+            st.dataframe(memory_report, use_container_width=True, hide_index=True)
+    with st.expander("⚡ Result Cache", expanded=False):
+        st.dataframe(pd.DataFrame([result_cache.RESULTS.stats()]), use_container_width=True, hide_index=True)
+        if st.button("Clear result cache", key="clear_result_cache"):
+            result_cache.RESULTS.clear()
+            st.rerun()
+    with st.expander("📥 Data Ingestion", expanded=False):
+        st.caption(
+            f"{len(partition_manifest['parts']):,} partition files; {len(df):,} rows loaded for the selected dates "
+            f"(version {data_version}). "
+            f"Drop daily xlsx/csv/jsonl extracts into {data_store.INBOX_DIR} or upload one here."
+        )
+        extracts = pd.DataFrame(partition_manifest["extracts"].values())
+        if not extracts.empty:
+            st.dataframe(extracts, use_container_width=True, hide_index=True)
+        upload = st.file_uploader("Upload extract", type=[t.lstrip('.') for t in data_store.EXTRACT_TYPES],
+                                  key="extract_upload")
+        if upload is not None and st.button("Ingest extract", key="ingest_extract"):
+            data_store.add_to_inbox(upload.name, upload.getbuffer())
+            st.rerun()
+
+filter_state = {
+    'CITY':                None if 'All' in selected_cities else selected_cities,
+    'VEHICLETYPE':         None if 'All' in selected_vehicle_types else selected_vehicle_types,
+    'DRIVER':              None if selected_driver == 'All' else [selected_driver],
+    'TRIPTYPE':            None if selected_trip_type == 'All' else [selected_trip_type],
+    'Rider Mobile Number': None if selected_rider == 'All' else [selected_rider],
+    'COUNTRY':             None if selected_country == 'All' else [selected_country],
+    'Region':              None if selected_region == 'All' else [selected_region],
+    'Corporate':           None if selected_corporate == 'All' else [selected_corporate],
+    'Date':                (selected_date_from, selected_date_to),
+    dist_col:              dist_range,
+    'Hour':                hour_range,
+}
+filter_key = filter_engine.state_key(filter_state)
+
+
+def cached(artifact, compute):
+    """Memoize a derived artifact per dataset version and filter state, across sessions."""
+    return result_cache.RESULTS.get_or_compute((data_version, filter_key, artifact), compute)
+
 
-# Drop rows with NaN Lat/Lon for map
-map_df = filtered_df.dropna(subset=['Latitude', 'Longitude']).copy()
+def paged_table(artifact, data, hide_index=True):
+    """
+    Searchable, sortable view of a (cached) table. Search and sort run on the
+    server and are memoized per filter state; only the current page is sent.
+    """
+    search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    query = search_col.text_input("Search", key=f"{artifact}:search", placeholder="Search text columns")
+    sort_by = sort_col.selectbox("Sort by", ["(table order)"] + list(data.columns), key=f"{artifact}:sort")
+    descending = order_col.toggle("Descending", key=f"{artifact}:desc")
+    page_size = size_col.selectbox("Rows per page", table_pager.PAGE_SIZES, index=1, key=f"{artifact}:size")
+
+    sort_by = None if sort_by == "(table order)" else sort_by
+    needle = query.strip().lower()
+    matches = cached(f"{artifact}:search:{needle}", lambda: table_pager.search_positions(data, needle))
+    order = cached(f"{artifact}:sort:{sort_by}:{descending}",
+                   lambda: table_pager.sort_positions(data, sort_by, not descending))
+    positions = table_pager.page_positions(order, matches, len(data))
+
+    total = len(positions)
+    pages = table_pager.page_count(total, page_size)
+    page_key = f"{artifact}:page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key=page_key)
+    st.dataframe(table_pager.page_slice(data, positions, page, page_size),
+                 use_container_width=True, hide_index=hide_index)
+    first = (page - 1) * page_size
+    st.caption(
+        f"Rows {min(first + 1, total):,}–{min(first + page_size, total):,} of {total:,}"
+        + (f" matching '{query.strip()}' (of {len(data):,})" if needle else "")
+    )
+
+
+def show_chart(name, chart, **kwargs):
+    """st.altair_chart, plus the size of the spec sent to the browser for admins."""
+    st.altair_chart(chart, **kwargs)
+    if current_role == "admin":
+        spec_bytes = cached(f"chart_bytes:{name}", lambda: chart_data.spec_bytes(chart))
+        st.caption(f"Chart data: {len(chart.data):,} rows, ~{spec_bytes / 1024:,.1f} KB spec")
+
+
+def lazy_section(key, label):
+    """
+    Expander whose content is only computed while it is open: Streamlit
+    reruns when it is toggled and `.open` tells the script its state.
+    """
+    return st.expander(label, key=f"section:{key}", on_change="rerun")
+
+
+# Slider scrubbing usually narrows the previous selection, so only the
+# previous rows need re-checking; widening falls back to a full selection.
+previous_filter = st.session_state.get("last_filter")
+if previous_filter is not None and previous_filter["version"] != data_version:
+    previous_filter = None
+filtered_rows = cached("rows", lambda: filter_engine.select_incremental(filter_index, filter_state, previous_filter))
+st.session_state["last_filter"] = {"version": data_version, "state": filter_state, "rows": filtered_rows}
+# With every row selected the table itself is used; iloc would copy it.
+filtered_df = df if len(filtered_rows) == len(df) else df.iloc[filtered_rows]
+
+# Charts and KPIs only need counts over the cube dimensions. Unless a filter
+# touches a column outside the cube, aggregate the (much smaller) cube.
+use_cube = (
+    all(filter_state[col] is None for col in ['DRIVER', 'Rider Mobile Number'])
+    and dist_range == (dist_min_val, dist_max_val)
+)
+if use_cube:
+    agg_df, agg_weight = cached("cube", lambda: kpi_engine.filter_cube(request_cube, filter_state)), 'count'
+else:
+    agg_df, agg_weight = filtered_df, None
+rerun_timer.mark("filter", rows_in=len(df), rows_out=len(filtered_df))
 
 
 # ─────────────────────────────────────────────
 # KPI CALCULATIONS
 # ─────────────────────────────────────────────
 total_requests = len(filtered_df)
-total_trips = filtered_df[filtered_df['Category'] == 'Trips'].shape[0]
-driver_cancellations_kpi = filtered_df[filtered_df['Category'] == 'Driver Cancellation'].shape[0]
-rider_cancellations_kpi = filtered_df[filtered_df['Category'] == 'Rider Cancellation'].shape[0]
-no_driver_found = filtered_df[filtered_df['Category'] == 'No Drivers Found'].shape[0]
-timeouts_kpi = filtered_df[filtered_df['Category'] == 'Timeout'].shape[0]
-
-if total_trips == 0:
-    fulfillment_rate = 0
-    acceptance_rate = 0
-    driver_canc_rate = 0
-else:
-    fulfillment_rate = round((total_trips * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi, 1), 2)
-    acceptance_rate = round((total_trips * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi + timeouts_kpi, 1), 2)
-    driver_canc_rate = round((driver_cancellations_kpi * 100) / max(total_trips + driver_cancellations_kpi + rider_cancellations_kpi + timeouts_kpi, 1), 2)
+kpi_data = cached("kpi_data", lambda: kpi_engine.overall_kpis(agg_df, total_requests, agg_weight))
 
 
 # ─────────────────────────────────────────────
@@ -417,18 +555,6 @@ st.title('🚕 Supply Requests Dashboard')
 st.info(f"📏 Distance from Rider filter active: **{dist_range[0]} – {dist_range[1]} km** | Showing **{total_requests}** requests")
 st.write('## Supply KPIs')
 
-kpi_data = {
-    'Total Requests': total_requests,
-    'Total Trips': total_trips,
-    'Driver Cancellations': driver_cancellations_kpi,
-    'Rider Cancellations': rider_cancellations_kpi,
-    'Timeouts': timeouts_kpi,
-    'No Driver Found Cases': no_driver_found,
-    'Fulfillment Rate (%)': fulfillment_rate,
-    'Acceptance Rate (%)': acceptance_rate,
-    'Driver Cancellation Rate (%)': driver_canc_rate
-}
-
 box_style = """
     background-color: #00008B;
     color: white;
@@ -452,13 +578,18 @@ with col3:
     for k, v in kpi_data.items():
         if k in ['Fulfillment Rate (%)', 'Acceptance Rate (%)', 'Driver Cancellation Rate (%)']:
             st.markdown(f'<div style="{box_style}">{k}: {v}</div>', unsafe_allow_html=True)
+rerun_timer.mark("KPIs", rows_in=len(agg_df))
 
 
 # ─────────────────────────────────────────────
 # RAW DATA
 # ─────────────────────────────────────────────
 st.write('## 📑 Filtered Raw Data')
-st.write(filtered_df)
+raw_section = lazy_section("raw_rows", "Show the filtered rows")
+with raw_section:
+    if raw_section.open:
+        paged_table("raw_rows", filtered_df, hide_index=False)
+rerun_timer.mark("raw data table", rows_in=len(filtered_df))
 
 
 # ─────────────────────────────────────────────
@@ -466,44 +597,36 @@ st.write(filtered_df)
 # ─────────────────────────────────────────────
 st.write('## 📊 Data Visualization')
 
-request_count_by_date = filtered_df.groupby(['VEHICLETYPE', 'Date']).size().reset_index(name='count')
-chart1 = alt.Chart(request_count_by_date).mark_line(interpolate='basis').encode(
-    x=alt.X('Date:T', axis=alt.Axis(format='%Y-%m-%d'), title='Date'),
+request_count_by_date = cached("count_by_date", lambda: kpi_engine.count_by(agg_df, ['VEHICLETYPE', 'Date'], agg_weight).reset_index(name='count'))
+# Long ranges are charted per week or month, and small vehicle types as "Other".
+date_grain = chart_data.time_grain(request_count_by_date['Date'].min(), request_count_by_date['Date'].max()) \
+    if not request_count_by_date.empty else 'day'
+count_by_date_chart = cached(f"chart:count_by_date:{date_grain}",
+                             lambda: chart_data.date_series(request_count_by_date, 'VEHICLETYPE', date_grain))
+chart1 = alt.Chart(count_by_date_chart).mark_line(interpolate='basis').encode(
+    x=alt.X('Date:T', axis=alt.Axis(format=chart_data.GRAIN_FORMATS[date_grain]),
+            title='Date' if date_grain == 'day' else f'Date ({date_grain})'),
     y=alt.Y('count:Q', title='Request Count'),
     color='VEHICLETYPE:N',
     tooltip=['Date', 'count']
 ).properties(width=1500, height=400, title='Request Count by Vehicle Type Over Time').interactive()
-st.altair_chart(chart1)
+show_chart("count_by_date", chart1)
+rerun_timer.mark("chart: count by date", rows_in=len(agg_df), rows_out=len(count_by_date_chart))
 
-request_count_by_hour = filtered_df.groupby(['Category', 'Hour']).size().reset_index(name='count')
+request_count_by_hour = cached("count_by_hour", lambda: kpi_engine.count_by(agg_df, ['Category', 'Hour'], agg_weight).reset_index(name='count'))
 chart2 = alt.Chart(request_count_by_hour).mark_line(interpolate='basis').encode(
     x=alt.X('Hour:O', title='Hour'),
     y=alt.Y('count:Q', title='Request Count'),
     color='Category:N',
     tooltip=['Hour', 'count']
 ).properties(width=1500, height=400, title='Request Count by Category Over Hour').interactive()
-st.altair_chart(chart2)
+show_chart("count_by_hour", chart2)
+rerun_timer.mark("chart: count by hour", rows_in=len(agg_df), rows_out=len(request_count_by_hour))
 
 # ── Line chart: Fulfillment Rate & Acceptance Rate by Hour ──
 st.write('### 📈 Fulfillment Rate & Acceptance Rate by Hour')
 
-def compute_rates_by_hour(data):
-    trips = data[data['Category'] == 'Trips'].groupby('Hour').size().reset_index(name='Trips')
-    dc = data[data['Category'] == 'Driver Cancellation'].groupby('Hour').size().reset_index(name='DC')
-    rc = data[data['Category'] == 'Rider Cancellation'].groupby('Hour').size().reset_index(name='RC')
-    to = data[data['Category'] == 'Timeout'].groupby('Hour').size().reset_index(name='Timeout')
-    merged = trips.merge(dc, on='Hour', how='outer') \
-                  .merge(rc, on='Hour', how='outer') \
-                  .merge(to, on='Hour', how='outer').fillna(0)
-    merged['Fulfillment Rate (%)'] = (
-        merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC']).clip(lower=1)
-    ) * 100
-    merged['Acceptance Rate (%)'] = (
-        merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC'] + merged['Timeout']).clip(lower=1)
-    ) * 100
-    return merged
-
-rates_by_hour = compute_rates_by_hour(filtered_df)
+rates_by_hour = cached("rates_by_hour", lambda: kpi_engine.compute_rates_by_hour(agg_df, agg_weight))
 if not rates_by_hour.empty:
     rates_melted = rates_by_hour[['Hour', 'Fulfillment Rate (%)', 'Acceptance Rate (%)']].melt(
         id_vars='Hour', var_name='Metric', value_name='Rate (%)'
@@ -517,256 +640,229 @@ if not rates_by_hour.empty:
         )),
         tooltip=['Hour', 'Metric', alt.Tooltip('Rate (%):Q', format='.2f')]
     ).properties(width=1500, height=400, title='Fulfillment Rate & Acceptance Rate by Hour of Day').interactive()
-    st.altair_chart(chart_rates)
+    show_chart("rates_by_hour", chart_rates)
 else:
     st.warning("Not enough data to compute hourly rates.")
+rerun_timer.mark("chart: rates by hour", rows_in=len(agg_df), rows_out=len(rates_by_hour))
 
 
 # ─────────────────────────────────────────────
 # HEAT MAPS
 # ─────────────────────────────────────────────
 st.write('## 🌡️ Hourly Heatmaps by Region')
-st.write('### Fulfilment Rate Heatmap (Region × Hour)')
-
-def compute_fulfillment_pivot(data):
-    trips = data[data['Category'] == 'Trips'].groupby(['Region', 'Hour']).size().reset_index(name='Trips')
-    dc = data[data['Category'] == 'Driver Cancellation'].groupby(['Region', 'Hour']).size().reset_index(name='DC')
-    rc = data[data['Category'] == 'Rider Cancellation'].groupby(['Region', 'Hour']).size().reset_index(name='RC')
-    merged = trips.merge(dc, on=['Region', 'Hour'], how='left').merge(rc, on=['Region', 'Hour'], how='left').fillna(0)
-    merged['Fulfillment Rate (%)'] = (merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC']).clip(lower=1)) * 100
-    return merged
-
-fr_data = compute_fulfillment_pivot(filtered_df)
-if not fr_data.empty:
-    all_regions_fr = sorted(fr_data['Region'].unique().tolist(), key=str)
-    heatmap_fr = alt.Chart(fr_data).mark_rect().encode(
-        x=alt.X('Hour:O', title='Hour of Day', sort=list(range(24))),
-        y=alt.Y('Region:N', title='Region', sort=all_regions_fr, axis=alt.Axis(labelLimit=200)),
-        color=alt.Color('Fulfillment Rate (%):Q', scale=alt.Scale(scheme='redyellowgreen', domain=[0, 100]),
-                        legend=alt.Legend(title='Fulfilment Rate (%)')),
-        tooltip=['Region', 'Hour', 'Fulfillment Rate (%)', 'Trips', 'DC', 'RC']
-    ).properties(width=900, height=max(300, len(all_regions_fr) * 30), title='Hourly Fulfilment Rate by Region').interactive()
-    st.altair_chart(heatmap_fr, use_container_width=True)
-else:
-    st.warning("Not enough data for the Fulfilment Rate heatmap with current filters.")
-
-st.write('### Total Requests Heatmap (Region × Hour)')
-req_by_region_hour = filtered_df.groupby(['Region', 'Hour']).size().reset_index(name='Total Requests')
-if not req_by_region_hour.empty:
-    all_regions_req = sorted(req_by_region_hour['Region'].unique().tolist(), key=str)
-    heatmap_req = alt.Chart(req_by_region_hour).mark_rect().encode(
-        x=alt.X('Hour:O', title='Hour of Day', sort=list(range(24))),
-        y=alt.Y('Region:N', title='Region', sort=all_regions_req, axis=alt.Axis(labelLimit=200)),
-        color=alt.Color('Total Requests:Q', scale=alt.Scale(scheme='blues'), legend=alt.Legend(title='Total Requests')),
-        tooltip=['Region', 'Hour', 'Total Requests']
-    ).properties(width=900, height=max(300, len(all_regions_req) * 30), title='Hourly Total Requests by Region').interactive()
-    st.altair_chart(heatmap_req, use_container_width=True)
-else:
-    st.warning("Not enough data for the Total Requests heatmap with current filters.")
+heatmap_section = lazy_section("heatmaps", "Show the Region × Hour heatmaps")
+with heatmap_section:
+    if heatmap_section.open:
+        st.write('### Fulfilment Rate Heatmap (Region × Hour)')
+
+        fr_pivot = cached("fulfillment_pivot", lambda: kpi_engine.compute_fulfillment_pivot(agg_df, agg_weight))
+        fr_data = cached("chart:fulfillment_pivot", lambda: chart_data.fulfillment_heatmap(fr_pivot))
+        if not fr_data.empty:
+            all_regions_fr = sorted(fr_data['Region'].unique().tolist(), key=str)
+            heatmap_fr = alt.Chart(fr_data).mark_rect().encode(
+                x=alt.X('Hour:O', title='Hour of Day', sort=list(range(24))),
+                y=alt.Y('Region:N', title='Region', sort=all_regions_fr, axis=alt.Axis(labelLimit=200)),
+                color=alt.Color('Fulfillment Rate (%):Q', scale=alt.Scale(scheme='redyellowgreen', domain=[0, 100]),
+                                legend=alt.Legend(title='Fulfilment Rate (%)')),
+                tooltip=['Region', 'Hour', 'Fulfillment Rate (%)', 'Trips', 'DC', 'RC']
+            ).properties(width=900, height=max(300, len(all_regions_fr) * 30), title='Hourly Fulfilment Rate by Region').interactive()
+            show_chart("fulfillment_pivot", heatmap_fr, use_container_width=True)
+        else:
+            st.warning("Not enough data for the Fulfilment Rate heatmap with current filters.")
+
+        st.write('### Total Requests Heatmap (Region × Hour)')
+        req_by_region_hour = cached("requests_by_region_hour", lambda: kpi_engine.count_by(agg_df, ['Region', 'Hour'], agg_weight).reset_index(name='Total Requests'))
+        req_by_region_hour = cached("chart:requests_by_region_hour",
+                                    lambda: chart_data.cap_heatmap_rows(req_by_region_hour, 'Region', ['Total Requests']))
+        if not req_by_region_hour.empty:
+            all_regions_req = sorted(req_by_region_hour['Region'].unique().tolist(), key=str)
+            heatmap_req = alt.Chart(req_by_region_hour).mark_rect().encode(
+                x=alt.X('Hour:O', title='Hour of Day', sort=list(range(24))),
+                y=alt.Y('Region:N', title='Region', sort=all_regions_req, axis=alt.Axis(labelLimit=200)),
+                color=alt.Color('Total Requests:Q', scale=alt.Scale(scheme='blues'), legend=alt.Legend(title='Total Requests')),
+                tooltip=['Region', 'Hour', 'Total Requests']
+            ).properties(width=900, height=max(300, len(all_regions_req) * 30), title='Hourly Total Requests by Region').interactive()
+            show_chart("requests_by_region_hour", heatmap_req, use_container_width=True)
+        else:
+            st.warning("Not enough data for the Total Requests heatmap with current filters.")
+rerun_timer.mark("heatmaps", rows_in=len(agg_df))
 
 
 # ─────────────────────────────────────────────
 # MAP
 # ─────────────────────────────────────────────
 st.write('## 🌍 Map of Requests')
-if map_df.empty:
-    st.warning("No data with valid coordinates to display on the map.")
-else:
-    map_df = map_df.rename(columns={'Latitude': 'LAT', 'Longitude': 'LON'})
-    category_colors = {
-        'Trips': [0, 200, 100, 180],
-        'Driver Cancellation': [255, 100, 0, 180],
-        'Rider Cancellation': [255, 200, 0, 180],
-        'No Drivers Found': [150, 0, 200, 180],
-        'Timeout': [200, 0, 0, 180],
-    }
-    map_df['color'] = map_df['Category'].map(lambda c: category_colors.get(c, [100, 100, 100, 160]))
-    layer = pdk.Layer('ScatterplotLayer', data=map_df, get_position='[LON, LAT]',
-                      get_radius=80, get_fill_color='color', pickable=True, auto_highlight=True)
-    view_state = pdk.ViewState(latitude=map_df['LAT'].mean(), longitude=map_df['LON'].mean(), zoom=10, pitch=40)
-    tooltip = {
-        "html": "<b>Category:</b> {Category}<br/><b>Driver:</b> {DRIVER}<br/><b>City:</b> {CITY}<br/><b>Region:</b> {Region}<br/><b>Distance:</b> {DISTANCE FROM RIDER} km",
-        "style": {"backgroundColor": "steelblue", "color": "white"}
-    }
-    r = pdk.Deck(map_style='mapbox://styles/mapbox/streets-v11', layers=[layer],
-                 initial_view_state=view_state, tooltip=tooltip)
-    st.pydeck_chart(r)
-    st.markdown("""
-    **Map Legend:**
-    🟢 Trips &nbsp;&nbsp; 🟠 Driver Cancellation &nbsp;&nbsp; 🟡 Rider Cancellation &nbsp;&nbsp; 🟣 No Drivers Found &nbsp;&nbsp; 🔴 Timeout
-    """)
-
-
-# ─────────────────────────────────────────────
-# HELPER: build KPI table for a groupby column
-# ─────────────────────────────────────────────
-def build_kpi_table(data, group_col):
-    data = data[data['Category'] != 'No Drivers Found']
-    requests = data.groupby(group_col).size().reset_index(name='Total Requests')
-    trips = data[data['Category'] == 'Trips'].groupby(group_col).size().reset_index(name='Total Trips')
-    dc = data[data['Category'] == 'Driver Cancellation'].groupby(group_col).size().reset_index(name='Driver Cancellation')
-    rc = data[data['Category'] == 'Rider Cancellation'].groupby(group_col).size().reset_index(name='Rider Cancellation')
-    to = data[data['Category'] == 'Timeout'].groupby(group_col).size().reset_index(name='Timeout')
-    kpis = requests.merge(trips, on=group_col, how='left') \
-                   .merge(dc, on=group_col, how='left') \
-                   .merge(rc, on=group_col, how='left') \
-                   .merge(to, on=group_col, how='left')
-    kpis.fillna(0, inplace=True)
-    kpis['Fulfillment Rate (%)'] = (kpis['Total Trips'] / (kpis['Total Trips'] + kpis['Driver Cancellation'] + kpis['Rider Cancellation']).clip(lower=1)) * 100
-    kpis['Acceptance Rate (%)'] = (kpis['Total Trips'] / (kpis['Total Trips'] + kpis['Driver Cancellation'] + kpis['Rider Cancellation'] + kpis['Timeout']).clip(lower=1)) * 100
-    kpis['Driver Cancellation Rate (%)'] = (kpis['Driver Cancellation'] / kpis['Total Requests'].clip(lower=1)) * 100
-    kpis['Rider Cancellation (%)'] = (kpis['Rider Cancellation'] / kpis['Total Requests'].clip(lower=1)) * 100
-    kpis['Timeout Rate (%)'] = (kpis['Timeout'] / kpis['Total Requests'].clip(lower=1)) * 100
-    return kpis
+map_section = lazy_section("map", "Show the map")
+with map_section:
+    if map_section.open:
+        # Requests with coordinates, for the map
+        map_source = map_layers.with_coordinates(filtered_df)
+        if map_source.empty:
+            st.warning("No data with valid coordinates to display on the map.")
+        else:
+            # Small selections are drawn request by request; larger ones are binned
+            # into a grid server-side so the browser only receives one row per cell.
+            map_mode = st.radio("Map mode", ["Auto", "Points", "Grid"], horizontal=True,
+                                help=f"Auto shows points up to {map_layers.POINT_LIMIT:,} requests, a grid above that.")
+            use_points = map_mode == "Points" or (map_mode == "Auto" and len(map_source) <= map_layers.POINT_LIMIT)
+            fit_zoom = map_layers.fit_zoom(map_source['Latitude'], map_source['Longitude'])
+            if use_points:
+                map_data = cached("map:points", lambda: map_layers.point_frame(map_source))
+                layer = pdk.Layer('ScatterplotLayer', data=map_data, get_position='[LON, LAT]',
+                                  get_radius=80, get_fill_color='[r, g, b, a]', pickable=True, auto_highlight=True)
+                tooltip_html = map_layers.POINT_TOOLTIP
+            else:
+                grid_zoom = st.slider("Grid zoom level", map_layers.MIN_ZOOM, map_layers.MAX_ZOOM, fit_zoom,
+                                      help="Higher zoom levels use smaller grid cells.")
+                map_data = cached(f"map:grid:{grid_zoom}", lambda: map_layers.grid_frame(map_source, grid_zoom))
+                cell_metres = map_layers.cell_degrees(grid_zoom) * 111_320
+                layer = pdk.Layer('ScatterplotLayer', data=map_data, get_position='[LON, LAT]',
+                                  get_radius=f'Weight * {cell_metres / 2:.0f}', radius_min_pixels=2,
+                                  get_fill_color='[r, g, b, a]', pickable=True, auto_highlight=True)
+                tooltip_html = map_layers.GRID_TOOLTIP
+            view_state = pdk.ViewState(latitude=float(map_data['LAT'].mean()), longitude=float(map_data['LON'].mean()),
+                                       zoom=10 if use_points else fit_zoom, pitch=40)
+            tooltip = {
+                "html": tooltip_html,
+                "style": {"backgroundColor": "steelblue", "color": "white"}
+            }
+            r = pdk.Deck(map_style='mapbox://styles/mapbox/streets-v11', layers=[layer],
+                         initial_view_state=view_state, tooltip=tooltip)
+            st.pydeck_chart(r)
+            if current_role == "admin":
+                st.caption(
+                    f"{len(map_source):,} requests drawn as {len(map_data):,} "
+                    f"{'points' if use_points else 'grid cells'} (~{map_layers.payload_bytes(map_data) / 1024:,.0f} KB)"
+                )
+            st.markdown("""
+            **Map Legend:**
+            🟢 Trips &nbsp;&nbsp; 🟠 Driver Cancellation &nbsp;&nbsp; 🟡 Rider Cancellation &nbsp;&nbsp; 🟣 No Drivers Found &nbsp;&nbsp; 🔴 Timeout
+            """)
+rerun_timer.mark("map", rows_in=len(filtered_df))
 
 
 # ─────────────────────────────────────────────
 # DATA TABLES
 # ─────────────────────────────────────────────
-st.write('## 📈 Driver Data Table')
-st.write(build_kpi_table(filtered_df.copy(), 'DRIVER'))
-
-st.write('## 📈 Clients Data Table')
-st.write(build_kpi_table(filtered_df.copy(), 'Rider Mobile Number'))
+KPI_TABLE_SECTIONS = [
+    ('DRIVER', '📈 Driver Data Table'),
+    ('Rider Mobile Number', '📈 Clients Data Table'),
+    ('Region', '📈 Regions Data Table'),
+    ('Corporate', '📈 Corporate Data Table'),
+]
 
-st.write('## 📈 Regions Data Table')
-st.write(build_kpi_table(filtered_df.copy(), 'Region'))
 
-st.write('## 📈 Corporate Data Table')
-st.write(build_kpi_table(filtered_df.copy(), 'Corporate'))
-
-
-# ─────────────────────────────────────────────
-# CHATBOT – build comprehensive data summary
-# ─────────────────────────────────────────────
-def build_data_summary(data, kpi_dict):
-    """
-    Builds a rich JSON summary covering every dimension the bot may be asked about:
-    region, city, country, driver (top/bottom), hour, date, corporate, vehicle type.
-    Both Fulfillment Rate and Acceptance Rate are included for every dimension.
-    """
-
-    def rates_for_group(df, group_col):
-        """Generic helper: compute FR & AR for any grouping column."""
-        df = df[df['Category'] != 'No Drivers Found'].copy()
-        trips = df[df['Category'] == 'Trips'].groupby(group_col).size().rename('Trips')
-        dc    = df[df['Category'] == 'Driver Cancellation'].groupby(group_col).size().rename('DC')
-        rc    = df[df['Category'] == 'Rider Cancellation'].groupby(group_col).size().rename('RC')
-        to    = df[df['Category'] == 'Timeout'].groupby(group_col).size().rename('Timeout')
-        total = df.groupby(group_col).size().rename('Total Requests')
-        merged = pd.concat([trips, dc, rc, to, total], axis=1).fillna(0).reset_index()
-        merged['Fulfillment Rate (%)'] = (
-            merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC']).clip(lower=1)
-        ) * 100
-        merged['Acceptance Rate (%)'] = (
-            merged['Trips'] / (merged['Trips'] + merged['DC'] + merged['RC'] + merged['Timeout']).clip(lower=1)
-        ) * 100
-        merged['Driver Cancellation Rate (%)'] = (
-            merged['DC'] / merged['Total Requests'].clip(lower=1)
-        ) * 100
-        merged['Rider Cancellation Rate (%)'] = (
-            merged['RC'] / merged['Total Requests'].clip(lower=1)
-        ) * 100
-        merged['Timeout Rate (%)'] = (
-            merged['Timeout'] / merged['Total Requests'].clip(lower=1)
-        ) * 100
-        # Round all float columns for cleaner JSON
-        float_cols = merged.select_dtypes(include='float').columns
-        merged[float_cols] = merged[float_cols].round(2)
-        return merged
-
-    # ── Per-dimension KPI tables ──
-    region_kpis    = rates_for_group(data, 'Region')
-    city_kpis      = rates_for_group(data, 'CITY')
-    country_kpis   = rates_for_group(data, 'COUNTRY')
-    hour_kpis      = rates_for_group(data, 'Hour')
-    vehicle_kpis   = rates_for_group(data, 'VEHICLETYPE')
-    corporate_kpis = rates_for_group(data, 'Corporate')
-    driver_kpis    = rates_for_group(data, 'DRIVER')
-
-    # Date-level rates (group by Date as string)
-    data_copy = data.copy()
-    data_copy['_date_str'] = data_copy['Date'].astype(str)
-    date_kpis = rates_for_group(data_copy, '_date_str').rename(columns={'_date_str': 'Date'})
-
-    # ── Driver rankings ──
-    driver_min_requests = 5  # Only rank drivers with enough volume to be meaningful
-    driver_kpis_filtered = driver_kpis[driver_kpis['Total Requests'] >= driver_min_requests]
-
-    top10_fr  = driver_kpis_filtered.sort_values('Fulfillment Rate (%)',  ascending=False).head(10)
-    bot10_fr  = driver_kpis_filtered.sort_values('Fulfillment Rate (%)',  ascending=True ).head(10)
-    top10_ar  = driver_kpis_filtered.sort_values('Acceptance Rate (%)',   ascending=False).head(10)
-    bot10_ar  = driver_kpis_filtered.sort_values('Acceptance Rate (%)',   ascending=True ).head(10)
-    top10_dcr = driver_kpis_filtered.sort_values('Driver Cancellation Rate (%)', ascending=False).head(10)
-
-    # ── Hour-of-day trends ──
-    hour_kpis_sorted = hour_kpis.sort_values('Hour')
-    peak_fr_hour  = hour_kpis_sorted.loc[hour_kpis_sorted['Fulfillment Rate (%)'].idxmax(),  'Hour'] if not hour_kpis_sorted.empty else None
-    trough_fr_hour = hour_kpis_sorted.loc[hour_kpis_sorted['Fulfillment Rate (%)'].idxmin(), 'Hour'] if not hour_kpis_sorted.empty else None
-    peak_ar_hour  = hour_kpis_sorted.loc[hour_kpis_sorted['Acceptance Rate (%)'].idxmax(),  'Hour'] if not hour_kpis_sorted.empty else None
-    trough_ar_hour = hour_kpis_sorted.loc[hour_kpis_sorted['Acceptance Rate (%)'].idxmin(), 'Hour'] if not hour_kpis_sorted.empty else None
-
-    summary = {
-        # ── Overall ──
-        "overall_kpis": kpi_dict,
-        "distance_filter_applied": f"{dist_range[0]} to {dist_range[1]} km",
-        "total_rows_in_filtered_data": len(data),
-
-        # ── By dimension ──
-        "by_region":       region_kpis.to_dict(orient='records'),
-        "by_city":         city_kpis.to_dict(orient='records'),
-        "by_country":      country_kpis.to_dict(orient='records'),
-        "by_hour":         hour_kpis_sorted.to_dict(orient='records'),
-        "by_date":         date_kpis.sort_values('Date').to_dict(orient='records'),
-        "by_vehicle_type": vehicle_kpis.to_dict(orient='records'),
-        "by_corporate":    corporate_kpis.to_dict(orient='records'),
-
-        # ── Driver rankings ──
-        "drivers_top10_fulfillment_rate":          top10_fr.to_dict(orient='records'),
-        "drivers_bottom10_fulfillment_rate":       bot10_fr.to_dict(orient='records'),
-        "drivers_top10_acceptance_rate":           top10_ar.to_dict(orient='records'),
-        "drivers_bottom10_acceptance_rate":        bot10_ar.to_dict(orient='records'),
-        "drivers_top10_cancellation_rate":         top10_dcr.to_dict(orient='records'),
-        "all_drivers_kpis":                        driver_kpis.to_dict(orient='records'),
-
-        # ── Time insights ──
-        "peak_fulfillment_hour":   peak_fr_hour,
-        "trough_fulfillment_hour": trough_fr_hour,
-        "peak_acceptance_hour":    peak_ar_hour,
-        "trough_acceptance_hour":  trough_ar_hour,
-    }
-    return json.dumps(summary, default=str)
+def _kpi_tables(cols):
+    # Independent aggregations over the same rows: parallel_kpi fans them out
+    # to a process pool for large selections and runs them serially otherwise.
+    row_cols = [c for c in cols if c in ['DRIVER', 'Rider Mobile Number'] or not use_cube]
+    tables = parallel_kpi.run_all(filtered_df, {col: ('build_kpi_table', col) for col in row_cols},
+                                  columns=row_cols + ['Category'])
+    for col in cols:
+        if col not in tables:
+            tables[col] = kpi_engine.build_kpi_table(agg_df, col, agg_weight)
+    return tables
+
+
+def kpi_tables_for(cols):
+    """KPI tables of `cols`, each cached per filter state; those not cached yet are computed together."""
+    missing = [c for c in cols if (data_version, filter_key, f"kpi_table:{c}") not in result_cache.RESULTS]
+    fresh = _kpi_tables(missing) if missing else {}
+    return {c: cached(f"kpi_table:{c}", lambda c=c: fresh[c] if c in fresh else _kpi_tables([c])[c]) for c in cols}
+
+
+def driver_leaderboard(driver_table):
+    """Top / bottom k drivers by a chosen rate, among drivers with enough requests."""
+    metrics = [c for c in driver_table.columns if c.endswith('(%)')]
+    metric_col, side_col, k_col, min_col = st.columns([3, 1, 1, 1])
+    metric = metric_col.selectbox("Rank drivers by", metrics, key="leaderboard:metric")
+    side = side_col.radio("Show", ["Top", "Bottom"], horizontal=True, key="leaderboard:side")
+    k = k_col.number_input("Drivers", min_value=1, max_value=100, value=rankings.TOP_K, step=1,
+                           key="leaderboard:k")
+    min_requests = min_col.number_input("Min. requests", min_value=1, value=rankings.MIN_REQUESTS, step=1,
+                                        key="leaderboard:min")
+    ascending = side == "Bottom"
+    ranked = cached(f"leaderboard:{metric}:{ascending}:{k}:{min_requests}",
+                    lambda: rankings.top_k(driver_table, metric, k, ascending, min_requests))
+    st.dataframe(ranked, use_container_width=True, hide_index=True)
+
+
+# Only the open tables are computed. Expander states are read up front so
+# tables opened together (e.g. after a filter change) share one pool run.
+open_tables = [col for col, _ in KPI_TABLE_SECTIONS if st.session_state.get(f"section:kpi_table:{col}")]
+kpi_tables = kpi_tables_for(open_tables)
+
+for col, title in KPI_TABLE_SECTIONS:
+    st.write(f'## {title}')
+    table_section = lazy_section(f"kpi_table:{col}", "Show the table")
+    with table_section:
+        if table_section.open:
+            if col == 'DRIVER':
+                st.write('### 🏆 Leaderboard')
+                driver_leaderboard(kpi_tables[col])
+                st.write('### All drivers')
+            paged_table(f"kpi_table:{col}", kpi_tables[col])
+rerun_timer.mark("KPI tables", rows_in=len(filtered_df), rows_out=sum(len(t) for t in kpi_tables.values()))
 
 
 # ─────────────────────────────────────────────
 # CHATBOT UI
 # ─────────────────────────────────────────────
-st.write('## 🤖 Nexus Phil')
-st.markdown(
-    "Ask me anything about the filtered data — fulfilment rates, acceptance rates, "
-    "driver performance, city/region/country breakdowns, time-of-day trends, and more."
-)
-
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+# Runs as a fragment: sending a question reruns only the chat, not the dashboard.
+@st.fragment
+def show_chatbot():
+    st.write('## 🤖 Nexus Phil')
+    st.markdown(
+        "Ask me anything about the filtered data — fulfilment rates, acceptance rates, "
+        "driver performance, city/region/country breakdowns, time-of-day trends, and more."
+    )
 
-for msg in st.session_state.chat_history:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
 
-user_input = st.chat_input(
-    "Ask about the data (e.g. 'Which city has the highest acceptance rate at 8pm?')"
-)
+    for msg in st.session_state.chat_history:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
 
-if user_input:
-    st.session_state.chat_history.append({"role": "user", "content": user_input})
-    with st.chat_message("user"):
-        st.markdown(user_input)
+    user_input = st.chat_input(
+        "Ask about the data (e.g. 'Which city has the highest acceptance rate at 8pm?')"
+    )
 
-    data_summary = build_data_summary(filtered_df.copy(), kpi_data)
+    if user_input:
+        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        with st.chat_message("user"):
+            st.markdown(user_input)
 
-    system_prompt = f"""You are Nexus Phil, an expert data analyst assistant embedded in a ride-hailing supply dashboard.
-You have access to a comprehensive JSON data summary derived from the currently filtered dataset.
+        chat_timer = profiling.RerunTimer("chat")
+        # Built once per filter state; follow-up questions reuse it. Only the
+        # rows relevant to this question go into the prompt.
+        data_summary = nexus_summary.get_data_summary(
+            result_cache.RESULTS, (data_version, filter_key, "data_summary"), filtered_df, kpi_data, dist_range
+        )
+        chat_timer.mark("build_data_summary", rows_in=len(filtered_df))
+
+        # Common questions (best/worst, a named entity, a rate at an hour or
+        # date) are answered from the aggregates without calling the API.
+        t0 = time.perf_counter()
+        local_reply = nexus_local.answer(user_input, data_summary, filtered_df, kpi_data)
+        chat_timer.mark("local answer")
+        if local_reply is not None:
+            local_ms = (time.perf_counter() - t0) * 1000
+            logging.getLogger("nexus_local").info("Nexus Phil answered locally in %.1f ms", local_ms)
+            with st.chat_message("assistant"):
+                st.markdown(local_reply)
+                if current_role == "admin":
+                    st.caption(f"Answered locally in {local_ms:,.1f} ms")
+            st.session_state.chat_history.append({"role": "assistant", "content": local_reply})
+            profiling.HISTORY.record(chat_timer)
+            return
+
+        data_context = nexus_summary.build_context(data_summary, user_input)
+        chat_timer.mark("build_context")
+
+        system_prompt = f"""You are Nexus Phil, an expert data analyst assistant embedded in a ride-hailing supply dashboard.
+You have access to a JSON data summary derived from the currently filtered dataset. It always holds
+the overall KPIs, driver rankings and peak/trough hours, plus the breakdown rows relevant to the question.
 Answer every question accurately, concisely, and in a helpful, friendly tone using ONLY this data.
 
 KEY METRIC DEFINITIONS:
@@ -793,67 +889,68 @@ ANSWERING GUIDELINES:
 - When asked for trends over time, refer to by_date or by_hour as appropriate.
 - When asked about a specific driver, city, region, or country, find the matching record.
 - When asked to compare multiple entities, list them in ranked order.
-- If the data doesn't contain enough information to answer, say so clearly.
+- If the data doesn't contain enough information to answer, say so clearly
+  (rows_left_out_for_size lists breakdowns that were cut to keep the summary small).
 - Never invent numbers. Only use the data provided.
 
 DATA SUMMARY (JSON):
-{data_summary}
+{data_context}
 """
+        prompt_bytes = len(system_prompt.encode('utf-8'))
+        logging.getLogger("nexus_summary").info(
+            "Nexus Phil prompt: %d bytes (~%d tokens) for %r", prompt_bytes, prompt_bytes // 4, user_input[:80]
+        )
 
-    messages = []
-    for h in st.session_state.chat_history[-12:]:
-        messages.append({"role": h["role"], "content": h["content"]})
-
-    import urllib.request
-    import urllib.error
-
-    api_payload = {
-        "model": "claude-sonnet-4-20250514",
-        "max_tokens": 1500,
-        "system": system_prompt,
-        "messages": messages
-    }
-
-    def _local_fallback(question, kpi_dict):
-        """Simple keyword-based fallback if the API call fails."""
-        q = question.lower()
-        if 'fulfillment' in q or 'fulfilment' in q:
-            return f"The overall **Fulfilment Rate** is **{kpi_dict['Fulfillment Rate (%)']}%**."
-        if 'acceptance' in q:
-            return f"The overall **Acceptance Rate** is **{kpi_dict['Acceptance Rate (%)']}%**."
-        if 'summary' in q or 'overview' in q:
+        messages = []
+        for h in st.session_state.chat_history[-12:]:
+            messages.append({"role": h["role"], "content": h["content"]})
+
+        def _local_fallback(question, kpi_dict):
+            """Simple keyword-based fallback if the API call fails."""
+            q = question.lower()
+            if 'fulfillment' in q or 'fulfilment' in q:
+                return f"The overall **Fulfilment Rate** is **{kpi_dict['Fulfillment Rate (%)']}%**."
+            if 'acceptance' in q:
+                return f"The overall **Acceptance Rate** is **{kpi_dict['Acceptance Rate (%)']}%**."
+            if 'summary' in q or 'overview' in q:
+                return (
+                    f"**Dashboard Summary**\n\n"
+                    f"- Total Requests: **{kpi_dict['Total Requests']}**\n"
+                    f"- Total Trips: **{kpi_dict['Total Trips']}**\n"
+                    f"- Fulfilment Rate: **{kpi_dict['Fulfillment Rate (%)']}%**\n"
+                    f"- Acceptance Rate: **{kpi_dict['Acceptance Rate (%)']}%**\n"
+                    f"- Driver Cancellations: **{kpi_dict['Driver Cancellations']}**\n"
+                    f"- Rider Cancellations: **{kpi_dict['Rider Cancellations']}**\n"
+                    f"- Timeouts: **{kpi_dict['Timeouts']}**"
+                )
             return (
-                f"**Dashboard Summary**\n\n"
                 f"- Total Requests: **{kpi_dict['Total Requests']}**\n"
-                f"- Total Trips: **{kpi_dict['Total Trips']}**\n"
                 f"- Fulfilment Rate: **{kpi_dict['Fulfillment Rate (%)']}%**\n"
-                f"- Acceptance Rate: **{kpi_dict['Acceptance Rate (%)']}%**\n"
-                f"- Driver Cancellations: **{kpi_dict['Driver Cancellations']}**\n"
-                f"- Rider Cancellations: **{kpi_dict['Rider Cancellations']}**\n"
-                f"- Timeouts: **{kpi_dict['Timeouts']}**"
+                f"- Acceptance Rate: **{kpi_dict['Acceptance Rate (%)']}%**"
             )
-        return (
-            f"- Total Requests: **{kpi_dict['Total Requests']}**\n"
-            f"- Fulfilment Rate: **{kpi_dict['Fulfillment Rate (%)']}%**\n"
-            f"- Acceptance Rate: **{kpi_dict['Acceptance Rate (%)']}%**"
-        )
 
-    try:
-        req = urllib.request.Request(
-            "https://api.anthropic.com/v1/messages",
-            data=json.dumps(api_payload).encode('utf-8'),
-            headers={
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            },
-            method="POST"
-        )
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            response_data = json.loads(resp.read().decode('utf-8'))
-        assistant_reply = response_data['content'][0]['text']
-    except Exception:
-        assistant_reply = _local_fallback(user_input, kpi_data)
-
-    st.session_state.chat_history.append({"role": "assistant", "content": assistant_reply})
-    with st.chat_message("assistant"):
-        st.markdown(assistant_reply)
\ No newline at end of file
+        # Tokens are rendered as they stream in; the request itself runs on a
+        # worker thread over a pooled keep-alive connection. If the stream
+        # breaks off, the fallback replaces whatever part of it was shown, so
+        # the screen and chat_history hold the same reply.
+        with st.chat_message("assistant"):
+            reply_slot = st.empty()
+            try:
+                with reply_slot.container():
+                    assistant_reply = st.write_stream(nexus_client.stream_reply(system_prompt, messages))
+            except Exception:
+                assistant_reply = _local_fallback(user_input, kpi_data)
+                reply_slot.markdown(assistant_reply)
+            if current_role == "admin":
+                st.caption(f"Prompt size: {prompt_bytes:,} bytes (~{prompt_bytes // 4:,} tokens)")
+        st.session_state.chat_history.append({"role": "assistant", "content": assistant_reply})
+        chat_timer.mark("API reply")
+        profiling.HISTORY.record(chat_timer)
+
+
+show_chatbot()
+rerun_timer.mark("chatbot")
+profiling.HISTORY.record(rerun_timer)
+_profile = st.session_state.pop("profile:active", None)
+if _profile is not None:
+    st.session_state["profile:stats"] = profiling.stop_profile(_profile)
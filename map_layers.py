@@ -0,0 +1,114 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+import kpi_engine
+
+# ─────────────────────────────────────────────
+# MAP LAYERS
+# ─────────────────────────────────────────────
+# Everything handed to pydeck is serialised to JSON and drawn in the browser,
+# so the map only ships what it draws: in point mode one row per request with
+# the tooltip columns, in grid mode one row per occupied grid cell with its
+# per-category counts. Grid mode takes over automatically once a selection
+# has more than POINT_LIMIT requests with coordinates.
+
+POINT_LIMIT = int(os.environ.get("SUPPLY_MAP_POINT_LIMIT", "20000"))
+
+CATEGORY_COLORS = {
+    kpi_engine.TRIPS: [0, 200, 100, 180],
+    kpi_engine.DRIVER_CANCELLATION: [255, 100, 0, 180],
+    kpi_engine.RIDER_CANCELLATION: [255, 200, 0, 180],
+    kpi_engine.NO_DRIVERS_FOUND: [150, 0, 200, 180],
+    kpi_engine.TIMEOUT: [200, 0, 0, 180],
+}
+DEFAULT_COLOR = [100, 100, 100, 160]
+RGBA = ['r', 'g', 'b', 'a']
+
+POINT_COLUMNS = ['Category', 'DRIVER', 'CITY', 'Region', 'DISTANCE FROM RIDER']
+POINT_TOOLTIP = ("<b>Category:</b> {Category}<br/><b>Driver:</b> {DRIVER}<br/><b>City:</b> {CITY}"
+                 "<br/><b>Region:</b> {Region}<br/><b>Distance:</b> {DISTANCE FROM RIDER} km")
+GRID_TOOLTIP = ("<b>Requests:</b> {Requests}<br/><b>Trips:</b> {Trips}<br/>"
+                "<b>Driver Cancellation:</b> {Driver Cancellation}<br/>"
+                "<b>Rider Cancellation:</b> {Rider Cancellation}<br/>"
+                "<b>No Drivers Found:</b> {No Drivers Found}<br/><b>Timeout:</b> {Timeout}<br/>"
+                "<b>Fulfillment Rate:</b> {Fulfillment Rate (%)}%")
+
+# Grid cells are about this many screen pixels wide at the chosen zoom.
+CELL_PIXELS = 24
+MIN_ZOOM, MAX_ZOOM = 3, 16
+
+
+def category_colors(categories: pd.Series) -> np.ndarray:
+    """(n, 4) uint8 RGBA per row, looked up by category code rather than per value."""
+    categories = categories.astype('category')
+    palette = np.array([CATEGORY_COLORS.get(c, DEFAULT_COLOR) for c in categories.cat.categories]
+                       + [DEFAULT_COLOR], dtype=np.uint8)
+    # Code -1 (missing) indexes the trailing default colour.
+    return palette[categories.cat.codes.to_numpy()]
+
+
+def with_coordinates(data: pd.DataFrame) -> pd.DataFrame:
+    """Rows with a position, holding only the columns the map layers read."""
+    mask = data['Latitude'].notna() & data['Longitude'].notna()
+    return data.loc[mask, ['Latitude', 'Longitude'] + POINT_COLUMNS]
+
+
+def fit_zoom(lat: pd.Series, lon: pd.Series) -> int:
+    """Web-mercator zoom at which the points' extent fills a ~800 px wide map."""
+    span = max(float(lon.max() - lon.min()), float(lat.max() - lat.min()), 1e-4)
+    return int(min(max(math.floor(math.log2(360 * 800 / 256 / span)), MIN_ZOOM), MAX_ZOOM))
+
+
+def cell_degrees(zoom: int) -> float:
+    return CELL_PIXELS * 360 / (256 * 2 ** zoom)
+
+
+def point_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """One row per request: position, colour and the tooltip columns only."""
+    points = pd.DataFrame({
+        'LAT': data['Latitude'].to_numpy(dtype='float64').round(5),
+        'LON': data['Longitude'].to_numpy(dtype='float64').round(5),
+    })
+    for col in POINT_COLUMNS:
+        values = data[col]
+        points[col] = values.to_numpy(dtype='float64').round(2) if col == 'DISTANCE FROM RIDER' \
+            else values.astype(str).to_numpy()
+    points[RGBA] = category_colors(data['Category'])
+    return points
+
+
+def grid_frame(data: pd.DataFrame, zoom: int) -> pd.DataFrame:
+    """
+    One row per occupied grid cell at `zoom`: the mean position of its
+    requests, counts per category, FR, and the colour of the most common
+    category. `Weight` (0–1) scales the drawn radius by request volume.
+    """
+    size = cell_degrees(zoom)
+    cell_y = np.floor(data['Latitude'].to_numpy(dtype='float64') / size).astype(np.int64)
+    cell_x = np.floor(data['Longitude'].to_numpy(dtype='float64') / size).astype(np.int64)
+    keys = [pd.Series(cell_y, index=data.index, name='cy'), pd.Series(cell_x, index=data.index, name='cx')]
+    matrix = kpi_engine.category_matrix(data, keys)
+    counts = matrix[kpi_engine.CATEGORIES]
+    position = data[['Latitude', 'Longitude']].astype('float64').groupby(keys).mean()
+
+    cells = counts.join(position).reset_index(drop=True)
+    cells = cells.rename(columns={'Latitude': 'LAT', 'Longitude': 'LON'})
+    cells[['LAT', 'LON']] = cells[['LAT', 'LON']].round(5)
+    cells['Requests'] = matrix.sum(axis=1).to_numpy()
+    cells['Fulfillment Rate (%)'] = kpi_engine.fulfillment_rate(
+        cells[kpi_engine.TRIPS], cells[kpi_engine.DRIVER_CANCELLATION], cells[kpi_engine.RIDER_CANCELLATION]
+    ).round(2)
+    # A cell whose requests all lack a Category gets code -1, the default colour.
+    codes = np.where(counts.to_numpy().any(axis=1), counts.to_numpy().argmax(axis=1), -1)
+    dominant = pd.Categorical.from_codes(codes, kpi_engine.CATEGORIES)
+    cells[RGBA] = category_colors(pd.Series(dominant))
+    cells['Weight'] = np.sqrt(cells['Requests'] / max(int(cells['Requests'].max()), 1)).round(3)
+    return cells
+
+
+def payload_bytes(frame: pd.DataFrame) -> int:
+    """Approximate size of the JSON records pydeck sends to the browser."""
+    return len(frame.to_json(orient='records'))
@@ -0,0 +1,172 @@
+import os
+import json
+import queue
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+# ─────────────────────────────────────────────
+# CHATBOT – streaming Messages API client
+# ─────────────────────────────────────────────
+# Replies are streamed (server-sent events) over pooled keep-alive
+# connections. The HTTP work runs on a worker thread; the Streamlit script
+# thread only drains a queue of text chunks and renders them as they arrive.
+# NEXUS_API_URL points the client at another endpoint, e.g. the local stub in
+# nexus_stub.py (`python bench.py client` runs the client against it).
+
+API_URL = os.environ.get("NEXUS_API_URL", "https://api.anthropic.com/v1/messages")
+API_VERSION = "2023-06-01"
+MODEL = "claude-sonnet-4-20250514"
+
+
+class NexusAPIError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port), shared by all sessions."""
+
+    def __init__(self, max_idle_per_host: int = 4):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme: str, host: str, port: int, timeout: float):
+        """(key, connection, whether it is a reused idle one)."""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return key, conn, True
+        return key, self.connect(scheme, host, port, timeout), False
+
+    @staticmethod
+    def connect(scheme: str, host: str, port: int, timeout: float):
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout)
+
+    def release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+POOL = ConnectionPool()
+
+# Errors from a keep-alive connection the server has already closed.
+STALE_CONNECTION_ERRORS = (BrokenPipeError, ConnectionResetError, ConnectionAbortedError,
+                           http.client.RemoteDisconnected)
+
+
+def _iter_sse(resp):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data = None, []
+    for raw in resp:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+    if data:
+        yield event, "\n".join(data)
+
+
+def stream_message(system: str, messages: list, max_tokens: int = 1500,
+                   timeout: float = 30, url: str = None):
+    """Yield the reply text chunk by chunk; raises NexusAPIError on failure."""
+    parts = urlsplit(url or API_URL)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    body = json.dumps({
+        "model": MODEL,
+        "max_tokens": max_tokens,
+        "system": system,
+        "messages": messages,
+        "stream": True,
+    }).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "anthropic-version": API_VERSION,
+    }
+    if os.environ.get("ANTHROPIC_API_KEY"):
+        headers["x-api-key"] = os.environ["ANTHROPIC_API_KEY"]
+
+    key, conn, reused = POOL.acquire(parts.scheme, parts.hostname, port, timeout)
+    reusable = False
+    try:
+        try:
+            conn.request("POST", parts.path or "/", body=body, headers=headers)
+            resp = conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            if not reused:
+                raise
+            # The server closed the idle connection; no response byte has
+            # arrived, so the request is sent again on a fresh connection.
+            conn.close()
+            conn = POOL.connect(parts.scheme, parts.hostname, port, timeout)
+            conn.request("POST", parts.path or "/", body=body, headers=headers)
+            resp = conn.getresponse()
+        if resp.status != 200:
+            detail = resp.read().decode("utf-8", "replace")[:500]
+            reusable = not resp.will_close
+            raise NexusAPIError(f"HTTP {resp.status}: {detail}")
+        for event, data in _iter_sse(resp):
+            payload = json.loads(data)
+            kind = payload.get("type", event)
+            if kind == "content_block_delta" and payload["delta"].get("type") == "text_delta":
+                yield payload["delta"]["text"]
+            elif kind == "error":
+                raise NexusAPIError(payload.get("error", {}).get("message", data))
+            elif kind == "message_stop":
+                break
+        # Drain the rest of the body so the connection can be reused.
+        resp.read()
+        reusable = not resp.will_close
+    except (OSError, http.client.HTTPException, ValueError, KeyError) as exc:
+        raise NexusAPIError(str(exc)) from exc
+    finally:
+        if reusable:
+            POOL.release(key, conn)
+        else:
+            conn.close()
+
+
+_DONE = object()
+
+
+def stream_reply(system: str, messages: list, **kwargs):
+    """
+    Run stream_message() on a worker thread and yield its chunks as they
+    arrive, re-raising any error on the caller's thread. Suitable for
+    st.write_stream().
+    """
+    chunks = queue.Queue()
+
+    def worker():
+        try:
+            for text in stream_message(system, messages, **kwargs):
+                chunks.put(text)
+        except Exception as exc:
+            chunks.put(exc)
+        finally:
+            chunks.put(_DONE)
+
+    threading.Thread(target=worker, name="nexus-stream", daemon=True).start()
+    while True:
+        item = chunks.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
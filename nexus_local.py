@@ -0,0 +1,209 @@
+import re
+
+import pandas as pd
+
+import kpi_engine
+import nexus_summary
+import rankings
+
+# ─────────────────────────────────────────────
+# CHATBOT – local query engine
+# ─────────────────────────────────────────────
+# Answers the common question shapes straight from the KPI aggregates:
+#   - best/worst <dimension> by <metric> [at <hour>] [on <date>]
+#   - <metric> for <entity> [at <hour>] [on <date>]
+#   - compare <entity> and <entity> [by <metric>]
+#   - <metric> [at <hour>] [on <date>] overall
+# Hours may be ranges ("between 7am and 9am"), dates too ("from 2025-01-01 to
+# 2025-01-07"). answer() returns None when it cannot parse the question; the
+# caller then escalates to the remote model.
+
+# (phrases, column, label) – checked in order, so specific phrases come first.
+METRICS = [
+    (['driver cancellation rate', 'driver cancellation', 'driver cancellations', 'cancellation rate', 'dcr'],
+     'Driver Cancellation Rate (%)', 'Driver Cancellation Rate'),
+    (['rider cancellation rate', 'rider cancellation', 'rider cancellations'],
+     'Rider Cancellation Rate (%)', 'Rider Cancellation Rate'),
+    (['timeout rate', 'timeouts', 'timeout'], 'Timeout Rate (%)', 'Timeout Rate'),
+    (['fulfillment', 'fulfilment', 'fr'], 'Fulfillment Rate (%)', 'Fulfillment Rate'),
+    (['acceptance', 'ar'], 'Acceptance Rate (%)', 'Acceptance Rate'),
+    (['requests', 'request volume', 'volume', 'busiest', 'busy'], 'Total Requests', 'Total Requests'),
+    (['trips', 'completed'], 'Trips', 'Trips'),
+]
+RATE_COLUMNS = {column for _, column, _ in METRICS if column.endswith('(%)')}
+
+# word → summary table
+DIMENSION_WORDS = {
+    'city': 'by_city', 'cities': 'by_city',
+    'region': 'by_region', 'regions': 'by_region', 'area': 'by_region',
+    'country': 'by_country', 'countries': 'by_country',
+    'driver': 'all_drivers_kpis', 'drivers': 'all_drivers_kpis',
+    'vehicle': 'by_vehicle_type', 'vehicles': 'by_vehicle_type',
+    'corporate': 'by_corporate', 'corporates': 'by_corporate',
+    'hour': 'by_hour', 'hours': 'by_hour', 'time': 'by_hour',
+    'date': 'by_date', 'day': 'by_date', 'days': 'by_date',
+}
+HIGH_WORDS = {'highest', 'best', 'most', 'top', 'max', 'maximum', 'greatest', 'peak', 'busiest'}
+LOW_WORDS = {'lowest', 'worst', 'least', 'bottom', 'min', 'minimum', 'fewest'}
+COMPARE_WORDS = {'compare', 'comparison', 'versus', 'vs'}
+# Questions asking for reasons or advice always go to the model.
+OPEN_ENDED_WORDS = {'why', 'explain', 'reason', 'reasons', 'cause', 'causes', 'suggest',
+                    'recommend', 'recommendation', 'recommendations', 'improve', 'should', 'insight', 'insights'}
+# Questions about change over a period (trends, last week vs this week) need
+# a time series the engine does not build; they go to the model too.
+TREND_WORDS = {'trend', 'trends', 'trending', 'change', 'changed', 'changes', 'changing',
+               'improving', 'improved', 'improvement', 'worsening', 'worse', 'better',
+               'rising', 'rose', 'falling', 'fell', 'declining', 'declined', 'decline', 'drop', 'dropped',
+               'increase', 'increased', 'increasing', 'decrease', 'decreased', 'decreasing',
+               'growth', 'growing', 'daily', 'hourly', 'week', 'weeks', 'weekly', 'month', 'months',
+               'monthly', 'year', 'yearly', 'quarter', 'today', 'yesterday', 'recently', 'lately'}
+# Minimum volume before a group can win a best/worst question.
+MIN_REQUESTS = {'all_drivers_kpis': rankings.MIN_REQUESTS}
+
+_TOP_N = re.compile(r"\b(?:top|bottom|best|worst)\s+(\d{1,2})\b")
+
+
+def parse_metric(q: str):
+    padded = f" {q} "
+    for phrases, column, label in METRICS:
+        if any(f" {p} " in padded for p in phrases):
+            return column, label
+    return None
+
+
+def _fmt(column, value):
+    return f"{value:.2f}%" if column in RATE_COLUMNS else f"{int(value):,}"
+
+
+def _when(hours, dates):
+    parts = []
+    if hours:
+        parts.append("at " + ", ".join(f"{h:02d}:00" for h in sorted(hours)))
+    if dates:
+        parts.append("on " + ", ".join(sorted(dates)))
+    return (" " + " ".join(parts)) if parts else ""
+
+
+def _subset(data, hours, dates, columns):
+    """Rows at the hours / on the dates asked about, holding only `columns`."""
+    data = data[list(dict.fromkeys(columns + ['Category', 'Hour', 'Date']))]
+    if hours:
+        data = data[data['Hour'].isin(sorted(hours))]
+    if dates:
+        data = data[data['Date'].dt.normalize().isin(pd.to_datetime(sorted(dates)))]
+    return data
+
+
+def _table(summary, data, table, hours, dates):
+    """Rates per group of `table`, restricted to the hours/dates asked about."""
+    if not hours and not dates:
+        return summary["tables"][table]
+    group_col = nexus_summary.DIMENSIONS[table][0]
+    subset = _subset(data, hours, dates, [] if table == "by_date" else [group_col])
+    if table == "by_date":
+        return kpi_engine.rates_for_group(subset, subset['Date'].dt.strftime('%Y-%m-%d').rename('Date'))
+    return kpi_engine.rates_for_group(subset, group_col)
+
+
+def _label(table, value):
+    if table == "by_hour":
+        return f"{int(value):02d}:00"
+    return str(value)[:10] if table == "by_date" else str(value)
+
+
+def answer(question: str, summary: dict, data: pd.DataFrame, kpi_dict: dict):
+    """Markdown answer for a question the engine understands, else None."""
+    q = nexus_summary._norm(question)
+    words = set(q.split())
+    if words & (OPEN_ENDED_WORDS | TREND_WORDS) or " over time " in f" {q} ":
+        return None
+    if nexus_summary.mentioned_hour_ranges(question) is None:
+        return None   # an hour range we cannot read, e.g. "between 7 and 9"
+    metric = parse_metric(q)
+    hours = nexus_summary.mentioned_hours(question)
+    dates = nexus_summary.mentioned_dates(question)
+    entities = {
+        table: sorted(set(positions))
+        for table, positions in nexus_summary.mentioned_entities(summary, question).items()
+    }
+    when = _when(hours, dates)
+    direction = None
+    if words & HIGH_WORDS:
+        direction = False
+    elif words & LOW_WORDS:
+        direction = True
+    tables = [DIMENSION_WORDS[w] for w in q.split() if w in DIMENSION_WORDS]
+
+    # ── compare / value for named entities ──
+    if entities:
+        if direction is not None and tables:
+            return None   # e.g. "best city in Kenya" – a ranking within an entity
+        table = max(entities, key=lambda t: len(entities[t]))
+        group_col = nexus_summary.DIMENSIONS[table][0]
+        names = summary["tables"][table].iloc[entities[table]][group_col].astype(str).tolist()
+        rates = _table(summary, data, table, hours, dates)
+        rates = rates[rates[group_col].astype(str).isin(names)]
+        if rates.empty:
+            return f"No requests for {', '.join(f'**{n}**' for n in names)}{when} in the current filters."
+        if len(names) > 1 or words & COMPARE_WORDS:
+            column, label = metric or ('Fulfillment Rate (%)', 'Fulfillment Rate')
+            rates = rates.sort_values(column, ascending=False)
+            lines = [
+                f"{i}. **{_label(table, row[group_col])}** — {_fmt(column, row[column])} "
+                f"({int(row['Total Requests']):,} requests)"
+                for i, (_, row) in enumerate(rates.iterrows(), start=1)
+            ]
+            return f"**{label}**{when}, ranked:\n\n" + "\n".join(lines)
+        row = rates.iloc[0]
+        columns = [metric] if metric else [('Fulfillment Rate (%)', 'Fulfillment Rate'),
+                                           ('Acceptance Rate (%)', 'Acceptance Rate')]
+        values = ", ".join(f"{label} **{_fmt(column, row[column])}**" for column, label in columns)
+        return f"**{_label(table, row[group_col])}**{when}: {values} ({int(row['Total Requests']):,} requests)."
+
+    if metric is None or words & COMPARE_WORDS:
+        return None   # nothing to measure, or a comparison without named entities
+    column, label = metric
+
+    # ── best / worst <dimension> ──
+    if direction is not None and tables:
+        table = tables[0]
+        group_col = nexus_summary.DIMENSIONS[table][0]
+        rates = _table(summary, data, table, hours if table != "by_hour" else set(),
+                       dates if table != "by_date" else set())
+        rates = rates[rates['Total Requests'] >= MIN_REQUESTS.get(table, 1)]
+        if rates.empty:
+            return f"Not enough requests{when} to rank by {label}."
+        m = _TOP_N.search(q)
+        n = min(int(m.group(1)), 20) if m else 1
+        ranked = rates.sort_values([column, 'Total Requests'], ascending=[direction, False]).head(n)
+        word = "lowest" if direction else "highest"
+        if n == 1:
+            row = ranked.iloc[0]
+            return (f"**{_label(table, row[group_col])}** has the {word} **{label}**{when}: "
+                    f"**{_fmt(column, row[column])}** ({int(row['Total Requests']):,} requests).")
+        lines = [
+            f"{i}. **{_label(table, row[group_col])}** — {_fmt(column, row[column])} "
+            f"({int(row['Total Requests']):,} requests)"
+            for i, (_, row) in enumerate(ranked.iterrows(), start=1)
+        ]
+        return f"{word.capitalize()} **{label}**{when}:\n\n" + "\n".join(lines)
+
+    # ── metric at an hour / on a date, or overall ──
+    if direction is None and not tables:
+        if hours or dates:
+            subset = _subset(data, hours, dates, [])
+            rates = kpi_engine.rates_for_group(subset, pd.Series('All', index=subset.index, name='_all'))
+            if rates.empty:
+                return f"No requests{when} in the current filters."
+            row = rates.iloc[0]
+            return f"**{label}**{when}: **{_fmt(column, row[column])}** ({int(row['Total Requests']):,} requests)."
+        overall = {
+            'Fulfillment Rate (%)': kpi_dict['Fulfillment Rate (%)'],
+            'Acceptance Rate (%)': kpi_dict['Acceptance Rate (%)'],
+            'Driver Cancellation Rate (%)': kpi_dict['Driver Cancellation Rate (%)'],
+            'Total Requests': kpi_dict['Total Requests'],
+            'Trips': kpi_dict['Total Trips'],
+        }
+        if column in overall:
+            return f"The overall **{label}** is **{_fmt(column, overall[column])}**."
+    return None
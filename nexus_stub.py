@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Messages API streaming endpoint, for trying the
+chatbot and checking nexus_client without a key or network access.
+
+    python nexus_stub.py --port 8765 --idle-timeout 5
+    NEXUS_API_URL=http://127.0.0.1:8765/v1/messages streamlit run main.py
+
+Every request is answered with a stream that echoes the last user message.
+A message containing "stub:error" gets an error event after the first
+chunk; "stub:status=<code>" gets a plain (non-streamed) error response with
+that status. Keep-alive connections idle for longer than --idle-timeout
+seconds are closed by the server, as a real endpoint or proxy would.
+"""
+import json
+import re
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_STATUS = re.compile(r"stub:status=(\d{3})")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # events are small writes; send each at once
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _event(self, name, data):
+        chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.server.lock:
+            self.server.requests += 1
+        content = body["messages"][-1]["content"]
+        text = content if isinstance(content, str) else json.dumps(content)
+
+        status = _STATUS.search(text)
+        if status:
+            error = json.dumps({"type": "error", "error": {"type": "stub_error", "message": "stub failure"}})
+            payload = error.encode("utf-8")
+            self.send_response(int(status.group(1)))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._event("message_start", {"type": "message_start", "message": {"model": body.get("model")}})
+        for i, word in enumerate(["Echo: "] + text.split(" ")):
+            self._event("content_block_delta", {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": word if i < 2 else " " + word},
+            })
+            if "stub:error" in text:
+                self._event("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                break
+        else:
+            self._event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, idle_timeout: float = 5.0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.connections = 0   # TCP connections accepted
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/messages"
+
+
+def start(port: int = 0, idle_timeout: float = 5.0) -> StubServer:
+    """A stub server serving on a background thread."""
+    server = StubServer(port, idle_timeout)
+    threading.Thread(target=server.serve_forever, name="nexus-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.idle_timeout)
+    print(f"Serving on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
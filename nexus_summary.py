@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import logging
+import time
+
+import pandas as pd
+
+import parallel_kpi
+import rankings
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# CHATBOT – build comprehensive data summary
+# ─────────────────────────────────────────────
+def build_data_summary(data, kpi_dict, dist_range, driver_min_requests=None, top_k=None):
+    """
+    Builds a rich summary covering every dimension the bot may be asked about:
+    region, city, country, driver (top/bottom), hour, date, corporate, vehicle type.
+    Both Fulfillment Rate and Acceptance Rate are included for every dimension.
+    'core' is always sent; 'tables' are indexed so build_context() can pick rows.
+    Driver rankings hold the `top_k` drivers with at least `driver_min_requests`
+    requests (defaults: rankings.TOP_K / rankings.MIN_REQUESTS).
+    """
+
+    # ── Per-dimension KPI tables (on a process pool for large selections) ──
+    group_cols = ['Region', 'CITY', 'COUNTRY', 'Hour', 'VEHICLETYPE', 'Corporate', 'DRIVER', 'Date']
+    rates = parallel_kpi.run_all(data, {col: ('rates_for_group', col) for col in group_cols},
+                                 columns=group_cols + ['Category'])
+    region_kpis    = rates['Region']
+    city_kpis      = rates['CITY']
+    country_kpis   = rates['COUNTRY']
+    hour_kpis      = rates['Hour']
+    vehicle_kpis   = rates['VEHICLETYPE']
+    corporate_kpis = rates['Corporate']
+    driver_kpis    = rates['DRIVER']
+
+    # Date-level rates, grouped on the dates and labelled as strings afterwards
+    date_kpis = rates['Date']
+    date_kpis['Date'] = date_kpis['Date'].astype(str)
+
+    # ── Driver rankings (partial selection, one volume filter for all five) ──
+    driver_rankings = rankings.rank_all(driver_kpis, rankings.DRIVER_RANKINGS,
+                                        k=top_k, min_requests=driver_min_requests)
+
+    # ── Hour-of-day trends ──
+    hour_kpis_sorted = hour_kpis.sort_values('Hour')
+    peak_fr_hour  = hour_kpis_sorted.loc[hour_kpis_sorted['Fulfillment Rate (%)'].idxmax(),  'Hour'] if not hour_kpis_sorted.empty else None
+    trough_fr_hour = hour_kpis_sorted.loc[hour_kpis_sorted['Fulfillment Rate (%)'].idxmin(), 'Hour'] if not hour_kpis_sorted.empty else None
+    peak_ar_hour  = hour_kpis_sorted.loc[hour_kpis_sorted['Acceptance Rate (%)'].idxmax(),  'Hour'] if not hour_kpis_sorted.empty else None
+    trough_ar_hour = hour_kpis_sorted.loc[hour_kpis_sorted['Acceptance Rate (%)'].idxmin(), 'Hour'] if not hour_kpis_sorted.empty else None
+
+    summary = {
+        # ── Always sent ──
+        "core": {
+            "overall_kpis": kpi_dict,
+            "distance_filter_applied": f"{dist_range[0]} to {dist_range[1]} km",
+            "total_rows_in_filtered_data": len(data),
+
+            # ── Driver rankings ──
+            **{name: ranked.to_dict(orient='records') for name, ranked in driver_rankings.items()},
+
+            # ── Time insights ──
+            "peak_fulfillment_hour":   peak_fr_hour,
+            "trough_fulfillment_hour": trough_fr_hour,
+            "peak_acceptance_hour":    peak_ar_hour,
+            "trough_acceptance_hour":  trough_ar_hour,
+        },
+
+        # ── By dimension: only the rows relevant to a question are sent ──
+        "tables": {
+            "by_region":        region_kpis,
+            "by_city":          city_kpis,
+            "by_country":       country_kpis,
+            "by_hour":          hour_kpis_sorted,
+            "by_date":          date_kpis.sort_values('Date'),
+            "by_vehicle_type":  vehicle_kpis,
+            "by_corporate":     corporate_kpis,
+            "all_drivers_kpis": driver_kpis,
+        },
+    }
+    summary["index"] = build_entity_index(summary["tables"])
+    return summary
+
+
+# ─────────────────────────────────────────────
+# CHATBOT – relevance-pruned context
+# ─────────────────────────────────────────────
+# The full summary can run to megabytes with thousands of drivers. The model
+# only gets the core (overall KPIs, rankings, peak hours) plus the dimension
+# rows a question points at, within a byte budget (≈ 4 bytes per token).
+CONTEXT_BUDGET_BYTES = int(os.environ.get("NEXUS_CONTEXT_BUDGET_BYTES", "60000"))
+
+# table → (label column, words that ask for the whole table)
+DIMENSIONS = {
+    "by_region":        ('Region',      ['region', 'regions', 'area', 'areas']),
+    "by_city":          ('CITY',        ['city', 'cities', 'town']),
+    "by_country":       ('COUNTRY',     ['country', 'countries']),
+    "by_hour":          ('Hour',        ['hour', 'hours', 'hourly', 'time of day', 'peak', 'trough']),
+    "by_date":          ('Date',        ['date', 'dates', 'day', 'days', 'daily', 'trend', 'trends', 'over time']),
+    "by_vehicle_type":  ('VEHICLETYPE', ['vehicle', 'vehicles', 'vehicle type']),
+    "by_corporate":     ('Corporate',   ['corporate', 'corporates', 'account', 'accounts']),
+    # Whole-table requests for drivers are covered by the rankings in the core.
+    "all_drivers_kpis": ('DRIVER',      []),
+}
+# Small tables sent when the budget still allows, even if not asked for.
+DEFAULT_TABLES = ["by_region", "by_country", "by_hour", "by_vehicle_type"]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_HOUR_AMPM = re.compile(r"\b(1[0-2]|0?[1-9])\s*(am|pm)\b")
+_HOUR_CLOCK = re.compile(r"\b([01]?\d|2[0-3])[:h]00\b")
+_HOUR_WORD = re.compile(r"\bhour\s+([01]?\d|2[0-3])\b")
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+# "between 7am and 9am", "from 07:00 to 10:00", "between hour 7 and hour 9"
+_HOUR_POINT = r"(hours?\s+)?(\d{1,2})([:h]00)?\s*(am|pm)?"
+_HOUR_RANGE = re.compile(rf"\b(?:between|from)\s+{_HOUR_POINT}\s*(?:and|to|until|till|-)\s*{_HOUR_POINT}(?![\w:])")
+_DATE_RANGE = re.compile(r"\b(?:between|from)\s+(\d{4}-\d{2}-\d{2})\s*(?:and|to|until|till)\s*(\d{4}-\d{2}-\d{2})\b")
+
+
+def _norm(value) -> str:
+    return " ".join(_WORD.findall(str(value).lower()))
+
+
+def build_entity_index(tables: dict) -> dict:
+    """first word of a normalized label → [(table, normalized label, row position)]."""
+    index = {}
+    for table, (col, _) in DIMENSIONS.items():
+        if table in ("by_hour", "by_date"):
+            continue   # matched by the hour/date parsers instead
+        for pos, label in enumerate(tables[table][col].tolist()):
+            name = _norm(label)
+            if name:
+                index.setdefault(name.split()[0], []).append((table, name, pos))
+    return index
+
+
+def _range_hours(match) -> set:
+    """
+    Hours covered by a "between X and Y" match, or None when its ends are not
+    clearly times of day. A clock time Y is where the window ends, so 7am to
+    9am covers the 07:00 and 08:00 hours, while "hour 7 and hour 9" names
+    hours and includes both. A window past midnight wraps around.
+    """
+    word1, h1, clock1, ampm1, word2, h2, clock2, ampm2 = match.groups()
+    if not (word1 or clock1 or ampm1 or word2 or clock2 or ampm2):
+        return None   # "between 7 and 9" – could be anything
+    if not (ampm1 or word1 or clock1) and ampm2:
+        # "from 7 to 9am" / "from 11 to 1pm": the start takes the end's
+        # am/pm unless that puts it after the end.
+        ampm1 = ampm2 if int(h1) % 12 <= int(h2) % 12 else {'am': 'pm', 'pm': 'am'}[ampm2]
+    ends = []
+    for h, ampm in [(int(h1), ampm1), (int(h2), ampm2)]:
+        if ampm:
+            if not 1 <= h <= 12:
+                return None
+            h = h % 12 + (12 if ampm == 'pm' else 0)
+        elif h > 23:
+            return None
+        ends.append(h)
+    start, end = ends
+    if word2:
+        end += 1
+    if start % 24 == end % 24:
+        return {start}
+    return {h % 24 for h in range(start, end if end > start else end + 24)}
+
+
+def mentioned_hour_ranges(question: str):
+    """
+    (hours named by "between X and Y" / "from X to Y" ranges, the question
+    with those ranges removed), or None when a range cannot be read.
+    """
+    q = question.lower()
+    hours = set()
+    for match in _HOUR_RANGE.finditer(q):
+        covered = _range_hours(match)
+        if covered is None:
+            return None
+        hours |= covered
+    return hours, _HOUR_RANGE.sub(" ", q)
+
+
+def mentioned_hours(question: str) -> set:
+    ranges = mentioned_hour_ranges(question)
+    hours, q = ranges if ranges is not None else (set(), question.lower())
+    for h, ampm in _HOUR_AMPM.findall(q):
+        h = int(h) % 12
+        hours.add(h + 12 if ampm == 'pm' else h)
+    hours.update(int(h) for h in _HOUR_CLOCK.findall(q))
+    hours.update(int(h) for h in _HOUR_WORD.findall(q))
+    return hours
+
+
+def mentioned_dates(question: str) -> set:
+    """Dates named by the question; "between D1 and D2" covers every day of the range."""
+    dates = set(_DATE.findall(question))
+    for first, last in _DATE_RANGE.findall(question):
+        try:
+            days = pd.date_range(*sorted([first, last]))
+        except ValueError:
+            continue
+        dates.update(days.strftime('%Y-%m-%d'))
+    return dates
+
+
+def mentioned_entities(summary: dict, question: str) -> dict:
+    """table → row positions of the drivers, cities, regions, ... the question names."""
+    q = _norm(question)
+    padded = f" {q} "
+    rows = {}
+    for word in set(q.split()):
+        for table, name, pos in summary["index"].get(word, []):
+            if f" {name} " in padded:
+                rows.setdefault(table, []).append(pos)
+    return rows
+
+
+def relevant_rows(summary: dict, question: str) -> dict:
+    """table → row positions named by the question (entities, hours, dates)."""
+    rows = mentioned_entities(summary, question)
+    tables = summary["tables"]
+    hours = mentioned_hours(question)
+    if hours:
+        positions = [i for i, h in enumerate(tables["by_hour"]['Hour'].tolist()) if int(h) in hours]
+        rows.setdefault("by_hour", []).extend(positions)
+    dates = mentioned_dates(question)
+    if dates:
+        positions = [i for i, d in enumerate(tables["by_date"]['Date'].tolist()) if str(d)[:10] in dates]
+        rows.setdefault("by_date", []).extend(positions)
+    return rows
+
+
+def requested_tables(question: str) -> list:
+    q = f" {_norm(question)} "
+    return [t for t, (_, words) in DIMENSIONS.items() if any(f" {w} " in q for w in words)]
+
+
+def build_context(summary: dict, question: str, budget_bytes: int = None) -> str:
+    """
+    JSON context for one question: the core, then rows for entities the
+    question names, then whole tables it asks about, then the default small
+    tables, each added row by row until the byte budget is used up.
+    """
+    budget = CONTEXT_BUDGET_BYTES if budget_bytes is None else budget_bytes
+    context = dict(summary["core"])
+    used = len(json.dumps(context, default=str))
+    truncated = {}
+
+    def add(table, records):
+        nonlocal used
+        out = context.setdefault(table, [])
+        for record in records:
+            if record in out:
+                continue
+            size = len(json.dumps(record, default=str)) + 2
+            if used + size > budget:
+                truncated[table] = truncated.get(table, 0) + 1
+                continue
+            out.append(record)
+            used += size
+
+    tables = summary["tables"]
+    for table, positions in relevant_rows(summary, question).items():
+        add(table, tables[table].iloc[sorted(set(positions))].to_dict(orient='records'))
+    for table in requested_tables(question) + DEFAULT_TABLES:
+        add(table, tables[table].to_dict(orient='records'))
+    context = {k: v for k, v in context.items() if not (isinstance(v, list) and not v)}
+    if truncated:
+        context["rows_left_out_for_size"] = truncated
+    return json.dumps(context, default=str)
+
+
+def get_data_summary(cache, key, data, kpi_dict, dist_range) -> dict:
+    """
+    The summary for one filter state, built at most once per state and
+    reused by every follow-up question until the cache evicts it.
+    """
+    t0 = time.perf_counter()
+    built = []
+
+    def build():
+        built.append(True)
+        return build_data_summary(data, kpi_dict, dist_range)
+
+    summary = cache.get_or_compute(key, build)
+    logger.info(
+        "Nexus Phil data summary %s in %.1f ms",
+        "built" if built else "reused", (time.perf_counter() - t0) * 1000,
+    )
+    return summary
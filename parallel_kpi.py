@@ -0,0 +1,226 @@
+import os
+import sys
+import queue
+import atexit
+import threading
+import subprocess
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client
+
+import numpy as np
+import pandas as pd
+
+import kpi_engine
+
+# ─────────────────────────────────────────────
+# PARALLEL KPI
+# ─────────────────────────────────────────────
+# Independent aggregations over the same rows (the KPI tables, the chatbot's
+# per-dimension rates) fan out to a process pool. The columns they need are
+# copied once into shared memory; workers map them without pickling the
+# frame, run a kpi_engine function and send back the (small) result. Below
+# PARALLEL_MIN_ROWS rows, or with a single worker, jobs run serially in
+# process, where the pool's overhead would dominate.
+#
+# Workers are plain `python -m kpi_worker` processes rather than
+# multiprocessing children. A spawned child re-imports the parent's
+# __main__, which under Streamlit is the dashboard script; kpi_worker only
+# imports this module.
+
+WORKERS = int(os.environ.get("SUPPLY_KPI_WORKERS", str(min(os.cpu_count() or 1, 8))))
+PARALLEL_MIN_ROWS = int(os.environ.get("SUPPLY_PARALLEL_MIN_ROWS", "250000"))
+
+SHUTDOWN_TIMEOUT = 30   # seconds a retired pool's workers get to finish their jobs
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+class WorkerPool:
+    """
+    `workers` kpi_worker processes, each fed jobs from one shared queue by a
+    thread of this process. When a worker dies, the pool is marked broken:
+    its waiting jobs fail with BrokenProcessPool, and so does every later
+    submit(), so the caller can build a new pool.
+    """
+
+    def __init__(self, workers: int):
+        key = os.urandom(32)
+        env = {**os.environ, "SUPPLY_KPI_WORKER_KEY": key.hex()}
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self.broken = False
+        self._procs, self._conns = [], []
+        try:
+            for _ in range(workers):
+                proc = subprocess.Popen([sys.executable, "-m", "kpi_worker"], cwd=_DIR, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True)
+                self._procs.append(proc)
+            for proc in self._procs:
+                address = proc.stdout.readline().strip()   # "" when the worker died starting up
+                if not address:
+                    raise BrokenProcessPool(f"a KPI worker exited on startup (code {proc.wait()})")
+                self._conns.append(Client(address, authkey=key))
+        except BaseException:
+            self.shutdown()
+            raise
+        for conn in self._conns:
+            threading.Thread(target=self._feed, args=(conn,), name="kpi-pool-feeder", daemon=True).start()
+        self._feeding = True
+
+    def _feed(self, conn):
+        with conn:   # closing it tells the worker to exit
+            while True:
+                item = self._jobs.get()
+                if item is None:
+                    return
+                future, job = item
+                try:
+                    conn.send(job)
+                    ok, value = conn.recv()
+                except (EOFError, OSError) as exc:
+                    # Broken before the caller hears of it, so its next
+                    # get_pool() already builds a new pool.
+                    self._break()
+                    future.set_exception(BrokenProcessPool(f"a KPI worker died: {exc!r}"))
+                    return
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _break(self):
+        with self._lock:
+            self.broken = True
+            while True:   # fail what no worker will pick up now
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    return
+                if item is None:
+                    self._jobs.put(None)
+                    return
+                item[0].set_exception(BrokenProcessPool("a KPI worker died"))
+
+    def submit(self, spec, func_name: str, args: tuple) -> Future:
+        future = Future()
+        with self._lock:
+            if self.broken:
+                raise BrokenProcessPool("a KPI worker died")
+            self._jobs.put((future, (spec, func_name, args)))
+        return future
+
+    def shutdown(self):
+        """Stop the workers once they finish the jobs already queued."""
+        if getattr(self, "_feeding", False):
+            for _ in self._conns:
+                self._jobs.put(None)
+        else:
+            for conn in self._conns:
+                conn.close()
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            proc.stdout.close()
+
+
+def get_pool(workers: int) -> WorkerPool:
+    """Process-wide pool, (re)created when the worker count changes or a worker died."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers or _pool.broken:
+            if _pool is not None:
+                _pool.shutdown()
+                _pool = None
+            _pool, _pool_workers = WorkerPool(workers), workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
+
+
+def share_columns(data: pd.DataFrame, columns: list):
+    """
+    Copy `columns` into shared memory. Returns the segments (the caller
+    unlinks them) and a picklable spec workers rebuild the frame from.
+    Categoricals are shared as codes; their categories travel in the spec.
+    """
+    segments, spec = [], []
+    for col in columns:
+        values = data[col]
+        categories = None
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            array = values.cat.codes.to_numpy()
+        else:
+            array = values.to_numpy()
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+        segments.append(shm)
+        spec.append((col, shm.name, array.dtype.str, array.shape, categories))
+    return segments, spec
+
+
+def _attach(spec):
+    segments, columns = [], {}
+    for col, name, dtype, shape, categories in spec:
+        shm = shared_memory.SharedMemory(name=name)
+        # The segment is the parent's to unlink; keep it out of this
+        # process's resource tracker, which would unlink it when we exit.
+        if os.name == "posix":
+            resource_tracker.unregister(shm._name, "shared_memory")
+        segments.append(shm)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        columns[col] = pd.Categorical.from_codes(array, categories) if categories is not None else array
+    return segments, pd.DataFrame(columns, copy=False)
+
+
+def _run_job(spec, func_name, args):
+    segments, frame = _attach(spec)
+    try:
+        # Deep-copied so nothing in the result points into shared memory.
+        return getattr(kpi_engine, func_name)(frame, *args).copy(deep=True)
+    finally:
+        del frame
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                pass   # a view is still alive; the mapping goes with the worker
+
+
+def run_all(data: pd.DataFrame, jobs: dict, columns: list, workers: int = None,
+            min_rows: int = None) -> dict:
+    """
+    Run `jobs` ({name: (kpi_engine function name, *args)}) over `data`,
+    each as function(data, *args), and return {name: result}. `columns`
+    are the columns the jobs read.
+    """
+    workers = WORKERS if workers is None else workers
+    min_rows = PARALLEL_MIN_ROWS if min_rows is None else min_rows
+    if workers <= 1 or len(jobs) <= 1 or len(data) < min_rows:
+        return {name: getattr(kpi_engine, fn)(data, *args) for name, (fn, *args) in jobs.items()}
+
+    segments, spec = share_columns(data, columns)
+    try:
+        pool = get_pool(workers)
+        try:
+            futures = {name: pool.submit(spec, fn, tuple(args)) for name, (fn, *args) in jobs.items()}
+        except BrokenProcessPool:
+            # A worker died since the pool was handed out: start a new one.
+            pool = get_pool(workers)
+            futures = {name: pool.submit(spec, fn, tuple(args)) for name, (fn, *args) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,146 @@
+import io
+import os
+import time
+import pstats
+import marshal
+import cProfile
+import threading
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# PROFILING
+# ─────────────────────────────────────────────
+# A RerunTimer is started at the top of main.py and marked at the end of
+# each section: a mark records the wall time and resident-memory change since
+# the previous mark, with the rows going in and out of the section. Finished
+# reruns go into a process-wide rolling history that the admin profile panel
+# reads. The cost per mark is a clock read and one small /proc read.
+#
+# A single rerun can also be run under cProfile (opt-in from the panel); its
+# stats are kept in the session for download.
+
+HISTORY_SIZE = int(os.environ.get("SUPPLY_PROFILE_HISTORY", "50"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size of the process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RerunTimer:
+    """Per-section timings of one script run."""
+
+    def __init__(self, kind: str = "page"):
+        self.kind = kind
+        self.started = datetime.now()
+        self.stages = []
+        self._t0 = self._last = time.perf_counter()
+        self._mem = rss_bytes()
+
+    def mark(self, stage: str, rows_in: int = None, rows_out: int = None):
+        """Close the section that began at the previous mark (or at the start)."""
+        now, mem = time.perf_counter(), rss_bytes()
+        self.stages.append({
+            "stage": stage,
+            "ms": round((now - self._last) * 1000, 2),
+            "rows in": rows_in,
+            "rows out": rows_out,
+            "memory Δ (MB)": round((mem - self._mem) / 1e6, 1) if mem is not None and self._mem is not None else None,
+        })
+        self._last, self._mem = now, mem
+
+    def total_ms(self) -> float:
+        return round((self._last - self._t0) * 1000, 2)
+
+
+class History:
+    """Thread-safe rolling list of finished reruns."""
+
+    def __init__(self, size: int):
+        self._runs = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def record(self, timer: RerunTimer):
+        with self._lock:
+            self._count += 1
+            self._runs.append({
+                "run": self._count, "kind": timer.kind, "started": timer.started,
+                "total ms": timer.total_ms(), "stages": list(timer.stages),
+            })
+
+    def runs(self) -> list:
+        with self._lock:
+            return list(self._runs)
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+
+
+HISTORY = History(HISTORY_SIZE)
+
+
+def _with_counts(frame: pd.DataFrame) -> pd.DataFrame:
+    """Row counts as nullable integers, so sections without one show blank rather than NaN."""
+    counts = [c for c in ["rows in", "rows out"] if c in frame.columns]
+    return frame.astype({c: "Int64" for c in counts})
+
+
+def run_frame(run: dict) -> pd.DataFrame:
+    """The sections of one run."""
+    return _with_counts(pd.DataFrame(run["stages"]))
+
+
+def stage_frame(runs: list) -> pd.DataFrame:
+    """One row per (run, stage)."""
+    rows = [{"run": r["run"], "kind": r["kind"], "started": r["started"], **s} for r in runs for s in r["stages"]]
+    return _with_counts(pd.DataFrame(rows))
+
+
+def stage_stats(runs: list) -> pd.DataFrame:
+    """Median / max time and median memory change per stage over `runs`, slowest first."""
+    stages = stage_frame(runs)
+    if stages.empty:
+        return stages
+    stats = stages.groupby(["kind", "stage"], sort=False).agg(
+        runs=("ms", "size"),
+        median_ms=("ms", "median"),
+        max_ms=("ms", "max"),
+        median_memory_mb=("memory Δ (MB)", "median"),
+    ).reset_index()
+    stats.columns = ["kind", "stage", "runs", "median (ms)", "max (ms)", "median memory Δ (MB)"]
+    return stats.sort_values("median (ms)", ascending=False, kind="stable")
+
+
+# ── cProfile capture ──
+def start_profile() -> cProfile.Profile:
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def stop_profile(profile: cProfile.Profile) -> bytes:
+    """Stop `profile` and return its stats in pstats' marshal format (for pstats / snakeviz)."""
+    profile.disable()
+    profile.create_stats()
+    return marshal.dumps(profile.stats)
+
+
+def top_functions(profile_bytes: bytes, limit: int = 20) -> str:
+    """The `limit` functions with the highest cumulative time, as pstats prints them."""
+    out = io.StringIO()
+    stats = pstats.Stats(stream=out)
+    stats.stats = marshal.loads(profile_bytes)
+    stats.get_top_level_stats()
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# RANKINGS
+# ─────────────────────────────────────────────
+# Top-k / bottom-k rows of a KPI table by one metric. Only k rows are ever
+# ordered: np.argpartition finds the k-th value in linear time, the rows at
+# or beyond it are kept, and just those are sorted. Ties keep table order
+# (the driver tables are sorted by driver), so a ranking never depends on
+# the sort algorithm. Groups below a minimum volume are left out, since a
+# driver with two requests can sit at 0% or 100% by chance.
+
+TOP_K = int(os.environ.get("SUPPLY_RANK_TOP_K", "10"))
+MIN_REQUESTS = int(os.environ.get("SUPPLY_RANK_MIN_REQUESTS", "5"))
+
+# Rankings sent to the chatbot: name → (metric, ascending)
+DRIVER_RANKINGS = {
+    "drivers_top10_fulfillment_rate":    ('Fulfillment Rate (%)', False),
+    "drivers_bottom10_fulfillment_rate": ('Fulfillment Rate (%)', True),
+    "drivers_top10_acceptance_rate":     ('Acceptance Rate (%)', False),
+    "drivers_bottom10_acceptance_rate":  ('Acceptance Rate (%)', True),
+    "drivers_top10_cancellation_rate":   ('Driver Cancellation Rate (%)', False),
+}
+
+
+def eligible_positions(table: pd.DataFrame, min_requests: int = None) -> np.ndarray:
+    """Positions of the rows with at least `min_requests` requests."""
+    min_requests = MIN_REQUESTS if min_requests is None else min_requests
+    return np.flatnonzero(table['Total Requests'].to_numpy() >= min_requests)
+
+
+def top_positions(values: np.ndarray, k: int, ascending: bool = False) -> np.ndarray:
+    """
+    Positions of the k highest (or, ascending, lowest) `values`, best first;
+    ties in position order. NaN ranks last either way, as in sort_values.
+    """
+    values = np.asarray(values, dtype='float64')
+    key = values if ascending else -values
+    key = np.where(np.isnan(key), np.inf, key)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(key):
+        # Everything at or before the k-th smallest key, including its ties.
+        kth = key[np.argpartition(key, k - 1)[k - 1]]
+        candidates = np.flatnonzero(key <= kth)
+    else:
+        candidates = np.arange(len(key))
+    return candidates[np.argsort(key[candidates], kind='stable')][:k]
+
+
+def top_k(table: pd.DataFrame, metric: str, k: int = None, ascending: bool = False,
+          min_requests: int = None) -> pd.DataFrame:
+    """The k best (ascending: worst) eligible rows of `table` by `metric`."""
+    k = TOP_K if k is None else k
+    eligible = eligible_positions(table, min_requests)
+    order = top_positions(table[metric].to_numpy()[eligible], k, ascending)
+    return table.iloc[eligible[order]]
+
+
+def rank_all(table: pd.DataFrame, rankings: dict, k: int = None, min_requests: int = None) -> dict:
+    """
+    name → top_k() frame for every (metric, ascending) in `rankings`, sharing
+    one volume filter.
+    """
+    k = TOP_K if k is None else k
+    eligible = eligible_positions(table, min_requests)
+    columns = {metric: table[metric].to_numpy()[eligible] for metric, _ in rankings.values()}
+    return {
+        name: table.iloc[eligible[top_positions(columns[metric], k, ascending)]]
+        for name, (metric, ascending) in rankings.items()
+    }
@@ -0,0 +1,65 @@
+import threading
+
+import data_store
+import filter_engine
+import kpi_engine
+
+# ─────────────────────────────────────────────
+# REQUEST TABLE
+# ─────────────────────────────────────────────
+# The in-memory request table for one date window, with the structures built
+# on it (filter index, request cube), grown partition by partition. Only the
+# partitions whose date falls in the window are read, so memory and load time
+# follow the dates being looked at rather than the whole history. refresh()
+# loads partition files it has not loaded yet; the table, index and cube are
+# extended rather than rebuilt, and the version changes so per-filter results
+# (keyed by version) are recomputed for the new rows.
+
+
+class RequestTable:
+    def __init__(self, date_from=None, date_to=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self._lock = threading.Lock()
+        self._loaded = set()
+        self.df = None
+        self.index = None
+        self.cube = None
+        self.version = None
+        self.memory_report = None
+
+    def refresh(self) -> int:
+        """Load partitions of the window that arrived since the last call; returns rows added."""
+        manifest = data_store.read_partition_manifest()
+        parts = data_store.window_parts(manifest, self.date_from, self.date_to)
+        with self._lock:
+            parts = [p for p in parts if p["file"] not in self._loaded]
+            if not parts:
+                if self.df is None:
+                    self.df = data_store.empty_table(manifest)
+                    self.index = filter_engine.FilterIndex(self.df)
+                    self.cube = kpi_engine.build_cube(self.df)
+                    self.version = data_store.parts_version(self._loaded)
+                return 0
+            raw = data_store.read_parts(parts)
+            part = data_store.apply_schema(raw)
+            if self.df is None or self.df.empty:
+                df = part
+                index = filter_engine.FilterIndex(df)
+                cube = kpi_engine.build_cube(df)
+                self.memory_report = data_store.memory_report(
+                    data_store.column_bytes(raw), data_store.column_bytes(df)
+                )
+            else:
+                df = data_store.append_rows(self.df, part)
+                index = self.index.extended(df)
+                cube = kpi_engine.extend_cube(self.cube, df.iloc[len(self.df):])
+            self._loaded.update(p["file"] for p in parts)
+            self.df, self.index, self.cube = df, index, cube
+            self.version = data_store.parts_version(self._loaded)
+            return len(part)
+
+    def snapshot(self):
+        """(df, index, cube, version) as one consistent set."""
+        with self._lock:
+            return self.df, self.index, self.cube, self.version
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# RESULT CACHE
+# ─────────────────────────────────────────────
+# Process-wide LRU for artifacts derived from a filter state (row sets, KPI
+# dicts, chart and table frames). Streamlit re-imports main.py on every rerun
+# but not this module, so every session shares the same cache, and two
+# analysts opening the same view share one computation.
+
+
+def estimate_bytes(value) -> int:
+    """Approximate in-memory size of a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by the estimated size of its entries."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key → (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def __contains__(self, key) -> bool:
+        """Whether `key` is cached; unlike get(), not counted as a hit or miss."""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, value):
+        size = estimate_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value for `key`, computing and storing it on a miss.
+        Concurrent misses on the same key wait for the first computation
+        instead of repeating it.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                # Computed by another session while we waited.
+                value = entry[0]
+            else:
+                value = compute()
+                self.put(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "Entries": len(self._entries),
+                "Size (MB)": round(self._bytes / 2**20, 2),
+                "Limit (MB)": round(self.max_bytes / 2**20, 2),
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "Hit Rate (%)": round(self.hits * 100 / lookups, 2) if lookups else 0.0,
+                "Evictions": self.evictions,
+            }
+
+
+RESULTS = LRUCache(max_bytes=int(os.environ.get("SUPPLY_RESULT_CACHE_MB", "512")) * 2**20)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# TABLE PAGER
+# ─────────────────────────────────────────────
+# Large tables (the filtered rows, the driver and rider KPI tables) are
+# searched, sorted and sliced here, and only the visible page is sent to the
+# browser. Search and sort results are plain row-position arrays, so the
+# caller can memoize them next to the table they index.
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def text_columns(data: pd.DataFrame) -> list:
+    return [c for c in data.columns
+            if isinstance(data[c].dtype, pd.CategoricalDtype)
+            or pd.api.types.is_object_dtype(data[c]) or pd.api.types.is_string_dtype(data[c])]
+
+
+def search_positions(data: pd.DataFrame, query: str) -> np.ndarray:
+    """
+    Positions of the rows where any text column contains `query`
+    (case-insensitive). Categorical columns are matched on their categories,
+    not row by row.
+    """
+    needle = query.strip().lower()
+    if not needle:
+        return np.arange(len(data))
+    mask = np.zeros(len(data), dtype=bool)
+    for col in text_columns(data):
+        values = data[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            labels = values.cat.categories.astype(str).str.lower()
+            hits = np.flatnonzero(labels.str.contains(needle, regex=False))
+            if len(hits):
+                mask |= np.isin(values.cat.codes.to_numpy(), hits)
+        else:
+            mask |= values.astype(str).str.lower().str.contains(needle, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def sort_positions(data: pd.DataFrame, column: str = None, ascending: bool = True) -> np.ndarray:
+    """Row positions in `column` order (stable, missing values last); table order without one."""
+    if column is None:
+        return np.arange(len(data))
+    values = data[column].reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.categories.is_monotonic_increasing:
+        # Appended partitions add their new labels at the end of the categories.
+        values = values.cat.reorder_categories(values.cat.categories.sort_values())
+    return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def page_positions(order: np.ndarray, matches: np.ndarray, n_rows: int) -> np.ndarray:
+    """`order` restricted to the rows in `matches`."""
+    if len(matches) == n_rows:
+        return order
+    keep = np.zeros(n_rows, dtype=bool)
+    keep[matches] = True
+    return order[keep[order]]
+
+
+def page_count(total: int, page_size: int) -> int:
+    return max((total + page_size - 1) // page_size, 1)
+
+
+def page_slice(data: pd.DataFrame, positions: np.ndarray, page: int, page_size: int) -> pd.DataFrame:
+    """Rows of page `page` (1-based) of `positions`."""
+    start = (page - 1) * page_size
+    return data.iloc[positions[start:start + page_size]]
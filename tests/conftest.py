@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to main.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench
+
+
+@pytest.fixture(scope='session')
+def requests_df():
+    """A small synthetic request table (see bench.generate_requests)."""
+    return bench.generate_requests(20_000, rows_per_driver=40)
@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+import bench
+import filter_engine
+
+
+def _states(df):
+    everything = {col: None for col in filter_engine.CATEGORICAL_FILTERS}
+    places = {**everything, 'CITY': ['Nairobi', 'Kampala'], 'VEHICLETYPE': ['Boda'],
+              'Date': (df['Date'].min() + pd.Timedelta(days=3), df['Date'].min() + pd.Timedelta(days=9))}
+    nothing = {**everything, 'DRIVER': [df['DRIVER'].cat.categories[0]], 'Hour': (30, 40)}
+    return {'typical': bench.typical_state(df), 'everything': everything, 'places': places, 'nothing': nothing}
+
+
+@pytest.mark.parametrize('name', ['typical', 'everything', 'places', 'nothing'])
+def test_select_matches_boolean_mask(requests_df, name):
+    state = _states(requests_df)[name]
+    index = filter_engine.FilterIndex(requests_df)
+    expected = bench.legacy_filter(requests_df, state)
+    got = requests_df.iloc[index.select(state)]
+    assert expected.index.equals(got.index)
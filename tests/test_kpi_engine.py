@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import bench
+import kpi_engine
+
+
+@pytest.fixture(scope='module')
+def cube(requests_df):
+    return kpi_engine.build_cube(requests_df)
+
+
+@pytest.mark.parametrize('group_col', ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate'])
+def test_build_kpi_table_matches_merges(requests_df, group_col):
+    bench.assert_same_table(bench.legacy_build_kpi_table(requests_df, group_col),
+                            kpi_engine.build_kpi_table(requests_df, group_col))
+
+
+def test_fulfillment_pivot_matches_merges(requests_df):
+    bench.assert_same_table(bench.legacy_compute_fulfillment_pivot(requests_df),
+                            kpi_engine.compute_fulfillment_pivot(requests_df))
+
+
+def test_overall_kpis_match_boolean_filters(requests_df, cube):
+    expected = bench.legacy_overall_kpis(requests_df)
+    assert kpi_engine.overall_kpis(requests_df, len(requests_df)) == expected
+    assert kpi_engine.overall_kpis(cube, len(requests_df), 'count') == expected
+
+
+def test_overall_kpis_of_no_rows(requests_df):
+    empty = requests_df.iloc[:0]
+    assert kpi_engine.overall_kpis(empty, 0) == bench.legacy_overall_kpis(empty)
+
+
+@pytest.mark.parametrize('keys', ['DRIVER', 'Rider Mobile Number', 'Region', 'Corporate', 'Date', ['DRIVER', 'Date']])
+def test_category_matrix_matches_groupby(requests_df, keys):
+    expected = bench.groupby_category_matrix(requests_df, keys)
+    got = kpi_engine.category_matrix(requests_df, keys)
+    pd.testing.assert_frame_equal(expected[got.columns], got)
+
+
+@pytest.mark.parametrize('keys', ['Hour', ['Region', 'Hour'], ['VEHICLETYPE', 'Date'], 'CITY'])
+def test_category_matrix_on_the_cube(cube, keys):
+    expected = bench.groupby_category_matrix(cube, keys, 'count')
+    got = kpi_engine.category_matrix(cube, keys, 'count')
+    pd.testing.assert_frame_equal(expected[got.columns], got)
+
+
+def test_date_rates_match_string_dates(requests_df):
+    rates = kpi_engine.rates_for_group(requests_df, 'Date')
+    rates['Date'] = rates['Date'].astype(str)
+    pd.testing.assert_frame_equal(bench.legacy_date_rates(requests_df), rates, check_dtype=False)
+
+
+@pytest.fixture(scope='module')
+def uncategorised_df(requests_df):
+    """requests_df with every 7th row's Category missing."""
+    category = requests_df['Category'].astype(object)
+    category.iloc[::7] = None
+    return requests_df.assign(Category=category.astype('category'))
+
+
+@pytest.mark.parametrize('group_col', ['DRIVER', 'Region', 'Corporate'])
+def test_missing_category_counts_towards_total_requests(uncategorised_df, group_col):
+    bench.assert_same_table(bench.legacy_build_kpi_table(uncategorised_df, group_col),
+                            kpi_engine.build_kpi_table(uncategorised_df, group_col))
+
+
+def test_missing_category_on_the_cube(uncategorised_df):
+    cube = kpi_engine.build_cube(uncategorised_df)
+    assert kpi_engine.category_matrix(cube, 'Region', 'count')[kpi_engine.MISSING_CATEGORY].sum() > 0
+    assert (kpi_engine.overall_kpis(cube, len(uncategorised_df), 'count')
+            == bench.legacy_overall_kpis(uncategorised_df))
+    bench.assert_same_table(kpi_engine.build_kpi_table(uncategorised_df, 'Region'),
+                            kpi_engine.build_kpi_table(cube, 'Region', 'count'))
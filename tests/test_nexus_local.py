@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+import bench
+import kpi_engine
+import nexus_local
+import nexus_summary
+
+DAY = pd.Timestamp('2025-01-05')   # generate_requests starts on 2025-01-01
+
+
+def reference_rates(data, group_col=None):
+    """FR / AR / request count per group (or overall) from plain value counts."""
+    if group_col is None:
+        data, group_col = data.assign(_all='All'), '_all'
+    counts = pd.crosstab(data[group_col].astype(str), data['Category'].astype(str))
+    counts = counts.reindex(columns=bench.CATEGORIES, fill_value=0)
+    trips, dc, rc, to = (counts[c] for c in ['Trips', 'Driver Cancellation', 'Rider Cancellation', 'Timeout'])
+    out = pd.DataFrame({
+        'fr': (trips * 100 / (trips + dc + rc).clip(lower=1)).round(2),
+        'ar': (trips * 100 / (trips + dc + rc + to).clip(lower=1)).round(2),
+        'requests': counts.sum(axis=1) - counts['No Drivers Found'],
+    })
+    return out[out['requests'] > 0]
+
+
+def _best_city_at_8pm(df):
+    best = reference_rates(df[df['Hour'] == 20], 'CITY').sort_values(['ar', 'requests'], ascending=[False, False]).iloc[0]
+    return [f"**{best.name}**", f"{best['ar']:.2f}%", "20:00"]
+
+
+def _worst_region(df):
+    worst = reference_rates(df, 'Region').sort_values(['fr', 'requests'], ascending=[True, False]).iloc[0]
+    return [f"**{worst.name}**", f"{worst['fr']:.2f}%"]
+
+
+def _nairobi(df):
+    return ["**Nairobi**", f"{reference_rates(df, 'CITY').loc['Nairobi', 'fr']:.2f}%"]
+
+
+def _nairobi_vs_mombasa(df):
+    cities = reference_rates(df, 'CITY')
+    return [f"{cities.loc['Nairobi', 'ar']:.2f}%", f"{cities.loc['Mombasa', 'ar']:.2f}%"]
+
+
+def _on_day(df):
+    return [f"{reference_rates(df[df['Date'] == DAY]).iloc[0]['ar']:.2f}%"]
+
+
+def _top_driver(df):
+    drivers = reference_rates(df, 'DRIVER')
+    drivers = drivers[drivers['requests'] >= 5].sort_values(['fr', 'requests'], ascending=[False, False])
+    return [f"{drivers['fr'].iloc[0]:.2f}%"]
+
+
+def _morning(df):
+    return [f"{reference_rates(df[df['Hour'].isin([7, 8])]).iloc[0]['ar']:.2f}%", "07:00, 08:00"]
+
+
+def _over_days(df):
+    days = df[df['Date'].between(DAY, DAY + pd.Timedelta(days=2))]
+    return [f"{reference_rates(days).iloc[0]['fr']:.2f}%"]
+
+
+# question → function of the data giving the substrings the answer must contain
+ANSWERED = {
+    "Which city has the highest acceptance rate at 8pm?": _best_city_at_8pm,
+    "Which region has the lowest fulfillment rate?": _worst_region,
+    "What is the fulfillment rate for Nairobi?": _nairobi,
+    "Compare Nairobi and Mombasa by acceptance rate": _nairobi_vs_mombasa,
+    f"What was the acceptance rate on {DAY:%Y-%m-%d}?": _on_day,
+    "Top 3 drivers by fulfillment rate": _top_driver,
+    "What is the acceptance rate between 7am and 9am?": _morning,
+    f"What was the fulfillment rate from {DAY:%Y-%m-%d} to {DAY + pd.Timedelta(days=2):%Y-%m-%d}?": _over_days,
+}
+
+# Questions the local engine must leave to the model.
+ESCALATED = [
+    "Why is the fulfillment rate low in Lagos?",
+    "Give me an overview of driver behaviour",
+    "How has the fulfillment rate changed over the last week?",
+    "Is the acceptance rate improving?",
+    "fulfillment rate last month vs this month",
+    "What is the fulfillment rate between 7 and 9?",
+]
+
+
+@pytest.fixture(scope='module')
+def context(requests_df):
+    kpi = kpi_engine.overall_kpis(requests_df, len(requests_df))
+    summary = nexus_summary.build_data_summary(
+        requests_df, kpi, (0.0, float(requests_df['DISTANCE FROM RIDER'].max())))
+    return summary, requests_df, kpi
+
+
+@pytest.mark.parametrize('question', list(ANSWERED))
+def test_answers_locally(context, question):
+    reply = nexus_local.answer(question, *context)
+    assert reply is not None
+    missing = [part for part in ANSWERED[question](context[1]) if part not in reply]
+    assert not missing, reply
+
+
+@pytest.mark.parametrize('question', ESCALATED)
+def test_escalates(context, question):
+    assert nexus_local.answer(question, *context) is None
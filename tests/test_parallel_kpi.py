@@ -0,0 +1,45 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import bench
+import parallel_kpi
+
+GROUP_COLS = ['Region', 'CITY', 'Hour', 'Corporate', 'DRIVER']
+
+
+def _jobs():
+    jobs = {f'kpi_table:{col}': ('build_kpi_table', col) for col in ['DRIVER', 'Rider Mobile Number', 'Region']}
+    jobs.update({f'rates:{col}': ('rates_for_group', col) for col in GROUP_COLS})
+    return jobs
+
+
+def test_pool_matches_serial(requests_df):
+    columns = GROUP_COLS + ['Rider Mobile Number', 'Category']
+    serial = parallel_kpi.run_all(requests_df, _jobs(), columns, workers=1)
+    pooled = parallel_kpi.run_all(requests_df, _jobs(), columns, workers=2, min_rows=0)
+    assert serial.keys() == pooled.keys()
+    for name in serial:
+        bench.assert_same_table(serial[name], pooled[name])
+
+
+def test_dead_worker_gets_a_new_pool(requests_df):
+    columns = ['Region', 'CITY', 'Category']
+    jobs = {'a': ('rates_for_group', 'Region'), 'b': ('rates_for_group', 'CITY')}
+    parallel_kpi.run_all(requests_df, jobs, columns, workers=2, min_rows=0)
+    pool = parallel_kpi._pool
+    for proc in pool._procs:
+        proc.kill()
+        proc.wait()
+    with pytest.raises(BrokenProcessPool):
+        parallel_kpi.run_all(requests_df, jobs, columns, workers=2, min_rows=0)
+    got = parallel_kpi.run_all(requests_df, jobs, columns, workers=2, min_rows=0)
+    assert parallel_kpi._pool is not pool
+    bench.assert_same_table(parallel_kpi.run_all(requests_df, jobs, columns, workers=1)['b'], got['b'])
+
+
+def test_job_errors_reach_the_caller(requests_df):
+    jobs = {'a': ('rates_for_group', 'Region'), 'b': ('rates_for_group', 'NOT A COLUMN')}
+    with pytest.raises(KeyError):
+        parallel_kpi.run_all(requests_df, jobs, ['Region', 'Category'], workers=2, min_rows=0)
+    assert not parallel_kpi._pool.broken
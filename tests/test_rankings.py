@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import bench
+import kpi_engine
+import rankings
+
+
+@pytest.fixture(scope='module')
+def driver_kpis(requests_df):
+    return kpi_engine.rates_for_group(requests_df, 'DRIVER')
+
+
+@pytest.mark.parametrize('name', list(rankings.DRIVER_RANKINGS))
+def test_rankings_match_stable_sort(driver_kpis, name):
+    metric, ascending = rankings.DRIVER_RANKINGS[name]
+    ranked = rankings.rank_all(driver_kpis, rankings.DRIVER_RANKINGS, 10, rankings.MIN_REQUESTS)[name]
+    eligible = driver_kpis[driver_kpis['Total Requests'] >= rankings.MIN_REQUESTS]
+    stable = eligible.sort_values(metric, ascending=ascending, kind='stable').head(10)
+    assert ranked.equals(stable)
+    # The original unstable sorts may order ties differently, never the values.
+    legacy = bench.legacy_driver_rankings(driver_kpis, 10, rankings.MIN_REQUESTS)[name]
+    assert list(legacy[metric]) == list(ranked[metric])
+
+
+@pytest.mark.parametrize('ascending', [False, True])
+def test_top_positions_keeps_ties_in_order_and_nan_last(ascending):
+    values = np.array([3.0, np.nan, 5.0, 3.0, 1.0, 5.0])
+    expected = np.argsort(values if ascending else -values, kind='stable')   # NaN sorts last
+    for k in range(len(values) + 2):
+        assert list(rankings.top_positions(values, k, ascending)) == list(expected[:k])
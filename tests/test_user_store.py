@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+import user_store
+
+SEEDS = {f"user{i}@example.com": {"password_plain": f"pw{i}", "role": "user"} for i in range(21)}
+
+
+class CountingStore(user_store.UserStore):
+    writes = 0
+
+    def _write(self, users, emails):
+        self.writes += 1
+        super()._write(users, emails)
+
+
+def test_seeding_writes_the_json_file_once(tmp_path):
+    store = CountingStore(str(tmp_path / "users.json"), SEEDS)
+    assert len(store.all()) == 21
+    assert store.writes == 1
+    assert store.update("user3@example.com", active=False)
+    assert store.writes == 2
+    assert json.loads((tmp_path / "users.json").read_text())["user3@example.com"]["active"] is False
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_changes_survive_a_new_store(tmp_path, backend):
+    store = user_store.open_store(str(tmp_path), SEEDS, backend)
+    assert store.add("new@example.com", {"password": "x", "role": "admin", "active": True})
+    assert not store.add("new@example.com", {"password": "y", "role": "user", "active": True})
+    assert store.delete("user0@example.com")
+    reopened = user_store.open_store(str(tmp_path), SEEDS, backend)
+    assert reopened.get("new@example.com")["role"] == "admin"
+    # A deleted seed comes back with its seed password on the next load.
+    assert reopened.get("user0@example.com")["password"] == user_store.hash_password("pw0")
@@ -0,0 +1,199 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+
+# ─────────────────────────────────────────────
+# USER STORE
+# ─────────────────────────────────────────────
+# The accounts live in process memory, shared by every session. The backing
+# file is stat()ed on each read and re-parsed only when its mtime or size
+# changed, i.e. when another process (or a hand edit) wrote it. Every change
+# is a single-record operation run under a lock against the latest copy, so
+# two admins editing at once cannot overwrite each other's changes with a
+# stale dict. Seeded accounts are hashed once, when the store is created.
+#
+# Backends: users.json (default) or, with SUPPLY_USER_STORE=sqlite, a SQLite
+# file keyed (and indexed) by email, seeded from users.json the first time.
+
+BACKEND = os.environ.get("SUPPLY_USER_STORE", "json")
+SEED_CREATED_AT = "2025-01-01T00:00:00"
+
+
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class UserStore:
+    """
+    Accounts keyed by lower-case email. `seeds` maps email → {"password_plain",
+    "role"}; seeded accounts are created when missing and their password and
+    role kept in sync with the seed, but a revoked seeded account stays revoked.
+    """
+
+    def __init__(self, path: str, seeds: dict):
+        self.path = path
+        self._seeds = {
+            email: {"password": hash_password(info["password_plain"]), "role": info["role"]}
+            for email, info in seeds.items()
+        }
+        self._lock = threading.Lock()
+        self._users = {}
+        self._stamp = False   # never loaded
+
+    # ── backend ──
+    def _read_all(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _write(self, users: dict, emails: list):
+        """Persist `users` after a change to `emails` (absent from users when deleted)."""
+        # The whole file is rewritten once per change, however many accounts it touched.
+        # Atomic write: temp file → rename, so a crash never corrupts the store.
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(users, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # ── cache ──
+    def _apply_seeds(self, users: dict) -> list:
+        """Bring seeded accounts in line with their seed; returns the emails changed."""
+        changed = []
+        for email, seed in self._seeds.items():
+            user = users.get(email)
+            if user is None:
+                users[email] = {**seed, "active": True, "created_at": SEED_CREATED_AT, "seeded": True}
+                changed.append(email)
+            elif user.get("password") != seed["password"] or user.get("role") != seed["role"]:
+                # Keep password and role in sync so a reboot never locks anyone out.
+                user.update(seed)
+                changed.append(email)
+        return changed
+
+    def _current(self) -> dict:
+        """The cached users, re-read first if the file changed. Call with the lock held."""
+        stamp = _file_stamp(self.path)
+        if stamp != self._stamp:
+            users = self._read_all()
+            changed = self._apply_seeds(users)
+            if changed:
+                self._write(users, changed)
+            self._users, self._stamp = users, _file_stamp(self.path)
+        return self._users
+
+    def _change(self, email: str, apply) -> bool:
+        """Run apply(users) against the latest users; persist when it returns True."""
+        with self._lock:
+            users = self._current()
+            if not apply(users):
+                return False
+            # Seeds win over edits too, as they would on the next reload.
+            self._write(users, list(dict.fromkeys([email] + self._apply_seeds(users))))
+            self._stamp = _file_stamp(self.path)
+            return True
+
+    # ── public API ──
+    def all(self) -> dict:
+        """email → record, as a copy the caller may keep."""
+        with self._lock:
+            return {email: dict(user) for email, user in self._current().items()}
+
+    def get(self, email: str):
+        with self._lock:
+            user = self._current().get(email)
+            return dict(user) if user is not None else None
+
+    def add(self, email: str, record: dict) -> bool:
+        """Create `email`; False when it is already registered."""
+        def apply(users):
+            if email in users:
+                return False
+            users[email] = dict(record)
+            return True
+        return self._change(email, apply)
+
+    def update(self, email: str, **fields) -> bool:
+        """Set `fields` on `email`; False when it does not exist."""
+        def apply(users):
+            if email not in users:
+                return False
+            users[email].update(fields)
+            return True
+        return self._change(email, apply)
+
+    def delete(self, email: str) -> bool:
+        def apply(users):
+            return users.pop(email, None) is not None
+        return self._change(email, apply)
+
+
+class SqliteUserStore(UserStore):
+    """UserStore kept in a SQLite table with email as its primary key."""
+
+    FIELDS = ["password", "role", "active", "created_at", "seeded"]
+
+    def __init__(self, path: str, seeds: dict, import_json: str = None):
+        super().__init__(path, seeds)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "email TEXT PRIMARY KEY, password TEXT NOT NULL, role TEXT NOT NULL, "
+                "active INTEGER NOT NULL DEFAULT 1, created_at TEXT, seeded INTEGER NOT NULL DEFAULT 0)"
+            )
+            empty = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+        if empty and import_json and os.path.exists(import_json):
+            users = UserStore(import_json, {})._read_all()
+            with self._lock:
+                self._write(users, list(users))
+
+    def _connect(self):
+        # The default rollback journal writes the database file itself on
+        # commit, so its mtime/size reflect every change. Used as
+        # `with closing(conn), conn:` — commit, then close.
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _read_all(self) -> dict:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT email, {', '.join(self.FIELDS)} FROM users").fetchall()
+        users = {}
+        for email, password, role, active, created_at, seeded in rows:
+            users[email] = {"password": password, "role": role, "active": bool(active), "seeded": bool(seeded)}
+            if created_at is not None:
+                users[email]["created_at"] = created_at
+        return users
+
+    def _write(self, users: dict, emails: list):
+        # Only the changed rows, in one transaction.
+        with closing(self._connect()) as conn, conn:
+            for email in emails:
+                user = users.get(email)
+                if user is None:
+                    conn.execute("DELETE FROM users WHERE email = ?", (email,))
+                else:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO users (email, {', '.join(self.FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                        (email, user["password"], user.get("role", "user"), int(user.get("active", True)),
+                         user.get("created_at"), int(user.get("seeded", False))),
+                    )
+
+
+def open_store(data_dir: str, seeds: dict, backend: str = None) -> UserStore:
+    """The user store in `data_dir` for `backend` ("json" or "sqlite")."""
+    backend = backend or BACKEND
+    json_path = os.path.join(data_dir, "users.json")
+    if backend == "sqlite":
+        return SqliteUserStore(os.path.join(data_dir, "users.sqlite3"), seeds, import_json=json_path)
+    return UserStore(json_path, seeds)